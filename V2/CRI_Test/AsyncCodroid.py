@@ -0,0 +1,256 @@
+# codroidSDK asyncio客户端
+
+import asyncio
+import json
+import JsonCodec
+import Message
+from TcpClient import UNIX_PREFIX, CodroidTimeoutError, JsonFrameDecoder
+
+
+class AsyncCodroid:
+    """
+    Codroid机器人asyncio客户端
+
+    与Codroid使用同一套报文构造函数（Message模块），接口均为协程，基于asyncio.open_connection。
+    每个连接由一个后台读任务按id（publish/*按ty）把应答分发给等待的协程，
+    因此多个协程可以同时在同一个连接上发起请求，一个事件循环即可驱动多台控制器。
+    请求id总是由客户端重新分配，保证同一连接上的id唯一。
+
+    用法:
+        async with AsyncCodroid("192.168.1.136", 9001) as cod:
+            io, state = await asyncio.gather(cod.GetIOValue([{"type": "DI", "port": 0}]),
+                                             cod.GetRobotStates())
+    """
+
+    def __init__(self, ip, port, recv_size: int = 4096):
+        """
+        初始化AsyncCodroid对象
+
+        参数:
+            ip (str): 机器人控制器的IP地址，"unix:路径"表示Unix域套接字
+            port (int): 机器人控制器的端口号
+            recv_size (int): 单次读取的字节数
+        """
+        self.ip = ip
+        self.port = port
+        self.recv_size = recv_size
+        self.DEBUG = False
+        self.isConnected = False
+        self.default_timeout = 5.0 # 默认超时时间（秒）
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._read_task: asyncio.Task | None = None
+        self._pending = Message.PendingReplies()
+        self._decoder = JsonFrameDecoder()
+        self.inbox = Message.Inbox()  # 不属于任何请求的帧（publish/*推送、日志等）
+
+    async def __aenter__(self):
+        await self.Connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.Disconnect()
+        return False
+
+    async def Connect(self) -> bool:
+        """建立与Codroid机器人的连接"""
+        try:
+            if self.ip.startswith(UNIX_PREFIX):
+                self._reader, self._writer = await asyncio.open_unix_connection(self.ip[len(UNIX_PREFIX):])
+            else:
+                self._reader, self._writer = await asyncio.open_connection(self.ip, self.port)
+        except Exception as e:
+            print(f"连接失败: {e}")
+            self.isConnected = False
+            return False
+        self._decoder.reset()
+        self.isConnected = True
+        self._read_task = asyncio.create_task(self._read_loop())
+        print(f"已连接到服务器 {self.ip}:{self.port}")
+        return True
+
+    async def Disconnect(self):
+        """断开与Codroid的连接"""
+        if self._read_task is not None:
+            self._read_task.cancel()
+            try:
+                await self._read_task
+            except asyncio.CancelledError:
+                pass
+            self._read_task = None
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception as e:
+                print(e)
+            self._writer = None
+            self._reader = None
+            print("连接已关闭")
+        self.isConnected = False
+
+    async def _read_loop(self):
+        """后台读任务：切分JSON帧并按id分发给等待的协程"""
+        try:
+            while True:
+                data = await self._reader.read(self.recv_size)
+                if not data:
+                    print("服务器已关闭连接")
+                    break
+                self._decoder.feed(data)
+                while (frame := self._decoder.next_frame_view()) is not None:
+                    try:
+                        response = JsonCodec.loads(frame)
+                    except ValueError as e:
+                        print(f"解析应答失败: {e}")
+                        continue
+                    if self.DEBUG:
+                        print(f"接收到响应：{response}")
+                    future = self._pending.pop(response)
+                    # 已超时放弃的等待者跳过，交给同一键上的下一个
+                    while future is not None and future.done():
+                        future = self._pending.pop(response)
+                    if future is None:
+                        self.inbox.put(response)
+                        continue
+                    future.set_result(response)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"接收消息时出错: {e}")
+        finally:
+            self.isConnected = False
+            for future in self._pending.drain():
+                if not future.done():
+                    future.set_result(None)
+
+    async def Request(self, message, ensure_ascii: bool = True, timeout: float = None):
+        """
+        发送一条请求并等待与之匹配的应答
+
+        参数:
+            message: 请求报文dict或Message.MessageTemplate，可由Message模块中的函数构造
+            ensure_ascii (bool): 是否将非ASCII字符转义
+            timeout (float): 超时时间（秒），None时使用default_timeout
+
+        返回值:
+            json: 应答，未连接或连接断开时为None；超时抛出CodroidTimeoutError，连接保持可用
+        """
+        if timeout is None:
+            timeout = self.default_timeout
+        if not self.isConnected:
+            print("未连接到服务器")
+            return None
+        message_dict, data = Message.encode(message, ensure_ascii, force_id=True)
+        if self.DEBUG:
+            print(f"发送消息：{data.decode('utf-8')}")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.add(message_dict, future)
+        try:
+            self._writer.write(data)
+            await self._writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # wait_for已取消future，迟到的应答由读任务跳过
+            raise CodroidTimeoutError(f"等待应答超时({timeout}s): {message_dict.get('ty')}") from None
+        except (ConnectionError, OSError) as e:
+            print(f"发送消息时出错: {e}")
+            return None
+
+    def PollInbox(self, ty: str = None) -> list:
+        """取出未被请求认领的帧，参数含义见Codroid.PollInbox"""
+        return self.inbox.pop_all(ty)
+
+    # 2.2.1.1 运行脚本
+    async def RunScript(self, mainProgram: str, subThreadsName: str = None, subThreads: str = None,
+                        subProgramsName: str = None, subPrograms: str = None, interruptsName: str = None,
+                        interrupts: str = None, vars: dict = None) -> json:
+        """运行脚本函数，参数含义见Codroid.RunScript"""
+        return await self.Request(Message.run_script(mainProgram, subThreadsName, subThreads, subProgramsName,
+                                                     subPrograms, interruptsName, interrupts, vars))
+
+    # 2.2.1.2 进入远程脚本模式
+    async def EnterRemoteScriptMode(self) -> json:
+        """进入远程脚本模式"""
+        return await self.Request(Message.enter_remote_script_mode())
+
+    # 2.2.9.0 正解
+    async def Apos2Cpos(self, apos: list[float], coor: list[float] = None, tool: list[float] = None):
+        """将关节坐标转换为笛卡尔坐标，参数含义见Codroid.Apos2Cpos"""
+        return await self.Request(Message.apos_to_cpos(apos, coor, tool))
+
+    # 2.2.9.0 逆解
+    async def Cpos2Apos(self, cpos: list[float], reference_joint=None):
+        """将笛卡尔坐标转换为关节坐标，参数含义见Codroid.Cpos2Apos"""
+        return await self.Request(Message.cpos_to_apos(cpos, reference_joint))
+
+    # 2.2.11.1获取IO值
+    async def GetIOValue(self, data: list[dict]):
+        """获取IO值，data由字典组成{"type": "DI", "port": 0}"""
+        return await self.Request(Message.get_io_value(data))
+
+    #  2.2.11.2 写入IO值
+    async def SetIOValue(self, data):
+        """写入IO值，data由字典组成{"type": "DO", "port": 0, "value": 1}"""
+        return await self.Request(Message.set_io_value(data))
+
+    # 2.2.12.1 获取寄存器值
+    async def GetRegisterValue(self, addrlist: list[int]):
+        """获取寄存器值"""
+        return await self.Request(Message.get_register_value(addrlist))
+
+    # 2.2.12.2 写入寄存器值
+    async def SetRegisterValue(self, addrlist):
+        """写入寄存器值，addrlist形如{"address": 10000, "value": 0}"""
+        return await self.Request(Message.set_register_value(addrlist))
+
+    # 2.4.1 工程状态
+    async def GetProjectState(self, recvTime: int = 200):
+        """获取工程状态"""
+        return await self.Request(Message.subscribe_template("ProjectState", recvTime))
+
+    # 2.4.2 变量数据更新
+    async def GetVarUpdate(self, recvTime: int = 200):
+        """获取变量更新信息"""
+        return await self.Request(Message.subscribe_template("VarUpdate", recvTime))
+
+    # 2.4.3 机器人状态
+    async def GetRobotStates(self, recvTime: int = 200):
+        """获取机器人状态信息"""
+        return await self.Request(Message.subscribe_template("RobotStatus", recvTime))
+
+    # 2.4.4 机器人姿态
+    async def GetRobotPosture(self, recvTime: int = 200):
+        """获取机器人姿态信息"""
+        return await self.Request(Message.subscribe_template("RobotPosture", recvTime))
+
+    # 2.4.5 机器人坐标系
+    async def GetRobotCoordinate(self, recvTime: int = 200):
+        """获取机器人坐标信息"""
+        return await self.Request(Message.subscribe_template("obotCoordinate", recvTime))
+
+    # 2.4.6 系统日志
+    async def GetLog(self, recvTime: int = 200):
+        """获取日志信息"""
+        return await self.Request(Message.subscribe_template("Log", recvTime))
+
+    # 2.4.7 错误信息
+    async def GetError(self, recvTime: int = 200):
+        """获取错误信息"""
+        return await self.Request(Message.subscribe_template("Error", recvTime))
+
+    async def CRIStartDataPush(self, ip: str, port: int, duration: int):
+        """开始CRI数据推送，参数含义见Codroid.CRIStartDataPush"""
+        return await self.Request(Message.cri_start_data_push(ip, port, duration))
+
+    async def CRIStopDataPush(self):
+        """关闭CRI数据推送"""
+        return await self.Request(Message.cri_stop_data_push())
+
+    async def CRIStartControl(self, filterType: int, duration: int, startBuffer: int):
+        """开启CRI实时控制，参数含义见Codroid.CRIStartControl"""
+        return await self.Request(Message.cri_start_control(filterType, duration, startBuffer))
+
+    async def CRIStopControl(self):
+        """关闭CRI实时控制"""
+        return await self.Request(Message.cri_stop_control())
@@ -1,9 +1,18 @@
 # codroidSDK
 
 # 导入所需的标准库和自定义模块
-import json, math, time
-from TcpClient import TCPClient
-from json import JSONDecodeError, JSONDecoder
+import json, math, time, threading
+import JsonCodec
+import Message
+import Motion
+from Metrics import Metrics
+from PoseCache import PoseCache
+from StateMirror import RobotStateMirror
+from Subscriber import Subscription, TopicSubscriber
+from WireLog import WireRecorder
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from TcpClient import TCPClient, ThreadedTCPClient, CodroidTimeoutError
 from typing import Union
 from Define import *
 
@@ -42,21 +51,101 @@ class Codroid:
                       "resetMultiWeld", "searchStart", "setMasterFlag", "getOffsetValue", "search", "searchEnd",
                       "searchOffset", "searchOffsetEnd", "searchError"}
 
-    def __init__(self, ip, port):
+    def __init__(self, ip, port, threaded: bool = False, auto_reconnect: bool = False):
         """
         初始化Codroid对象
         
         参数:
-            ip (str): 机器人控制器的IP地址
+            ip (str): 机器人控制器的IP地址，"unix:路径"表示连接本机CodroidProxy的Unix域套接字
             port (int): 机器人控制器的端口号
+            threaded (bool): 并发模式，socket由独立I/O线程持有，任意线程均可安全调用本对象的接口
+            auto_reconnect (bool): 断线后按指数退避自动重连，并重放订阅、CRI数据推送和远程脚本模式
         """
-        self.heartbeat_thread = None
+        self.heartbeat_thread = None  # 共享心跳定时器（Motion.HeartbeatTimer），第一次发起异步运动或点动时设置
         self.ip = ip
         self.port = port
-        self.client = TCPClient(ip,port)
+        self.client = ThreadedTCPClient(ip, port) if threaded else TCPClient(ip,port)
+        self.client.auto_reconnect = auto_reconnect
         self.DEBUG = False
         self.isConnected = False
-        self.default_timeout = 5.0 # 默认超时时间（秒）
+        self.default_timeout = 5.0 # 默认超时时间（秒），None表示一直等待
+        self._local = threading.local()  # 按线程保存Timeout()覆盖的超时时间
+        self.subscriber = None  # TopicSubscriber，第一次调用Subscribe时在独立连接上创建
+        self.mirror = None  # RobotStateMirror，第一次调用StateMirror时创建
+        self.pool = []  # 批量坐标转换使用的附加连接，按需创建，Disconnect时关闭
+        self.pose_cache = None  # PoseCache，EnablePoseCache后Apos2Cpos/Cpos2Apos先查缓存
+        self._frame_watch = None  # 正逆解缓存对publish/RobotCoordinate的订阅
+
+    @contextmanager
+    def Timeout(self, seconds):
+        """
+        在with块内覆盖当前线程所有请求的超时时间
+
+        用法:
+            with cod.Timeout(0.5):
+                cod.GetDI(0)
+
+        参数:
+            seconds (float): 超时时间（秒），None表示一直等待
+        """
+        stack = self._local.__dict__.setdefault("timeouts", [])
+        stack.append(seconds)
+        try:
+            yield self
+        finally:
+            stack.pop()
+
+    def EnableMetrics(self, enable: bool = True) -> Metrics:
+        """
+        开启或关闭按报文类型的统计（编码、往返、解码耗时，收发字节数，超时次数）
+
+        参数:
+            enable (bool): True开启，False关闭；重复开启时保留已有数据
+
+        返回值:
+            Metrics: 统计对象，关闭时为None
+        """
+        if not enable:
+            self.client.metrics = None
+        elif self.client.metrics is None:
+            self.client.metrics = Metrics()
+        return self.client.metrics
+
+    def StartRecording(self, path: str) -> WireRecorder:
+        """
+        开始录制收发的报文，录制文件可用WireLog.WireReplayer离线回放
+
+        参数:
+            path (str): JSONL录制文件路径，已存在时追加
+
+        返回值:
+            WireRecorder: 录制器
+        """
+        self.StopRecording()
+        self.client.recorder = WireRecorder(path)
+        return self.client.recorder
+
+    def StopRecording(self):
+        """停止录制并关闭录制文件"""
+        recorder, self.client.recorder = self.client.recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    def GetMetrics(self) -> dict:
+        """
+        获取统计快照
+
+        返回值:
+            dict: {ty: {"encode_us", "rtt_us", "decode_us", "bytes_out", "bytes_in", "timeouts"}}，
+                  各项含count、mean、min、max、p50、p90、p99、p999；未开启统计时为空
+        """
+        metrics = self.client.metrics
+        return {} if metrics is None else metrics.snapshot()
+
+    def _timeout(self):
+        """当前线程生效的超时时间"""
+        stack = getattr(self._local, "timeouts", None)
+        return stack[-1] if stack else self.default_timeout
 
     def Connect(self):
         """建立与Codroid机器人的连接"""
@@ -70,6 +159,17 @@ class Codroid:
         """断开与Codroid的连接"""
         try:
             self.client.disconnect()
+            self.client.session.clear()
+            if self.subscriber is not None:
+                self.subscriber.Disconnect()
+                self.subscriber = None
+                self.mirror = None
+                self._frame_watch = None
+            if self.pose_cache is not None and self.pose_cache.path is not None:
+                self.pose_cache.save()
+            for codroid in self.pool:
+                codroid.Disconnect()
+            self.pool = []
             self.isConnected = False
         except Exception as e:
             print(e)
@@ -185,8 +285,8 @@ class Codroid:
         """
         if isinstance(json_data, str):
             try:
-                data = json.loads(json_data)
-            except json.JSONDecodeError:
+                data = JsonCodec.loads(json_data)
+            except ValueError:
                 return False
         else:
             data = json_data
@@ -267,25 +367,191 @@ class Codroid:
         # 检查目标键是否存在于tables中
         return tableName in tables_data
 
-    def _safe_parse_response(self,response: str):
+    def _request(self, message, ensure_ascii: bool = True):
         """
-        尝试安全解析 response:
-        1) 先用 self._safe_parse_response 解析全部
-        2) 失败时用 JSONDecoder.raw_decode 解析第一个 JSON 对象并返回
+        发送请求并返回与之匹配的应答
+
+        请求（publish/*除外）总是分配新的唯一id（覆盖报文中已有的id），应答按id匹配（publish/*按ty匹配），
+        中间收到的其他帧（publish/*推送、日志等）放入收件箱，可通过PollInbox()取走。
+        固定内容的请求可直接传入预编码的Message.MessageTemplate。
+
+        等待应答的时间为default_timeout，可用Timeout()覆盖；分多次到达的应答只按剩余时间等待。
+        超时抛出CodroidTimeoutError，连接保持可用，该请求迟到的应答会被丢弃。
+
+        参数:
+            message: 请求报文dict或Message.MessageTemplate
+            ensure_ascii (bool): 是否将非ASCII字符转义
+
+        返回值:
+            json: 应答，连接异常时为None
         """
-        if response is None:
+        timeout = self._timeout()
+        if isinstance(self.client, ThreadedTCPClient):
+            future = self.Submit(message, ensure_ascii)
+            try:
+                return future.result(timeout)
+            except FutureTimeoutError:
+                # 取消后I/O线程收到迟到的应答时直接跳过
+                future.cancel()
+                ty = message.ty if isinstance(message, Message.MessageTemplate) else message.get("ty")
+                if self.client.metrics is not None:
+                    self.client.metrics.record_timeout(ty)
+                raise CodroidTimeoutError(f"等待应答超时({timeout}s): {ty}") from None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        metrics = self.client.metrics
+        t0 = time.perf_counter_ns() if metrics is not None else 0
+        message_dict, data = Message.encode(message, ensure_ascii, force_id=True)
+        t1 = time.perf_counter_ns() if metrics is not None else 0
+        if not self.client.write(data, self.DEBUG):
+            # 请求尚未发出，重连成功后重发；已发出但应答丢失的请求可能已执行，不重发
+            if not (self.client.auto_reconnect and self.client.reconnect()):
+                return None
+            if not self.client.write(data, self.DEBUG):
+                return None
+        self.client.session.record(message)
+        try:
+            while (response := self.client.receive_message(self.DEBUG, deadline)) is not None:
+                if Message.is_reply(message_dict, response):
+                    if metrics is not None:
+                        decode_ns = self.client.last_decode_ns
+                        metrics.record(message_dict.get("ty"), t1 - t0, time.perf_counter_ns() - t1 - decode_ns,
+                                       decode_ns, len(data), self.client.last_frame_stats.nbytes)
+                    return response
+                self.client.route_unmatched(response, self.DEBUG)
+        except CodroidTimeoutError:
+            self.client.abandon(message_dict)
+            if metrics is not None:
+                metrics.record_timeout(message_dict.get("ty"))
+            raise CodroidTimeoutError(f"等待应答超时({timeout}s): {message_dict.get('ty')}") from None
+        return None
+
+    def PollInbox(self, ty: str = None) -> list:
+        """
+        取出未被请求认领的帧
+
+        等待应答期间读到的publish/*推送、日志等帧会按ty缓存（每个ty最多256帧，满时丢弃最旧的），
+        调用本函数取走。
+
+        参数:
+            ty (str): 只取该类型的帧，如"publish/Log"；为None时取出全部
+
+        返回值:
+            list: 按到达顺序排列的帧
+        """
+        return self.client.inbox.pop_all(ty)
+
+    def Subscribe(self, topic: str, period: int = 200, callback=None,
+                  policy: DropPolicy = DropPolicy.LatestOnly, maxlen: int = 256) -> Subscription | None:
+        """
+        长期订阅publish/*，替代每次调用GetRobotStates等接口时重新订阅、读取一帧
+
+        订阅在独立连接上进行（TopicSubscriber），后台线程按ty把推送帧交给回调或队列。
+        同一ty可多次订阅，与StateMirror()、EnablePoseCache()的内部订阅互不影响。
+
+        参数:
+            topic (str): 如"RobotStatus"、"RobotPosture"、"ProjectState"、"VarUpdate"、"Log"、"Error"
+            period (int): 推送周期（毫秒）
+            callback: 每帧在读线程中调用callback(frame)，不进入队列
+            policy (DropPolicy): LatestOnly只保留最新一帧，Lossless按顺序保留全部帧
+            maxlen (int): Lossless队列长度上限，满时新帧被丢弃并计入overflows
+
+        返回值:
+            Subscription: 用get()/get_all()/latest读取推送帧，连接失败时返回None
+        """
+        subscriber = self._topic_subscriber()
+        if subscriber is None:
             return None
+        return subscriber.Subscribe(topic, period, callback, policy, maxlen)
+
+    def _topic_subscriber(self) -> TopicSubscriber | None:
+        """订阅连接，第一次使用时建立"""
+        if self.subscriber is None:
+            subscriber = TopicSubscriber(self.ip, self.port, self.client.auto_reconnect)
+            if not subscriber.Connect():
+                return None
+            self.subscriber = subscriber
+        return self.subscriber
+
+    def Unsubscribe(self, topic):
+        """
+        停止投递Subscribe订阅的ty
+
+        参数:
+            topic: Subscribe返回的Subscription（只取消这一个），或ty名称（取消该ty下经Subscribe创建的全部订阅，
+                状态镜像和正逆解缓存的订阅不受影响）
+        """
+        if self.subscriber is not None:
+            self.subscriber.Unsubscribe(topic)
+
+    def StateMirror(self, period: int = 10) -> RobotStateMirror | None:
+        """
+        获取由推送持续更新的机器人状态镜像
+
+        mirror.snapshot为不可变快照（state、joints、cartesian、project_state、timestamp、seq），
+        任意线程读取都不需要网络往返；多次调用返回同一个镜像。
+
+        参数:
+            period (int): RobotStatus、RobotPosture、ProjectState的推送周期（毫秒）
+
+        返回值:
+            RobotStateMirror: 状态镜像，连接失败时返回None
+        """
+        if self.mirror is None:
+            subscriber = self._topic_subscriber()
+            if subscriber is None:
+                return None
+            self.mirror = RobotStateMirror(subscriber, period)
+            self.mirror.wait_update(0, self._timeout())  # 等到第一帧推送，返回的镜像立即可用
+        return self.mirror
+
+    def Submit(self, message, ensure_ascii: bool = True) -> Future:
+        """
+        提交请求并返回Future
+
+        并发模式下请求交给I/O线程发送，可在任意线程调用，立即返回；
+        普通模式下在当前线程同步完成请求，返回已完成的Future。
+
+        参数:
+            message: 请求报文dict或Message.MessageTemplate，可由Message模块中的函数构造
+            ensure_ascii (bool): 是否将非ASCII字符转义
+
+        返回值:
+            Future: 结果为应答json，连接异常时为None；并发模式下超时由调用方通过result(timeout)控制
+        """
+        if isinstance(self.client, ThreadedTCPClient):
+            self.client.debug = self.DEBUG
+            return self.client.submit(message, ensure_ascii)
+        future = Future()
         try:
-            return json.loads(response)
-        except JSONDecodeError:
-            try:
-                decoder = JSONDecoder()
-                obj, idx = decoder.raw_decode(response)
-                return obj
-            except JSONDecodeError:
-                # 最后回退：取首行再尝试解析（若返回中带有日志等）
-                first = response.splitlines()[0].strip()
-                return json.loads(first)
+            future.set_result(self._request(message, ensure_ascii))
+        except CodroidTimeoutError as e:
+            future.set_exception(e)
+        return future
+
+    def Pipeline(self) -> "CodroidPipeline":
+        """
+        创建请求流水线，多条请求连续写出后统一按id收取应答
+
+        用法:
+            with cod.Pipeline() as pipe:
+                io = pipe.Request(Message.get_io_value([{"type": "DI", "port": 0}]))
+                reg = pipe.Request(Message.get_register_value([9000, 9001]))
+                pos = pipe.Request(Message.subscribe_template("RobotPosture", 10))
+            print(io.result(), reg.result(), pos.result())
+        """
+        return CodroidPipeline(self)
+
+    def MotionQueue(self) -> Motion.MotionQueue:
+        """
+        创建运动队列，批量校验MovJ/MovL目标后连续执行
+
+        用法:
+            queue = cod.MotionQueue().MovJ(p1).MovL(p2).MovJ(p3)
+            if queue.Validate():
+                queue.Run()                      # 或queue.RunCRI(velocity=30, blend=0.2)
+            print(queue.Summary())
+        """
+        return Motion.MotionQueue(self)
     
     
     # 2.2.1.1 运行脚本
@@ -304,66 +570,24 @@ class Codroid:
             interruptsName (str, optional): 中断处理程序名称
             interrupts (str, optional): 中断处理程序代码
             vars (dict, optional): 脚本运行时变量字典
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
             
         返回值:
             json: 脚本执行结果的JSON响应
         """
-        if mainProgram is None:
-            raise Exception("主程序不能为空")
-        if vars is None:
-            vars = {}
-        
-        # 构建消息字典，包含脚本信息和变量
-        message_dict = {
-            "id": id,
-            "ty": "project/runScript",
-            "db": {
-                "scripts": {
-                    "main": mainProgram,
-                },
-                "vars": vars
-            }
-        }
-        
-        # 添加子线程脚本（如果提供）
-        if subThreadsName is not None and subThreads is not None:
-            message_dict["db"]["scripts"]["subThreads"] = {
-                subThreadsName: subThreads
-            }
-            
-        # 添加子程序脚本（如果提供）
-        if subProgramsName is not None and subPrograms is not None:
-            message_dict["db"]["scripts"]["subPrograms"] = {
-                subProgramsName: subPrograms
-            }
-            
-        # 添加中断处理脚本（如果提供）
-        if interruptsName is not None and interrupts is not None:
-            message_dict["db"]["scripts"]["interrupts"] = {
-                interruptsName: interrupts
-            }
-
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.run_script(mainProgram, subThreadsName, subThreads, subProgramsName, subPrograms,
+                                                interruptsName, interrupts, vars, id))
 
     # 2.2.1.2 进入远程脚本模式
     def EnterRemoteScriptMode(self, id :int = 1) -> json:
         """
         进入远程脚本模式
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
         返回值:
             json: 模式切换命令的响应结果
         """
-        message_dict = {
-            "id": id,
-            "ty": "project/enterRemoteScriptMode"
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.enter_remote_script_mode(id))
 
     # 2.2.1.3 运行工程
     def RunProject(self, project_id: str, id :int = 1) -> json:
@@ -371,7 +595,7 @@ class Codroid:
         运行指定项目
 
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
             project_id (str): 项目ID
 
         返回值:
@@ -384,9 +608,7 @@ class Codroid:
                 "id": project_id
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.4 通过工程映射启动程序
     def RunProjectByIndex(self, index:int ,id :int = 1) -> json:
@@ -394,7 +616,7 @@ class Codroid:
         运行指定项目
 
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
             index (int): 索引号
 
         返回值:
@@ -405,9 +627,7 @@ class Codroid:
             "ty": "project/runByIndex",
             "db": index
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.1.4 单步运行
     def RunStep(self, project_id: str ,id :int = 1) -> json:
@@ -415,7 +635,7 @@ class Codroid:
         单步运行指定项目
 
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
             project_id (str): 项目ID
 
         返回值:
@@ -428,16 +648,14 @@ class Codroid:
                 "id": project_id
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.1.5 暂停工程
     def PauseProject(self, id :int = 1) -> json:
         """
         暂停项目执行
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
         返回值:
             json: 暂停命令的响应结果
         """
@@ -445,16 +663,14 @@ class Codroid:
             "id": id,
             "ty": "project/pause"
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.1.6 恢复运行工程
     def ResumeProject(self, id :int = 1) -> json:
         """
         恢复项目执行
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
         返回值:
             json: 恢复命令的响应结果
         """
@@ -462,16 +678,14 @@ class Codroid:
             "id": id,
             "ty": "project/resume"
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.1.7 停止运行工程
     def StopProject(self, id :int = 1) -> json:
         """
         停止项目执行
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
         返回值:
             json: 停止命令的响应结果
         """
@@ -479,9 +693,7 @@ class Codroid:
             "id": id,
             "ty": "project/stop"
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.1.8 设置断点
     def SetBreakpoint(self, project_id: str, line_number: list, id :int = 1):
@@ -489,7 +701,7 @@ class Codroid:
         设置断点
 
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
             project_id (str): 项目ID
             line_number (list): 断点行号列表
 
@@ -503,9 +715,7 @@ class Codroid:
                 project_id: line_number
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.1.9 添加断点
     def AddBreakpoint(self, project_id: str, line_number: list[int], id :int = 1):
@@ -513,7 +723,7 @@ class Codroid:
         添加断点
 
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
             project_id (str): 项目ID
             line_number (list): 要添加的断点行号列表
 
@@ -527,9 +737,7 @@ class Codroid:
                 project_id: line_number
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.1.10 删除断点
     def RemoveBreakpoint(self, project_id: str, line_number: list[int], id :int = 1):
@@ -537,7 +745,7 @@ class Codroid:
         移除断点
 
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
             project_id (str): 项目ID
             line_number (list): 要移除的断点行号列表
 
@@ -551,16 +759,14 @@ class Codroid:
                 project_id: line_number
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.1.11 清除所有断点
     def ClearBreakpoint(self, id :int = 1):
         """
         清除所有断点
         参数:
-             id (int, optional): 请求ID，默认为1
+             id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
         返回值:
             json: 清除断点命令的响应结果
         """
@@ -568,9 +774,7 @@ class Codroid:
             "id": id,
             "ty": "project/clearBreakpoint",
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.1.12 设置启动行
     def SetStartLine(self, start_line: int, id :int = 1):
@@ -578,7 +782,7 @@ class Codroid:
         设置起始行
 
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
             start_line (int): 起始行号
 
         返回值:
@@ -589,9 +793,7 @@ class Codroid:
             "ty": "project/setStartLine",
             "db": start_line
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.1.13 清除从指定行运行
     def ClearStartLine(self, id :int = 1):
@@ -599,7 +801,7 @@ class Codroid:
         清除起始行设置
 
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
         返回值:
             json: 清除起始行命令的响应结果
         """
@@ -607,16 +809,14 @@ class Codroid:
             "id": id,
             "ty": "project/clearStartLine"
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.2.3 获取全局变量
     def GetGlobalVars(self, id :int = 1) -> json:
         """
         获取全局变量
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
         返回值:
             json: 全局变量信息
         """
@@ -624,9 +824,7 @@ class Codroid:
             "id": id,
             "ty": "globalVar/getVars"
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.2.4 保存全局变量
     def SetGlobalVar(self, name: str, value: Union[str, float, dict, list], note: str = " ",id :int = 1) -> dict:
@@ -634,7 +832,7 @@ class Codroid:
         设置单个全局变量 - 统一实现
 
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
             name (str): 变量名
             value: 变量值（支持多种类型）
             note (str): 变量备注
@@ -660,9 +858,7 @@ class Codroid:
             }
         }
 
-        message_str = json.dumps(message_dict, ensure_ascii=False)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict, ensure_ascii=False)
 
     # 2.2.2.4 保存全局变量
     def __SetGlobalVars(self, value: list, id: int = 1) -> json:
@@ -670,7 +866,7 @@ class Codroid:
         批量设置全局变量
 
         参数:
-            id (int, optional): 请求ID，默认为1
+            id (int, optional): 已弃用，仅为兼容保留；请求id总是自动分配
             value: 变量名和值的列表，每个元素是包含name和value的字典
             {变量名1": {"nm": "变量备注1", "val": "变量值1"},变量名2": {"nm": "变量备注2", "val": "变量值2"}}
         返回值:
@@ -682,9 +878,7 @@ class Codroid:
             "ty": "globalVar/saveVars",
             "db": format_value
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.2.5 删除全局变量
     def RemoveGlobalVars(self, value_name: list, id: int = 1) -> json:
@@ -702,9 +896,7 @@ class Codroid:
             "ty": "globalVar/removeVars",
             "db": value_name
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.3.1 获取当前所有工程变量值
     def GetProjectVars(self) -> json:
@@ -714,13 +906,7 @@ class Codroid:
         返回值:
             json: 项目变量信息
         """
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "globalVar/GetProjectVarUpdate"
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.fixed_template("globalVar/GetProjectVarUpdate"))
 
     # 2.2.4.1 485初始化
     def RS485Init(self, baud_rate: int = 115200, stop_bit: int = 1, data_bit: int = 8, parity: int = 0):
@@ -737,7 +923,6 @@ class Codroid:
             json: 初始化命令的响应结果
         """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "EC2RS485/init",
             "db": {
                 "baudrate": baud_rate,
@@ -746,9 +931,7 @@ class Codroid:
                 "parity": parity
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.4.2 485清空缓存
     def RS485FlushReadBuffer(self):
@@ -758,13 +941,7 @@ class Codroid:
         返回值:
             json: 清空缓冲区命令的响应结果
         """
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "EC2RS485/flushReadBuffer"
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.fixed_template("EC2RS485/flushReadBuffer"))
 
     # 2.2.4.3 485读取数据
     def RS485Read(self, length: int, timeout: int = 3000):
@@ -779,16 +956,13 @@ class Codroid:
             json: 读取数据命令的响应结果
         """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "EC2RS485/read",
             "db": {
                 "length": length,
                 "timeout": timeout
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str)
-        return json.loads(response)
+        return self._request(message_dict)
 
     # 2.2.4.4 485发送数据
     def RS485Write(self, data: list[int] ):
@@ -802,13 +976,10 @@ class Codroid:
             json: 写入数据命令的响应结果
         """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "EC2RS485/write",
             "db": data
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.5.1 ModbusTcp创建设备连接
     def SetModbusTcpDevice(self,devicename: str, ip: str, port: int,slavedId: int = 1,endian:int = 1):
@@ -832,7 +1003,6 @@ class Codroid:
             raise ValueError(f"无效的变量名: {devicename}")
 
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "ModbusTcp/setDevice",
             "db": {
                 "name": devicename,
@@ -842,9 +1012,7 @@ class Codroid:
                 "endian": endian
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.5.1 ModbusTcp创建设备连接
     def ResetModbusTcpDevice(self,devicename: str, ip: str, port: int,slavedId: int = 1,endian:int = 1):
@@ -868,7 +1036,6 @@ class Codroid:
             raise ValueError(f"无效的变量名: {devicename}")
 
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "ModbusTcp/setDevice",
             "db": {
                 "name": devicename,
@@ -878,9 +1045,7 @@ class Codroid:
                 "endian": endian
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.5.2 ModbusTcp删除连接设备
     def RemoveModbusTcpDevice(self,devicename: str):
@@ -896,15 +1061,12 @@ class Codroid:
         if not self.__has_deviceName( self.GetModbusTcpConfig(),devicename):
             raise ValueError(f"设备不存在: {devicename}")
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "ModbusTcp/removeDevice",
             "db": {
                 "name": devicename
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.5.3 创建/修改通信表
     def SetModbusTcpTable(self,devicename: str,tablename:str,functionCode: ModbusTcpFunctionCodeType,address: int,length: int,period: int = 1000):
@@ -934,7 +1096,6 @@ class Codroid:
         if not self.__is_valid_variable_name(tablename):
             raise ValueError(f"无效的变量名: {tablename}")
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "ModbusTcp/setTable",
             "db": {
                 "name": devicename,
@@ -945,9 +1106,7 @@ class Codroid:
                 "period": period
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.5.3 创建/修改通信表
     def ResetModbusTcpTable(self, devicename: str, tablename: str, functionCode: ModbusTcpFunctionCodeType, address: int, length: int,
@@ -980,7 +1139,6 @@ class Codroid:
             raise ValueError(f"无效的变量名: {tablename}")
 
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "ModbusTcp/setTable",
             "db": {
                 "name": devicename,
@@ -991,9 +1149,7 @@ class Codroid:
                 "period": period
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.5.4 删除通信表
     def RemoveModbusTcpTable(self, devicename: str, tablename: str):
@@ -1014,16 +1170,13 @@ class Codroid:
         if not self.__has_tableName( self.GetModbusTcpConfig(),devicename,tablename):
             raise ValueError(f"表不存在: {tablename}")
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "ModbusTcp/removeTable",
             "db": {
                 "name": devicename,
                 "tableName": tablename
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.5.5 修改表的通信周期
     def SetModbusTcpPeriod(self, devicename: str, tablename: str, period: int):
@@ -1048,7 +1201,6 @@ class Codroid:
 
 
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "ModbusTcp/setPeriod",
             "db": {
                 "name": devicename,
@@ -1056,9 +1208,7 @@ class Codroid:
                 "period": period
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.5.6 给地址设置别名
     def SetModbusTcpTableName(self, devicename: str, tablename: str,address: int,aliasname: str):
@@ -1086,7 +1236,6 @@ class Codroid:
         if not self.__is_valid_variable_name(aliasname):
             raise ValueError(f"无效的变量名: {aliasname}")
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "ModbusTcp/setName",
             "db": {
                 "name": devicename,
@@ -1095,9 +1244,7 @@ class Codroid:
                 "alias": aliasname
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.5.7 给地址段设置数据类型
     def SetModbusTcpTableType(self, devicename: str, tablename: str,address: int,datatype: ModbusTcpTableType,length: int):
@@ -1127,7 +1274,6 @@ class Codroid:
             raise ValueError(f"表不存在: {tablename}")
 
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "ModbusTcp/setType",
             "db": {
                 "name": devicename,
@@ -1137,9 +1283,7 @@ class Codroid:
                 "count": length
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.5.8 修改地址的值
     def SetModbusTcpValue(self, devicename: str, tablename: str,address: int,value: int):
@@ -1164,7 +1308,6 @@ class Codroid:
             raise ValueError(f"表不存在: {tablename}")
 
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "ModbusTcp/setVal",
             "db": {
                 "name": devicename,
@@ -1173,9 +1316,7 @@ class Codroid:
                 "val": value
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.5.9 获取所有设备配置
     def GetModbusTcpConfig(self):
@@ -1186,13 +1327,7 @@ class Codroid:
              json: 写入数据命令的响应结果
 
         """
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "ModbusTcp/getConfig"
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.fixed_template("ModbusTcp/getConfig"))
 
     # 2.2.5.10 获取所有设备状态
     def GetModbusTcpState(self):
@@ -1203,13 +1338,7 @@ class Codroid:
             json: 写入数据命令的响应结果
 
         """
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "ModbusTcp/getState"
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.fixed_template("ModbusTcp/getState"))
 
     # 2.2.5.11 获取表的值
     def GetModbusTcpValue(self, devicename: str, tablename: str) -> list:
@@ -1252,16 +1381,14 @@ class Codroid:
         if len(jntActualPos) != 6:
             raise Exception("jntTargetPos变量至少为6位")
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Robot/IsOnGivenSamplePosition",
             "db":{
                 "jntTargetPos": jntTargetPos,
                 "jntActualPos": jntActualPos
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return bool(self._safe_parse_response(response)["db"])
+        response = self._request(message_dict)
+        return bool(response["db"])
 
     # 2.2.6.2传感器数据采样
     def PayloadLoadIdenJSSample(self):
@@ -1272,13 +1399,7 @@ class Codroid:
              json: 写入数据命令的响应结果
 
         """
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "Robot/LoadIdenJSSample"
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.fixed_template("Robot/LoadIdenJSSample"))
 
     # 2.2.6.3负载辨识计算接口
     def PayloadIdentificationJS(self,payload:PayloadList):
@@ -1295,7 +1416,6 @@ class Codroid:
             raise Exception("payload变量至少为4位")
 
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Robot/PayloadIdentificationJS",
             "db":[{
                 "jntPos": payload[0].jntPos,
@@ -1319,9 +1439,7 @@ class Codroid:
              }
              ]
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.7.1初始化拖动参数
     def SetDefaultDragParam(self):
@@ -1332,13 +1450,7 @@ class Codroid:
              json: 写入数据命令的响应结果
 
         """
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "Robot/SetDefaultServoDragParam"
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.fixed_template("Robot/SetDefaultServoDragParam"))
 
     # 2.2.7.2获取拖动灵敏度
     def GetDragSensitivity(self) -> int:
@@ -1349,13 +1461,8 @@ class Codroid:
              int:拖动灵敏度 0-100
 
         """
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "Robot/GetDragSensitivity"
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return int(self._safe_parse_response(response)["db"]["sensitivity"])
+        response = self._request(Message.fixed_template("Robot/GetDragSensitivity"))
+        return int(response["db"]["sensitivity"])
 
     # 2.2.7.3获取拖动模式
     def GetDragMode(self) -> int:
@@ -1366,13 +1473,8 @@ class Codroid:
              int: 拖动模式 0->老版拖动, 2->新版拖动
 
         """
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "Robot/GetDragMode"
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return int(self._safe_parse_response(response)["db"])
+        response = self._request(Message.fixed_template("Robot/GetDragMode"))
+        return int(response["db"])
 
     # 2.2.7.4开启/关闭拖动姿态锁
     def SetCartOriLock(self, enable: bool) -> bool:
@@ -1387,15 +1489,13 @@ class Codroid:
 
         """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Robot/SetCartOriLock",
             "db": {
                 "cartOriLock": enable
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return bool(self._safe_parse_response(response)["db"])
+        response = self._request(message_dict)
+        return bool(response["db"])
 
     # 2.2.7.5获取拖动姿态锁的状态
     def GetCartOriLockState(self) -> bool:
@@ -1406,13 +1506,8 @@ class Codroid:
              bool: 拖动姿态锁的状态
 
         """
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "Robot/GetCartOriLockState"
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return bool(self._safe_parse_response(response)["db"])
+        response = self._request(Message.fixed_template("Robot/GetCartOriLockState"))
+        return bool(response["db"])
 
     # 2.2.8.1获取编码器计数
     def GetEncoderCount(self,index:int) -> int:
@@ -1426,15 +1521,13 @@ class Codroid:
 
         """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Conveyor/getEncoderCount",
             "db": {
                 "index": index
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)["db"]
+        response = self._request(message_dict)
+        return response["db"]
 
     # 2.2.8.2使能传送带
     def EnableConveyor(self, index:int):
@@ -1450,15 +1543,12 @@ class Codroid:
 
         """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Conveyor/enableConveyor",
             "db": {
                 "index": index
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.8.3取消使能传送带
     def DisableConveyor(self, index: int):
@@ -1471,15 +1561,12 @@ class Codroid:
               json: 写入数据命令的响应结果
         """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Conveyor/disableConveyor",
             "db": {
                 "index": index
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.8.4传送带当量标定
     def CalibrateConveyor(self, index: int, startpoint: list[float], startcount: int, endpoint: list[float], endcount: int) -> int:
@@ -1498,7 +1585,6 @@ class Codroid:
         if len(startpoint) != 6 or len(endpoint) != 6:
             raise "起始点参数错误"
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Conveyor/calibrateConveyor",
             "db": {
                 "index": index,
@@ -1512,9 +1598,8 @@ class Codroid:
                 }
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return int(self._safe_parse_response(response)["db"])
+        response = self._request(message_dict)
+        return int(response["db"])
 
     # 2.2.8.5设置传送带配置参数
     def SetConveyorConfig(self, config: ConveyorConfig):
@@ -1528,14 +1613,11 @@ class Codroid:
         """
         config_dict = config.to_dict()
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Conveyor/setConfig",
             "db": config_dict
         }
 
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.8.6获取传送带配置参数
     def GetConveyorConfig(self, index: int) -> dict:
@@ -1548,15 +1630,13 @@ class Codroid:
               json: 写入数据命令的响应结果
         """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Conveyor/getConfig",
             "db": {
                 "index": index,
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return ConveyorConfig.to_dict(self._safe_parse_response(response)["db"].tostring())
+        response = self._request(message_dict)
+        return ConveyorConfig.to_dict(response["db"].tostring())
 
     #  2.2.8.7 使用TCP连接相机
     def ConveyorConnectCamera(self,index:int):
@@ -1569,15 +1649,12 @@ class Codroid:
              json: 写入数据命令的响应结果
        """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Conveyor/connectCamera",
             "db": {
                 "index": index,
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     #  2.2.8.8 断开相机连接
     def ConveyorDisconnectCamera(self, index: int):
@@ -1590,15 +1667,12 @@ class Codroid:
              json: 写入数据命令的响应结果
        """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Conveyor/disconnectCamera",
             "db": {
                 "index": index,
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     #  2.2.8.9 获取相机状态
     def ConveyorGetCameraState(self, index: int):
@@ -1612,15 +1686,12 @@ class Codroid:
              "state":相机状态 0：未连接 1：已连接
        """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Conveyor/getCameraState",
             "db": {
                 "index": index,
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     #  2.2.8.10 发送消息到相机
     def ConveyorSendMsgToCamera(self, index: int,msg: str):
@@ -1634,16 +1705,13 @@ class Codroid:
              json: 写入数据命令的响应结果
        """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Conveyor/sendMsgToCamera",
             "db": {
                 "index": index,
                 "msg": msg
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     #  2.2.8.11 获取上次触发DI时的编码器计数
     def ConveyorGetDItriggerEncoderCount(self, index: int) ->int:
@@ -1656,15 +1724,13 @@ class Codroid:
             int: 上一次触发DI时的编码器计数
         """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Conveyor/getDItriggerEncoderCount",
             "db": {
                 "index": index
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return int(self._safe_parse_response(response)["db"])
+        response = self._request(message_dict)
+        return int(response["db"])
 
     # 2.2.8.12 标定DI信号触发位置
     def ConveyorCalibrateDItriggerPos(self,index:int,x:float,startcount:int,endcount:int) -> float:
@@ -1680,7 +1746,6 @@ class Codroid:
             float: DI信号触发时的x坐标
         """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "Conveyor/calibrateDItriggerPos",
             "db": {
                 "index": index,
@@ -1689,9 +1754,8 @@ class Codroid:
                 "endcount": endcount
             }
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return float(self._safe_parse_response(response)["db"])
+        response = self._request(message_dict)
+        return float(response["db"])
 
     # 2.2.9.0 正解
     def Apos2Cpos(self, apos: list[float], coor: list[float] = None, tool: list[float] = None):
@@ -1706,25 +1770,10 @@ class Codroid:
         返回值:
             json: 坐标转换命令的响应结果
         """
-        if len(apos) != 6:
-            raise ValueError("cpos参数长度必须为6")
-        if coor is None:
-            coor = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
-        if tool is None:
-            tool = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "Robot/apostocpos",
-            "db": {
-                "jp": apos,
-                "coor": coor,
-                "tool": tool,
-                "ep": []
-            }
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        cache = self.pose_cache
+        if cache is None:
+            return self._request(Message.apos_to_cpos(apos, coor, tool))
+        return self.__CachedRequest(cache.fk_key(apos, coor, tool), Message.apos_to_cpos(apos, coor, tool))
 
     # 2.2.9.0 逆解
     def Cpos2Apos(self, cpos: list[float], reference_joint=None):
@@ -1738,30 +1787,162 @@ class Codroid:
         返回值:
             json: 坐标转换命令的响应结果
         """
-        if len(cpos) != 6:
-            raise ValueError("cpos参数长度必须为6")
-        if reference_joint is None:
-            reference_joint = [20,20,20,20,20,20]
-        if len(reference_joint) != 6:
-            raise ValueError("reference_joint参数长度必须为6")
-        else:
-            reference_joint = [math.radians(reference_joint[0]), math.radians(reference_joint[1]),
-                               math.radians(reference_joint[2]), math.radians(reference_joint[3]),
-                               math.radians(reference_joint[4]), math.radians(reference_joint[5])]
+        cache = self.pose_cache
+        if cache is None:
+            return self._request(Message.cpos_to_apos(cpos, reference_joint))
+        return self.__CachedRequest(cache.ik_key(cpos, reference_joint), Message.cpos_to_apos(cpos, reference_joint))
 
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "Robot/cpostoapos",
-            "db": {
-                "cp": [cpos[0], cpos[1], cpos[2], cpos[3], cpos[4], cpos[5]],
-                "rj": [reference_joint[0], reference_joint[1], reference_joint[2], reference_joint[3],
-                       reference_joint[4], reference_joint[5]],
-                "ep": []
-            }
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+    def __CachedRequest(self, key: tuple, message: dict):
+        response = self.pose_cache.get(key)
+        if response is None:
+            response = self._request(message)
+            self.pose_cache.put(key, response)
+        return response
+
+    def EnablePoseCache(self, maxsize: int = 4096, tolerance: float = 1e-3, reference_tolerance: float = 1.0,
+                        path: str = None, watch_frames: bool = True) -> PoseCache:
+        """
+        启用正逆解缓存：Apos2Cpos、Cpos2Apos及其批量版本先按量化后的位姿查缓存，未命中才访问控制器
+
+        参数:
+            maxsize (int): 最多缓存的条数，超出时淘汰最久未使用的
+            tolerance (float): 位姿量化步长（mm/度），相差不超过该值的位姿共用同一结果
+            reference_tolerance (float): 逆解参考关节角的量化步长（度）
+            path (str): 持久化文件，存在时载入，Disconnect/DisablePoseCache时保存
+            watch_frames (bool): 订阅publish/RobotCoordinate，工具/用户坐标系变化时清除逆解缓存
+
+        返回值:
+            PoseCache: 缓存对象，可查看hits/misses或手动invalidate()
+        """
+        self.DisablePoseCache()
+        cache = PoseCache(maxsize, tolerance, reference_tolerance, path)
+        self.pose_cache = cache
+        if watch_frames:
+            subscriber = self._topic_subscriber()
+            if subscriber is None:
+                print("订阅坐标系失败，坐标系变化后需手动调用pose_cache.invalidate()")
+            else:
+                # 缓存自己的订阅，与用户对RobotCoordinate的订阅互不影响
+                self._frame_watch = subscriber.Subscribe(
+                    "RobotCoordinate", 200, callback=lambda frame: cache.update_frames(frame.get("db")), owner=cache)
+        return cache
+
+    def DisablePoseCache(self):
+        """停用正逆解缓存，设置了持久化文件时保存"""
+        cache, self.pose_cache = self.pose_cache, None
+        if cache is None:
+            return
+        watch, self._frame_watch = self._frame_watch, None
+        if watch is not None and self.subscriber is not None:
+            self.subscriber.Unsubscribe(watch)
+        if cache.path is not None:
+            cache.save()
+
+    def Apos2CposBatch(self, apos, coor: list[float] = None, tool: list[float] = None,
+                       pool: int = 1, chunk: int = 100):
+        """
+        批量正解：N条Robot/apostocpos经流水线连续写出，不再逐条等待往返
+
+        参数:
+            apos: (N, 6) 关节角（度），numpy数组或嵌套列表
+            coor (list[float]): 用户坐标系 [x, y, z, rx, ry, rz]
+            tool (list[float]): 工具坐标系 [x, y, z, rx, ry, rz]
+            pool (int): 并行使用的连接数，大于1时按需建立附加连接（保存在self.pool中复用）
+            chunk (int): 每轮流水线的请求数
+
+        返回值:
+            tuple: (cpos, errors)，cpos为(N, 6)数组，errors为(N,)布尔数组，出错的行cpos为nan
+        """
+        import numpy as np
+        apos = np.asarray(apos, dtype=float).reshape(-1, 6)
+        rows = apos.tolist()
+        messages = [Message.apos_to_cpos(row, coor, tool) for row in rows]
+        keys = None if self.pose_cache is None else [self.pose_cache.fk_key(row, coor, tool) for row in rows]
+        return self.__ConvertBatch(messages, "cp", pool, chunk, keys)
+
+    def Cpos2AposBatch(self, cpos, reference_joint=None, pool: int = 1, chunk: int = 100):
+        """
+        批量逆解：N条Robot/cpostoapos经流水线连续写出，不再逐条等待往返
+
+        参数:
+            cpos: (N, 6) 笛卡尔坐标，numpy数组或嵌套列表
+            reference_joint: 参考关节角（度），(6,)为全部共用，(N, 6)为逐行指定
+            pool (int): 并行使用的连接数，大于1时按需建立附加连接（保存在self.pool中复用）
+            chunk (int): 每轮流水线的请求数
+
+        返回值:
+            tuple: (apos, errors)，apos为(N, 6)数组，errors为(N,)布尔数组，出错的行apos为nan
+        """
+        import numpy as np
+        cpos = np.asarray(cpos, dtype=float).reshape(-1, 6)
+        degrees = [20, 20, 20, 20, 20, 20] if reference_joint is None else reference_joint
+        degrees = np.broadcast_to(np.asarray(degrees, dtype=float), cpos.shape)
+        rows = cpos.tolist()
+        messages = [Message.cpos_to_apos(c, r, radians=True) for c, r in zip(rows, np.radians(degrees).tolist())]
+        keys = None
+        if self.pose_cache is not None:
+            references = [None] * len(rows) if reference_joint is None else degrees.tolist()
+            keys = [self.pose_cache.ik_key(c, r) for c, r in zip(rows, references)]
+        return self.__ConvertBatch(messages, "jp", pool, chunk, keys)
+
+    def __ConvertBatch(self, messages: list, key: str, pool: int, chunk: int, keys: list = None):
+        """
+        把messages按连接数分段，每段在各自的连接上按chunk条一轮流水线发送，收集结果；
+        给出keys（正逆解缓存的键）时先查缓存，只发送未命中的行，成功的应答写回缓存
+        """
+        import numpy as np
+        result = np.full((len(messages), 6), np.nan)
+        errors = np.ones(len(messages), dtype=bool)
+        todo = list(range(len(messages)))
+        if keys is not None:
+            todo = []
+            for row, cache_key in enumerate(keys):
+                pose = Message.reply_pose(self.pose_cache.get(cache_key), key)
+                if isinstance(pose, str):
+                    todo.append(row)
+                else:
+                    result[row] = pose
+                    errors[row] = False
+            if not todo:
+                return result, errors
+        while len(self.pool) < pool - 1:
+            codroid = Codroid(self.ip, self.port)
+            codroid.default_timeout = self.default_timeout
+            if not codroid.client.connect():
+                break
+            codroid.isConnected = True
+            self.pool.append(codroid)
+        clients = [self] + self.pool[:max(pool - 1, 0)]
+        size = -(-len(todo) // len(clients))
+
+        def convert(codroid, start: int, stop: int):
+            for low in range(start, stop, chunk):
+                rows = todo[low:min(low + chunk, stop)]
+                pipe = codroid.Pipeline()
+                futures = [pipe.Request(messages[row]) for row in rows]
+                timeouts = sum(isinstance(r, CodroidTimeoutError) for r in pipe.Execute())
+                if timeouts:
+                    print(f"批量坐标转换超时: {timeouts}/{len(rows)}条")
+                for row, future in zip(rows, futures):
+                    try:
+                        response = future.result()
+                    except CodroidTimeoutError:
+                        continue
+                    pose = Message.reply_pose(response, key)
+                    if not isinstance(pose, str):
+                        result[row] = pose
+                        errors[row] = False
+                        if keys is not None:
+                            self.pose_cache.put(keys[row], response)
+
+        spans = [(codroid, i * size, min((i + 1) * size, len(todo))) for i, codroid in enumerate(clients)]
+        if len(spans) == 1:
+            convert(*spans[0])
+        else:
+            with ThreadPoolExecutor(len(spans)) as executor:
+                for future in [executor.submit(convert, *span) for span in spans]:
+                    future.result()
+        return result, errors
 
     # 2.2.10.0 点动
     def Jog(self, mode: JogMode, speed: float, index: int,coorid: int):
@@ -1780,7 +1961,6 @@ class Codroid:
         """
 
         message_dict = {
-            "id": "m8y21rn20ws8a974",
             "ty": "Robot/jog",
             "db": {
                 "mode": mode.value,
@@ -1789,9 +1969,24 @@ class Codroid:
                 "coorId": coorid,
                 }
             }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
+
+    def JogAsync(self, mode: JogMode, speed: float, index: int, coorid: int, timeout: float = None):
+        """
+        开始点动并由共享定时器每500ms发送点动心跳，直到cancel()或超时
+
+        参数:
+            mode, speed, index, coorid: 同Jog
+            timeout (float): 最长点动时间（秒），到时发送StopJog；None表示直到取消
+
+        返回值:
+            MotionHandle: cancel()停止心跳并发送StopJog，点动命令失败时为None
+        """
+        if self.Jog(mode, speed, index, coorid) is None:
+            return None
+        self.heartbeat_thread = Motion.heartbeat_timer()
+        return Motion.MotionHandle(self, None, Message.fixed_template("Robot/jogHeartbeat", ""),
+                                   stop=Message.fixed_template("Robot/stopJog", ""), timeout=timeout)
 
     # 2.2.10.0 点动
     def StopJog(self):
@@ -1803,14 +1998,7 @@ class Codroid:
             json: 响应结果
         """
 
-        message_dict = {
-            "id": "m8y21rn20ws8a974",
-            "ty": "Robot/stopJog",
-            "db": ""
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.fixed_template("Robot/stopJog", ""))
 
     # 2.2.10.0 点动心跳
     def JogHeartbeat(self):
@@ -1822,14 +2010,7 @@ class Codroid:
             json: 响应结果
         """
 
-        message_dict = {
-            "id": "m8y21rn20ws8a974",
-            "ty": "Robot/jogHeartbeat",
-            "db": ""
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.fixed_template("Robot/jogHeartbeat", ""))
 
 
     # 2.2.10.1 MoveTo
@@ -1850,7 +2031,6 @@ class Codroid:
         message_dict = None
         if movType in {MoveType.Home, MoveType.Candle, MoveType.Faulty, MoveType.Package, MoveType.Safety}:
             message_dict = {
-                "id": "m8y21rn20ws8a974",
                 "ty": "Robot/moveTo",
                 "db": {
                     "type": movType.value
@@ -1860,7 +2040,6 @@ class Codroid:
             if cpos is None:
                 raise ValueError("cpos不能为空")
             message_dict = {
-                "id": "m8y21rn20ws8a974",
                 "ty": "Robot/moveTo",
                 "db": {
                     "type": movType.value,
@@ -1875,7 +2054,6 @@ class Codroid:
             if apos is None:
                 raise ValueError("apos不能为空")
             message_dict = {
-                "id": "m8y21rn20ws8a974",
                 "ty": "Robot/moveTo",
                 "db": {
                     "type": movType.value,
@@ -1886,9 +2064,7 @@ class Codroid:
                     }
                 }
             }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.10.2 MoveTo心跳
     def __MoveToHeartbeatOnce(self):
@@ -1901,168 +2077,176 @@ class Codroid:
         返回值:
             json: 心跳信号的响应结果
         """
-        message_dict = {
-            "id": "m8y21rn20ws74",
-            "ty": "Robot/moveToHeartbeat"
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.fixed_template("Robot/moveToHeartbeat"))
 
-    # 2.2.10.2 MoveTo心跳
-    def __MoveToHeartbeatAlways(self, _time: float = 0.5):
+    def __MoveAndWait(self, movType: MoveType, cpos: list[float] = None, apos: list[float] = None,
+                      timeout: float = None, callback=None, wait: bool = True):
         """
-        循环发送心跳信号，配合MoveTo使用，需要在MoveTo调用后
-        
+        发送moveTo并等待运动完成
+
+        运动完成由publish/RobotStatus推送（StateMirror）驱动，心跳由共享定时器每0.5s发送一次，
+        等待期间不占用CPU；订阅连接不可用时退回按50ms间隔查询状态。
+
         参数:
-            time (float): 发送间隔时间（秒）
+            timeout (float): 运动完成的最长等待时间（秒），None表示不限；超时后停止心跳，机器人随之停止
+            callback: 运动完成时调用callback(snapshot)，超时或取消时调用callback(None)
+            wait (bool): False时不等待，返回MotionHandle
 
         返回值:
-            json: 心跳信号的响应结果
+            MotionHandle: wait为False时返回；wait为True或发送失败、控制器返回err时返回None，超时抛出CodroidTimeoutError
         """
-        if _time <= 0 or _time >= 1:
-            raise ValueError("time参数必须小于1")
-        while True:
-            try:
-                message_dict = {
-                    "id": "m8y21rn20ws74",
-                    "ty": "Robot/moveToHeartbeat"
-                }
-                message_str = json.dumps(message_dict)
-                self.client.send(message_str, self.DEBUG)
-            except Exception as e:
-                print(f"心跳发送失败: {e}")
-            time.sleep(_time)  # 每0.5秒发送一次
+        # 状态镜像第一次使用时要建立连接并等待首帧推送，必须在moveTo之前完成，
+        # 否则这段时间内没有心跳，控制器会在0.5s后停止运动
+        mirror = self.StateMirror()
+        if mirror is None and not wait:
+            print("订阅连接不可用，无法异步等待运动完成")
+            return None
+        self.heartbeat_thread = Motion.heartbeat_timer()
+        response = self.__MoveTo(movType, cpos=cpos, apos=apos)
+        if response is None:
+            return None
+        if "err" in response:
+            # 控制器拒绝了本次运动（目标不可达等），不会进入运动状态，不能按完成处理
+            print(f"moveTo失败: {response['err']}")
+            return None
+        if mirror is None:
+            if not Motion.wait_motion_polling(self, timeout):
+                raise CodroidTimeoutError(f"运动未在{timeout}s内完成")
+            if callback is not None:
+                callback(None)
+            return None
+        if movType == MoveType.MovJ:
+            target, kind = apos, "joints"
+        elif movType == MoveType.MovL:
+            target, kind = cpos[:3], "cartesian"
+        else:
+            target, kind = None, None
+        handle = Motion.MotionHandle(self, mirror, Message.fixed_template("Robot/moveToHeartbeat"),
+                                     timeout=timeout, callback=callback, target=target, target_kind=kind)
+        if not wait:
+            return handle
+        handle.wait()
+        return None
+
+    def MoveToAsync(self, movType: MoveType, cpos: list[float] = None, apos: list[float] = None,
+                    timeout: float = None, callback=None):
+        """
+        发送moveTo后立即返回运动句柄，心跳由共享定时器维持
+
+        参数:
+            movType (MoveType): 移动类型
+            cpos (list[float]): MovL的笛卡尔坐标
+            apos (list[float]): MovJ的关节角度（度）
+            timeout (float): 运动完成的最长时间（秒），None表示不限
+            callback: 运动结束时的回调callback(snapshot)，超时或取消时为callback(None)
+
+        返回值:
+            MotionHandle: 提供wait()、cancel()、done()、progress，发送失败或控制器返回err时为None
+        """
+        return self.__MoveAndWait(movType, cpos=cpos, apos=apos, timeout=timeout, callback=callback, wait=False)
+
+    def MovJAsync(self, apos: list[float], timeout: float = None, callback=None):
+        """关节运动到指定位置，立即返回MotionHandle，失败时返回None"""
+        return self.MoveToAsync(MoveType.MovJ, apos=apos, timeout=timeout, callback=callback)
+
+    def MovLAsync(self, cpos: list[float], timeout: float = None, callback=None):
+        """直线运动到指定位置，立即返回MotionHandle，失败时返回None"""
+        return self.MoveToAsync(MoveType.MovL, cpos=cpos, timeout=timeout, callback=callback)
 
-    def MovJ(self, apos: list[float]):
+    def MovJ(self, apos: list[float], timeout: float = None, callback=None, wait: bool = True):
         """
         控制机器人关节运动到指定位置
-        阻塞式函数，直到运动完成才返回
+        默认阻塞，直到运动完成才返回
         参数:
             apos(list[float]):关节角度Float类型的列表，单位为度
+            timeout (float): 运动完成的最长等待时间（秒），None表示不限
+            callback: 运动完成时的回调callback(snapshot)
+            wait (bool): False时立即返回MotionHandle
 
         返回值:
+            MotionHandle: wait为False时返回，否则为None
         """
-        self.__MoveTo(MoveType.MovJ, apos=apos)
-        self.__MoveToHeartbeatOnce()
-        signal = True
-        while signal:
-            res = self.GetRobotStates()
-            if res["db"]["state"] == 4:
-                self.__MoveToHeartbeatOnce()
-            else:
-                signal = False
-        return
+        return self.__MoveAndWait(MoveType.MovJ, apos=apos, timeout=timeout, callback=callback, wait=wait)
 
-    def MovL(self, cpos: list[float]):
+    def MovL(self, cpos: list[float], timeout: float = None, callback=None, wait: bool = True):
         """
         控制机器人直线运动到指定位置
-
+        默认阻塞，直到运动完成才返回
         参数:
             cpos(list[float]):笛卡尔坐标Float类型的列表，单位为度
+            timeout (float): 运动完成的最长等待时间（秒），None表示不限
+            callback: 运动完成时的回调callback(snapshot)
+            wait (bool): False时立即返回MotionHandle
 
         返回值:
+            MotionHandle: wait为False时返回，否则为None
         """
-        self.__MoveTo(MoveType.MovL, cpos=cpos)
-        self.__MoveToHeartbeatOnce()
-        signal = True
-        while signal:
-            res = self.GetRobotStates()
-            if res["db"]["state"] == 4:
-                self.__MoveToHeartbeatOnce()
-            else:
-                signal = False
-        return
+        return self.__MoveAndWait(MoveType.MovL, cpos=cpos, timeout=timeout, callback=callback, wait=wait)
 
-    def MovHome(self):
+    def MovHome(self, timeout: float = None, callback=None, wait: bool = True):
         """
         控制机器人回到Home位置
 
         参数:
+            timeout (float): 运动完成的最长等待时间（秒），None表示不限
+            callback: 运动完成时的回调callback(snapshot)
+            wait (bool): False时立即返回MotionHandle
         返回值:
+            MotionHandle: wait为False时返回，否则为None
         """
-        self.__MoveTo(MoveType.Home)
-        self.__MoveToHeartbeatOnce()
-        signal = True
-        while signal:
-            res = self.GetRobotStates()
-            if res["db"]["state"] == 4:
-                self.__MoveToHeartbeatOnce()
-            else:
-                signal = False
-        return
+        return self.__MoveAndWait(MoveType.Home, timeout=timeout, callback=callback, wait=wait)
 
-    def MovCandle(self):
+    def MovCandle(self, timeout: float = None, callback=None, wait: bool = True):
         """
         控制机器人回到Candle位置
 
         参数:
+            timeout (float): 运动完成的最长等待时间（秒），None表示不限
+            callback: 运动完成时的回调callback(snapshot)
+            wait (bool): False时立即返回MotionHandle
         返回值:
+            MotionHandle: wait为False时返回，否则为None
         """
-        self.__MoveTo(MoveType.Candle)
-        self.__MoveToHeartbeatOnce()
-        signal = True
-        while signal:
-            res = self.GetRobotStates()
-            if res["db"]["state"] == 4:
-                self.__MoveToHeartbeatOnce()
-            else:
-                signal = False
-        return
+        return self.__MoveAndWait(MoveType.Candle, timeout=timeout, callback=callback, wait=wait)
 
-    def MovFaulty(self):
+    def MovFaulty(self, timeout: float = None, callback=None, wait: bool = True):
         """
         控制机器人回到Faulty位置
 
         参数:
+            timeout (float): 运动完成的最长等待时间（秒），None表示不限
+            callback: 运动完成时的回调callback(snapshot)
+            wait (bool): False时立即返回MotionHandle
         返回值:
+            MotionHandle: wait为False时返回，否则为None
         """
-        self.__MoveTo(MoveType.Faulty)
-        self.__MoveToHeartbeatOnce()
-        signal = True
-        while signal:
-            res = self.GetRobotStates()
-            if res["db"]["state"] == 4:
-                self.__MoveToHeartbeatOnce()
-            else:
-                signal = False
-        return
+        return self.__MoveAndWait(MoveType.Faulty, timeout=timeout, callback=callback, wait=wait)
 
-    def MovPackage(self):
+    def MovPackage(self, timeout: float = None, callback=None, wait: bool = True):
         """
         控制机器人回到Package位置
 
         参数:
+            timeout (float): 运动完成的最长等待时间（秒），None表示不限
+            callback: 运动完成时的回调callback(snapshot)
+            wait (bool): False时立即返回MotionHandle
         返回值:
+            MotionHandle: wait为False时返回，否则为None
         """
-        self.__MoveTo(MoveType.Package)
-        self.__MoveToHeartbeatOnce()
-        signal = True
-        while signal:
-            res = self.GetRobotStates()
-            if res["db"]["state"] == 4:
-                self.__MoveToHeartbeatOnce()
-            else:
-                signal = False
-        return
+        return self.__MoveAndWait(MoveType.Package, timeout=timeout, callback=callback, wait=wait)
 
-    def MovSafety(self):
+    def MovSafety(self, timeout: float = None, callback=None, wait: bool = True):
         """
         控制机器人回到Safety位置
 
         参数:
+            timeout (float): 运动完成的最长等待时间（秒），None表示不限
+            callback: 运动完成时的回调callback(snapshot)
+            wait (bool): False时立即返回MotionHandle
         返回值:
+            MotionHandle: wait为False时返回，否则为None
         """
-        self.__MoveTo(MoveType.Safety)
-        self.__MoveToHeartbeatOnce()
-        signal = True
-        while signal:
-            res = self.GetRobotStates()
-            if res["db"]["state"] == 4:
-                self.__MoveToHeartbeatOnce()
-            else:
-                signal = False
-        return
+        return self.__MoveAndWait(MoveType.Safety, timeout=timeout, callback=callback, wait=wait)
 
     # 2.2.10.3 上使能
     def SwitchOn(self):
@@ -2074,14 +2258,7 @@ class Codroid:
             json: 响应结果
         """
 
-        message_dict = {
-            "id": "m8y21rn20ws8a974",
-            "ty": "Robot/switchOn",
-            "db": ""
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.fixed_template("Robot/switchOn", ""))
 
     # 2.2.10.3 下使能
     def SwitchOff(self):
@@ -2093,14 +2270,7 @@ class Codroid:
             json: 响应结果
         """
 
-        message_dict = {
-            "id": "m8y21rn20ws8a974",
-            "ty": "Robot/switchOff",
-            "db": ""
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.fixed_template("Robot/switchOff", ""))
 
     # 2.2.10.3 手动模式
     def ToManual(self):
@@ -2112,14 +2282,7 @@ class Codroid:
             json: 响应结果
         """
 
-        message_dict = {
-            "id": "m8y21rn20ws8a974",
-            "ty": "Robot/toManual",
-            "db": ""
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.fixed_template("Robot/toManual", ""))
 
     # 2.2.10.3 自动模式
     def ToAuto(self):
@@ -2131,14 +2294,7 @@ class Codroid:
             json: 响应结果
         """
 
-        message_dict = {
-            "id": "m8y21rn20ws8a974",
-            "ty": "Robot/toAuto",
-            "db": ""
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.fixed_template("Robot/toAuto", ""))
 
     # 2.2.10.3 自动模式
     def ToRemote(self):
@@ -2150,14 +2306,7 @@ class Codroid:
             json: 响应结果
         """
 
-        message_dict = {
-            "id": "m8y21rn20ws8a974",
-            "ty": "Robot/toRemote",
-            "db": ""
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.fixed_template("Robot/toRemote", ""))
 
 
 
@@ -2173,14 +2322,7 @@ class Codroid:
         返回值:
             json: IO值的响应结果
         """
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "IOManager/GetIOValue",
-            "db": data
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.get_io_value(data))
 
     def GetDI(self, port: int) -> int:
         """
@@ -2194,17 +2336,9 @@ class Codroid:
         """
         if port < 0 or port > 15:
             raise ValueError("端口号必须在0-15之间")
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "IOManager/GetIOValue",
-            "db": [{
-                "type": "DI", "port": port
-            }]
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
+        response = self._request(Message.io_value_template("DI", port))
         try:
-            value = self._safe_parse_response(response)['db'][0]['value']
+            value = response['db'][0]['value']
             return value
         except (KeyError, IndexError):
             print("在访问过程中，某个键或索引不存在")
@@ -2222,17 +2356,9 @@ class Codroid:
         """
         if port < 0 or port > 3:
             raise ValueError("端口号必须在0-3之间")
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "IOManager/GetIOValue",
-            "db": [{
-                "type": "AI", "port": port
-            }]
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
+        response = self._request(Message.io_value_template("AI", port))
         try:
-            value = self._safe_parse_response(response)['db'][0]['value']
+            value = response['db'][0]['value']
             return value
         except (KeyError, IndexError):
             print("在访问过程中，某个键或索引不存在")
@@ -2250,17 +2376,9 @@ class Codroid:
         """
         if port < 0 or port > 15:
             raise ValueError("端口号必须在0-15之间")
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "IOManager/GetIOValue",
-            "db": [
-                {"type": "DO", "port": port}
-            ]
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
+        response = self._request(Message.io_value_template("DO", port))
         try:
-            value = self._safe_parse_response(response)['db'][0]['value']
+            value = response['db'][0]['value']
             return value
         except (KeyError, IndexError):
             print("在访问过程中，某个键或索引不存在")
@@ -2278,17 +2396,9 @@ class Codroid:
         """
         if port < 0 or port > 3:
             raise ValueError("端口号必须在0-3之间")
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "IOManager/GetIOValue",
-            "db": [
-                {"type": "AO", "port": port}
-            ]
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
+        response = self._request(Message.io_value_template("AO", port))
         try:
-            value = self._safe_parse_response(response)['db'][0]['value']
+            value = response['db'][0]['value']
             return value
         except (KeyError, IndexError):
             print("在访问过程中，某个键或索引不存在")
@@ -2306,14 +2416,7 @@ class Codroid:
         返回值:
             json: IO值的响应结果
         """
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "IOManager/SetIOValue",
-            "db": data
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.set_io_value(data))
 
     def SetDO(self, port: int, value: int):
         """
@@ -2329,15 +2432,12 @@ class Codroid:
         if value != 0 and value != 1:
             raise ValueError("值必须为0或1")
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "IOManager/SetIOValue",
             "db": [
                 {"type": "DO", "port": port, "value": value}
             ]
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     def SetAO(self, port: int, value: float):
         """
@@ -2351,15 +2451,12 @@ class Codroid:
             json: 设置命令的响应结果
         """
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "IOManager/SetIOValue",
             "db": [{
                 "type": "AO", "port": port, "value": value
             }]
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.2.12.1 获取寄存器值
     def GetRegisterValue(self,addrlist:list[int]):
@@ -2372,14 +2469,7 @@ class Codroid:
         返回值:
             json: 寄存器的响应结果
         """
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "RegisterManager/GetRegisterValue",
-            "db": addrlist
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.get_register_value(addrlist))
 
     def GetBaseRegisterValue(self, name: BaseRegister) -> int | None:
         """
@@ -2392,30 +2482,18 @@ class Codroid:
             int | None: 寄存器值
         """
         if name in {BaseRegister.majorVersion, BaseRegister.minorVersion}:
-            message_dict = {
-                "id": "m912rb1b0wsc2742",
-                "ty": "RegisterManager/GetRegisterValue",
-                "db": [name.value]
-            }
-            message_str = json.dumps(message_dict)
-            response = self.client.send(message_str, self.DEBUG)
+            response = self._request(Message.register_value_template(name.value))
             try:
-                value = int(self._safe_parse_response(response)['db'][0]['value'])
+                value = int(response['db'][0]['value'])
                 return value
             except (KeyError, IndexError):
                 print("在访问过程中，某个键或索引不存在")
                 return -1
 
         if name in {BaseRegister.seconds, BaseRegister.milliSeconds,BaseRegister.heartBeatFromMaster,BaseRegister.heartBeatToMaster}:
-            message_dict = {
-                "id": "m912rb1b0wsc2742",
-                "ty": "RegisterManager/GetRegisterValue",
-                "db": [name.value]
-            }
-            message_str = json.dumps(message_dict)
-            response = self.client.send(message_str, self.DEBUG)
+            response = self._request(Message.register_value_template(name.value))
             try:
-                value = int(self._safe_parse_response(response)['db'][0]['value'])
+                value = int(response['db'][0]['value'])
                 return value
             except (KeyError, IndexError):
                 print("在访问过程中，某个键或索引不存在")
@@ -2432,15 +2510,9 @@ class Codroid:
            int | Uint16 |None: 寄存器值
        """
         if name in ControlRegister:
-            message_dict = {
-                "id": "m912rb1b0wsc2742",
-                "ty": "RegisterManager/GetRegisterValue",
-                "db": [name.value]
-            }
-            message_str = json.dumps(message_dict)
-            response = self.client.send(message_str, self.DEBUG)
+            response = self._request(Message.register_value_template(name.value))
             try:
-                value = int(self._safe_parse_response(response)['db'][0]['value'])
+                value = int(response['db'][0]['value'])
                 return value
             except (KeyError, IndexError):
                 print("在访问过程中，某个键或索引不存在")
@@ -2457,15 +2529,9 @@ class Codroid:
            int | Uint16 |None: 寄存器值
        """
         if name in StatusRegister:
-            message_dict = {
-                "id": "m912rb1b0wsc2742",
-                "ty": "RegisterManager/GetRegisterValue",
-                "db": [name.value]
-            }
-            message_str = json.dumps(message_dict)
-            response = self.client.send(message_str, self.DEBUG)
+            response = self._request(Message.register_value_template(name.value))
             try:
-                value = int(self._safe_parse_response(response)['db'][0]['value'])
+                value = int(response['db'][0]['value'])
                 return value
             except (KeyError, IndexError):
                 print("在访问过程中，某个键或索引不存在")
@@ -2482,15 +2548,9 @@ class Codroid:
            int | Uint16 |None: 寄存器值,单位：米(m)，弧度(deg)
        """
         if name in MotionInfoRegister:
-            message_dict = {
-                "id": "m912rb1b0wsc2742",
-                "ty": "RegisterManager/GetRegisterValue",
-                "db": [name.value]
-            }
-            message_str = json.dumps(message_dict)
-            response = self.client.send(message_str, self.DEBUG)
+            response = self._request(Message.register_value_template(name.value))
             try:
-                value = int(self._safe_parse_response(response)['db'][0]['value'])
+                value = int(response['db'][0]['value'])
                 return value
             except (KeyError, IndexError):
                 print("在访问过程中，某个键或索引不存在")
@@ -2507,15 +2567,9 @@ class Codroid:
            int | Uint16 |None: 寄存器值
        """
         if name in IORegister:
-            message_dict = {
-                "id": "m912rb1b0wsc2742",
-                "ty": "RegisterManager/GetRegisterValue",
-                "db": [name.value]
-            }
-            message_str = json.dumps(message_dict)
-            response = self.client.send(message_str, self.DEBUG)
+            response = self._request(Message.register_value_template(name.value))
             try:
-                value = int(self._safe_parse_response(response)['db'][0]['value'])
+                value = int(response['db'][0]['value'])
                 return value
             except (KeyError, IndexError):
                 print("在访问过程中，某个键或索引不存在")
@@ -2533,15 +2587,9 @@ class Codroid:
         """
         if address < 9000 or address > 9431:
             raise ValueError("无效的寄存器名称")
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "RegisterManager/GetRegisterValue",
-            "db": [address]
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
+        response = self._request(Message.register_value_template(address))
         try:
-            value = int(self._safe_parse_response(response)['db'][0]['value'])
+            value = int(response['db'][0]['value'])
             return value
         except (KeyError, IndexError):
             print("在访问过程中，某个键或索引不存在")
@@ -2559,15 +2607,9 @@ class Codroid:
         """
         if address < 49000 or address > 49130 or address % 2 != 0:
             raise ValueError("无效的寄存器名称")
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "RegisterManager/GetRegisterValue",
-            "db": [address]
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
+        response = self._request(Message.register_value_template(address))
         try:
-            value = int(self._safe_parse_response(response)['db'][0]['value'])
+            value = int(response['db'][0]['value'])
             return value
         except (KeyError, IndexError):
             print("在访问过程中，某个键或索引不存在")
@@ -2585,15 +2627,9 @@ class Codroid:
         """
         if address < 49200 or address > 49330 or address % 2 != 0:
             raise ValueError("无效的寄存器名称")
-        message_dict = {
-            "id": "m912rb1b0wsc2742",
-            "ty": "RegisterManager/GetRegisterValue",
-            "db": [address]
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
+        response = self._request(Message.register_value_template(address))
         try:
-            value = int(self._safe_parse_response(response)['db'][0]['value'])
+            value = int(response['db'][0]['value'])
             return value
         except (KeyError, IndexError):
             print("在访问过程中，某个键或索引不存在")
@@ -2611,14 +2647,7 @@ class Codroid:
         返回值:
             json: 寄存器的响应结果
         """
-        message_dict = {
-            "id":"m912rb1b0wsc2742",
-            "ty":"RegisterManager/SetRegisterValue",
-            "db":addrlist
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.set_register_value(addrlist))
 
     def SetControlRegisterValue(self, name: ControlRegister, value: int):
         """
@@ -2632,13 +2661,10 @@ class Codroid:
        """
         if name in ControlRegister:
             message_dict = {
-                "id": "m912rb1b0wsc2742",
                 "ty": "RegisterManager/SetRegisterValue",
                 "db":{"address": name, "value": value}
             }
-            message_str = json.dumps(message_dict)
-            response = self.client.send(message_str, self.DEBUG)
-            return self._safe_parse_response(response)
+            return self._request(message_dict)
 
     def SetIORegisterValue(self,name:IORegister,value:int):
         """
@@ -2652,13 +2678,10 @@ class Codroid:
        """
         if name in {IORegister.readDIStartPort0,IORegister.readDIStartPort1,IORegister.readDIStartPort2,IORegister.readDIStartPort3}:
             message_dict = {
-                "id": "m912rb1b0wsc2742",
                 "ty": "RegisterManager/SetRegisterValue",
                 "db": {"address": name, "value": value}
             }
-            message_str = json.dumps(message_dict)
-            response = self.client.send(message_str, self.DEBUG)
-            return self._safe_parse_response(response)
+            return self._request(message_dict)
 
     def SetBoolRegisterValue(self, address: int, value: int):
         """
@@ -2676,13 +2699,10 @@ class Codroid:
         if value != 0 and value != 1:
             raise ValueError("值必须为0或1")
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "RegisterManager/SetRegisterValue",
             "db":{"address": address, "value": value}
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     def SetIntRegisterValue(self, address: int, value: int):
         """
@@ -2698,14 +2718,11 @@ class Codroid:
         if address < 49100 or address > 49130 or address % 2 != 0:
             raise ValueError("无效的寄存器名称")
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "RegisterManager/SetRegisterValue",
             "db":
                 {"address": address, "value": value}
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     def SetRealRegisterValue(self, address: int, value: float):
         """
@@ -2721,14 +2738,11 @@ class Codroid:
         if address < 49300 or address > 49330 or address % 2 != 0:
             raise ValueError("无效的寄存器名称")
         message_dict = {
-            "id": "m912rb1b0wsc2742",
             "ty": "RegisterManager/SetRegisterValue",
             "db":
                 {"address": address, "value": value}
         }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(message_dict)
 
     # 2.4.1 工程状态
     def GetProjectState(self, recvTime: int = 200):
@@ -2742,13 +2756,7 @@ class Codroid:
             json: 项目状态信息
 
         """
-        message_dict = {
-            "ty": "publish/ProjectState",
-            "tc": recvTime
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.subscribe_template("ProjectState", recvTime))
 
     # 2.4.2 变量数据更新
     def GetVarUpdate(self, recvTime: int = 200):
@@ -2761,13 +2769,7 @@ class Codroid:
         返回值:
             json: 变量更新信息
         """
-        message_dict = {
-            "ty": "publish/VarUpdate",
-            "tc": recvTime
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.subscribe_template("VarUpdate", recvTime))
 
     # 2.4.3 机器人状态
     def GetRobotStates(self, recvTime: int = 200):
@@ -2780,13 +2782,7 @@ class Codroid:
         返回值:
             json: 机器人状态信息
         """
-        message_dict = {
-            "ty": "publish/RobotStatus",
-            "tc": recvTime
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.subscribe_template("RobotStatus", recvTime))
 
     # 2.4.4 机器人姿态
     def GetRobotPosture(self, recvTime: int = 200):
@@ -2799,13 +2795,7 @@ class Codroid:
         返回值:
             json: 机器人姿态信息
         """
-        message_dict = {
-            "ty": "publish/RobotPosture",
-            "tc": recvTime
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.subscribe_template("RobotPosture", recvTime))
 
     # 2.4.5 机器人坐标系
     def GetRobotCoordinate(self, recvTime: int = 200):
@@ -2818,13 +2808,7 @@ class Codroid:
         返回值:
             json: 机器人坐标信息
         """
-        message_dict = {
-            "ty": "publish/obotCoordinate",
-            "tc": recvTime
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.subscribe_template("obotCoordinate", recvTime))
 
     # 2.4.6 系统日志
     def GetLog(self, recvTime: int = 200):
@@ -2837,13 +2821,7 @@ class Codroid:
         返回值:
             json: 日志信息
         """
-        message_dict = {
-            "ty": "publish/Log",
-            "tc": recvTime
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.subscribe_template("Log", recvTime))
 
     # 2.4.7 错误信息
     def GetError(self, recvTime: int = 200):
@@ -2856,13 +2834,7 @@ class Codroid:
         返回值:
             json: 错误信息
         """
-        message_dict = {
-            "ty": "publish/Error",
-            "tc": recvTime
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.subscribe_template("Error", recvTime))
 
     def CRIStartDataPush(self,ip: str, port: int, duration: int):
         """
@@ -2875,22 +2847,7 @@ class Codroid:
         返回值:
             json: 响应结果
         """
-        if port < 1000 or port > 65534:
-            raise ValueError("端口号必须在1000-65534之间")
-        if duration < 1:
-            raise ValueError("duration必须大于等于1")
-        message_dict = {
-            "id": 1,
-            "ty": "CRI/StartDataPush",
-            "db": {
-                "ip": ip,
-                "port": port,
-                "duration": duration
-            }
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.cri_start_data_push(ip, port, duration))
 
     def CRIStopDataPush(self):
         """
@@ -2900,13 +2857,7 @@ class Codroid:
         返回值:
             json: 响应结果
         """
-        message_dict = {
-            "id": "m8y21rn20ws8a974",
-            "ty": "CRI/StopDataPush"
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.cri_stop_data_push())
 
     def CRIStartControl(self,filterType:int,duration:int,startBuffer:int):
         """
@@ -2919,25 +2870,7 @@ class Codroid:
         返回值:
             json: 响应结果
         """
-        if filterType < 0 or filterType > 3:
-            raise ValueError("filterType必须在0-3之间")
-        if duration < 1:
-            raise ValueError("duration必须大于等于1")
-        if startBuffer < 1 or startBuffer > 100:
-            raise ValueError("startBuffer必须在1-100之间")
-
-        message_dict = {
-            "id": "m8y21rn20ws8a974",
-            "ty": "CRI/StartControl",
-            "db": {
-                "filterType": filterType,
-                "duration": duration,
-                "startBuffer": startBuffer
-            }
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
+        return self._request(Message.cri_start_control(filterType, duration, startBuffer))
 
     def CRIStopControl(self):
         """
@@ -2947,10 +2880,125 @@ class Codroid:
         返回值:
             json: 响应结果
         """
-        message_dict = {
-            "id": "m8y21rn20ws8a974",
-            "ty": "CRI/StopControl"
-        }
-        message_str = json.dumps(message_dict)
-        response = self.client.send(message_str, self.DEBUG)
-        return self._safe_parse_response(response)
\ No newline at end of file
+        return self._request(Message.cri_stop_control())
+
+
+class CodroidPipeline:
+    """
+    Codroid请求流水线
+
+    Request()只登记请求并返回Future，Execute()时为每条请求分配唯一id，
+    将全部请求一次写出，再按id（publish/*按ty）把应答分发给对应的Future，
+    应答乱序到达也能正确匹配。一轮流水线只需要一次往返的等待时间。
+    """
+
+    def __init__(self, codroid: Codroid):
+        self._codroid = codroid
+        self._queued = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.Execute()
+        else:
+            self._queued = []
+        return False
+
+    def Request(self, message, ensure_ascii: bool = True) -> Future:
+        """
+        登记一条请求
+
+        参数:
+            message: 请求报文dict或Message.MessageTemplate，可由Message模块中的函数构造
+            ensure_ascii (bool): 是否将非ASCII字符转义
+
+        返回值:
+            Future: Execute()之后可通过result()取得应答，连接异常时结果为None
+        """
+        future = Future()
+        self._queued.append((message, ensure_ascii, future))
+        return future
+
+    @staticmethod
+    def _collect(queued) -> list:
+        """按登记顺序取出各Future的应答或异常"""
+        results = []
+        for _, _, future in queued:
+            exception = future.exception()
+            results.append(future.result() if exception is None else exception)
+        return results
+
+    def Execute(self) -> list:
+        """
+        写出全部已登记的请求并等待应答
+
+        整轮流水线共用一个截止时间（Codroid的超时设置），超时的请求其Future抛出CodroidTimeoutError，
+        Execute()本身不抛出，其余请求的应答照常返回。
+
+        返回值:
+            list: 按登记顺序排列的应答，超时的请求对应CodroidTimeoutError实例，连接异常时为None
+        """
+        queued, self._queued = self._queued, []
+        if not queued:
+            return []
+        codroid = self._codroid
+        timeout = codroid._timeout()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if isinstance(codroid.client, ThreadedTCPClient):
+            # 并发模式下由I/O线程合并写出并分发应答
+            submitted = [codroid.Submit(message, ensure_ascii) for message, ensure_ascii, _ in queued]
+            for f, (message, _, future) in zip(submitted, queued):
+                try:
+                    future.set_result(f.result(None if deadline is None else max(deadline - time.monotonic(), 0)))
+                except FutureTimeoutError:
+                    f.cancel()
+                    ty = message.ty if isinstance(message, Message.MessageTemplate) else message.get("ty")
+                    future.set_exception(CodroidTimeoutError(f"等待应答超时({timeout}s): {ty}"))
+            return self._collect(queued)
+
+        pending = Message.PendingReplies()
+        payload = []
+        sent = []
+        metrics = codroid.client.metrics
+        timing = {}
+        for message, ensure_ascii, future in queued:
+            t0 = time.perf_counter_ns() if metrics is not None else 0
+            message_dict, data = Message.encode(message, ensure_ascii, force_id=True)
+            if metrics is not None:
+                timing[future] = (message_dict.get("ty"), time.perf_counter_ns() - t0, len(data))
+            codroid.client.session.record(message)
+            pending.add(message_dict, future)
+            payload.append(data)
+            sent.append((message_dict, future))
+
+        t_send = time.perf_counter_ns() if metrics is not None else 0
+        if codroid.client.write(b"".join(payload), codroid.DEBUG):
+            try:
+                while pending:
+                    response = codroid.client.receive_message(codroid.DEBUG, deadline)
+                    if response is None:
+                        break
+                    future = pending.pop(response)
+                    if future is None:
+                        codroid.client.route_unmatched(response, codroid.DEBUG)
+                        continue
+                    if metrics is not None:
+                        ty, encode_ns, bytes_out = timing[future]
+                        decode_ns = codroid.client.last_decode_ns
+                        metrics.record(ty, encode_ns, time.perf_counter_ns() - t_send - decode_ns, decode_ns,
+                                       bytes_out, codroid.client.last_frame_stats.nbytes)
+                    future.set_result(response)
+            except CodroidTimeoutError:
+                pending.drain()
+                for message_dict, future in sent:
+                    if not future.done():
+                        codroid.client.abandon(message_dict)
+                        if metrics is not None:
+                            metrics.record_timeout(message_dict.get("ty"))
+                        future.set_exception(CodroidTimeoutError(f"等待应答超时({timeout}s): {message_dict.get('ty')}"))
+
+        for future in pending.drain():
+            future.set_result(None)
+        return self._collect(queued)
@@ -0,0 +1,375 @@
+# 多进程共享一个控制器连接的本机代理
+#
+# 规划、HMI、IO记录等多个进程各自连接控制器时，控制器的负担随连接数增加。
+# CodroidProxy对每台控制器只保持一条上游连接，在本机（Unix域套接字或回环TCP）接受任意多个客户端：
+#   - 请求的id改写为代理内唯一的id后转发，应答再改回原id发给对应的客户端；
+#   - publish/*推送分发给所有订阅了该ty的客户端，每个客户端按自己请求的周期限流；
+#   - 同一ty的重复订阅合并，上游只按所有订阅者中最短的周期订阅一次。
+# 客户端无需修改：Codroid("unix:/tmp/codroid.sock", 0) 或 Codroid("127.0.0.1", 9101)。
+#
+# 注意：CRI/StartDataPush、project/enterRemoteScriptMode等按连接保存的状态经过代理后由所有客户端共享。
+#
+# 命令行: python CodroidProxy.py 192.168.1.136 --listen unix:/tmp/codroid.sock
+
+import argparse
+import os
+import select
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import JsonCodec
+import Message
+from TcpClient import UNIX_PREFIX, Backoff, JsonFrameDecoder
+
+
+class _Client:
+    """一个本机客户端连接"""
+    __slots__ = ("sock", "decoder", "out", "topics", "last_request", "dropped")
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.decoder = JsonFrameDecoder()
+        self.out = bytearray()  # 待发送的字节，非阻塞写出
+        self.topics: dict[str, list] = {}  # ty -> [周期秒数, 上次转发时刻]
+        self.last_request = 0.0  # 最近一次转发非publish请求的时刻
+        self.dropped = 0  # 发送缓冲区满时丢弃的推送帧数
+
+
+class _Topic:
+    """上游的一个publish/*订阅"""
+    __slots__ = ("tc", "latest", "latest_time")
+
+    def __init__(self, tc: int):
+        self.tc = tc  # 上游订阅周期（毫秒）
+        self.latest: Optional[bytes] = None
+        self.latest_time = 0.0
+
+
+class CodroidProxy:
+    """
+    控制器连接复用代理
+
+    单线程select循环：上游和所有客户端都在同一个线程中处理，不需要加锁。
+    上游断开时按Backoff重连，重连后重新订阅publish/*并重放会话状态；断开期间的请求直接回复"err"。
+    """
+
+    def __init__(self, upstream_host: str, upstream_port: int = 9001, listen: str = "127.0.0.1", port: int = 9101,
+                 max_client_buffer: int = 1 << 20):
+        """
+        参数:
+            upstream_host (str): 控制器IP地址
+            upstream_port (int): 控制器端口号
+            listen (str): 监听地址，"unix:路径"表示Unix域套接字
+            port (int): 监听端口（TCP），0表示自动分配
+            max_client_buffer (int): 单个客户端待发送字节数上限，超过时丢弃发给它的推送帧（应答不丢弃）
+        """
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+        self.listen = listen
+        self.port = port
+        self.max_client_buffer = max_client_buffer
+        self.backoff = Backoff()
+        self.forwarded = 0   # 转发到上游的请求数
+        self.coalesced = 0   # 合并掉、没有发到上游的订阅请求数
+        self._server: Optional[socket.socket] = None
+        self._upstream: Optional[socket.socket] = None
+        self._upstream_decoder = JsonFrameDecoder()
+        self._next_attempt = 0.0
+        self._clients: dict[socket.socket, _Client] = {}
+        self._pending = OrderedDict()  # 代理id -> (客户端, 原id)，客户端为None表示代理自己发出的请求
+        self._max_pending = 4096
+        self._topics: dict[str, _Topic] = {}
+        self._session = Message.Session()
+        self._running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    @property
+    def address(self):
+        """客户端连接时使用的(ip, port)"""
+        return self.listen, self.port
+
+    def start(self):
+        """开始监听并在后台线程中运行，返回address"""
+        self._bind()
+        threading.Thread(target=self._loop, name="CodroidProxy", daemon=True).start()
+        return self.address
+
+    def serve_forever(self):
+        """在当前线程中运行"""
+        self._bind()
+        self._loop()
+
+    def close(self):
+        self._running = False
+
+    def _bind(self):
+        if self.listen.startswith(UNIX_PREFIX):
+            path = self.listen[len(UNIX_PREFIX):]
+            if os.path.exists(path):
+                os.unlink(path)
+            self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._server.bind(path)
+        else:
+            self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._server.bind((self.listen, self.port))
+            self.port = self._server.getsockname()[1]
+        self._server.listen()
+        self._running = True
+
+    # ---- 主循环 ----
+
+    def _loop(self):
+        try:
+            while self._running:
+                if self._upstream is None and time.monotonic() >= self._next_attempt:
+                    self._connect_upstream()
+                readers = [self._server, *self._clients]
+                if self._upstream is not None:
+                    readers.append(self._upstream)
+                writers = [c.sock for c in self._clients.values() if c.out]
+                readable, writable, _ = select.select(readers, writers, [], 0.1)
+                for sock in readable:
+                    if sock is self._server:
+                        self._accept()
+                    elif sock is self._upstream:
+                        self._read_upstream()
+                    elif sock in self._clients:
+                        self._read_client(self._clients[sock])
+                for sock in writable:
+                    client = self._clients.get(sock)
+                    if client is not None:
+                        self._flush(client)
+        finally:
+            for client in list(self._clients.values()):
+                client.sock.close()
+            self._clients.clear()
+            if self._upstream is not None:
+                self._upstream.close()
+                self._upstream = None
+            if self._server is not None:
+                self._server.close()
+                if self.listen.startswith(UNIX_PREFIX):
+                    try:
+                        os.unlink(self.listen[len(UNIX_PREFIX):])
+                    except OSError:
+                        pass
+                self._server = None
+
+    def _accept(self):
+        sock, _ = self._server.accept()
+        sock.setblocking(False)
+        if sock.family != socket.AF_UNIX:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._clients[sock] = _Client(sock)
+
+    def _drop_client(self, client: _Client):
+        self._clients.pop(client.sock, None)
+        client.sock.close()
+        for ty in client.topics:
+            self._resubscribe(ty)
+
+    # ---- 上游 ----
+
+    def _connect_upstream(self):
+        try:
+            sock = socket.create_connection((self.upstream_host, self.upstream_port), timeout=1.0)
+        except OSError as e:
+            self._next_attempt = time.monotonic() + self.backoff.next()
+            print(f"连接控制器失败: {e}")
+            return
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._upstream = sock
+        self._upstream_decoder.reset()
+        self.backoff.reset()
+        print(f"已连接到控制器 {self.upstream_host}:{self.upstream_port}")
+        for message in self._session.messages():
+            self._forward(dict(message), None)
+
+    def _upstream_lost(self):
+        print("与控制器的连接断开")
+        self._upstream.close()
+        self._upstream = None
+        self._next_attempt = time.monotonic() + self.backoff.next()
+        self._pending.clear()  # 断线前的请求不会再有应答，由客户端自己的超时处理
+
+    def _forward(self, message: dict, client: Optional[_Client]) -> bool:
+        """改写id后发到上游，返回是否发送成功"""
+        if not Message.is_publish(message.get("ty", "")):
+            proxy_id = Message.new_id()
+            self._pending[proxy_id] = (client, message.get("id"))
+            if len(self._pending) > self._max_pending:
+                self._pending.popitem(last=False)
+            message["id"] = proxy_id
+        self._session.record(message)
+        if self._upstream is None:
+            return False
+        try:
+            self._upstream.sendall(JsonCodec.dumps(message, ensure_ascii=False))
+        except OSError:
+            self._upstream_lost()
+            return False
+        self.forwarded += 1
+        return True
+
+    def _read_upstream(self):
+        decoder = self._upstream_decoder
+        try:
+            n = self._upstream.recv_into(decoder.writable(4096))
+        except OSError:
+            n = 0
+        if not n:
+            self._upstream_lost()
+            return
+        decoder.commit(n)
+        now = time.monotonic()
+        while (view := decoder.next_frame_view()) is not None:
+            try:
+                frame = JsonCodec.loads(view)
+            except ValueError:
+                continue
+            if not isinstance(frame, dict):
+                continue
+            raw = bytes(view)
+            ty = frame.get("ty", "")
+            if Message.is_publish(ty):
+                self._fan_out(ty, raw, now)
+                continue
+            proxy_id = frame.get("id")
+            target = self._pending.pop(proxy_id, None) if isinstance(proxy_id, str) else None
+            if target is None:
+                # 不属于任何请求的帧（日志等）发给所有客户端
+                for client in list(self._clients.values()):
+                    self._send(client, raw)
+                continue
+            client, original_id = target
+            if client is None or client.sock not in self._clients:
+                continue
+            if original_id is None:
+                frame.pop("id")
+                raw = JsonCodec.dumps(frame, ensure_ascii=False)
+            else:
+                raw = raw.replace(b'"' + proxy_id.encode('ascii') + b'"', JsonCodec.dumps(original_id), 1)
+            self._send(client, raw)
+
+    def _fan_out(self, ty: str, raw: bytes, now: float):
+        topic = self._topics.get(ty)
+        if topic is None:
+            topic = self._topics[ty] = _Topic(0)
+        topic.latest = raw
+        topic.latest_time = now
+        # 推送间隔有抖动，提前半个上游周期算作到期，避免周期相同的订阅者每隔一帧被跳过
+        slack = topic.tc / 2000.0
+        for client in list(self._clients.values()):
+            sub = client.topics.get(ty)
+            if sub is not None and now + slack >= sub[1] + sub[0]:
+                sub[1] = now
+                self._send(client, raw, droppable=True)
+
+    # ---- 客户端 ----
+
+    def _read_client(self, client: _Client):
+        try:
+            n = client.sock.recv_into(client.decoder.writable(4096))
+        except BlockingIOError:
+            return
+        except OSError:
+            n = 0
+        if not n:
+            self._drop_client(client)
+            return
+        client.decoder.commit(n)
+        while (view := client.decoder.next_frame_view()) is not None:
+            try:
+                message = JsonCodec.loads(view)
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue
+            ty = message.get("ty", "")
+            if Message.is_publish(ty):
+                self._subscribe(client, message)
+            elif self._upstream is None:
+                reply = {"ty": ty, "err": "控制器未连接"}
+                if "id" in message:
+                    reply = {"id": message["id"], **reply}
+                self._send(client, JsonCodec.dumps(reply, ensure_ascii=False))
+            else:
+                client.last_request = time.monotonic()
+                self._forward(message, client)
+
+    def _subscribe(self, client: _Client, message: dict):
+        ty = message["ty"]
+        tc = int(message.get("tc", 200))
+        now = time.monotonic()
+        client.topics[ty] = [tc / 1000.0, 0.0]  # 上次转发时刻清零，下一帧推送必定转发
+        topic = self._topics.get(ty)
+        if topic is None or topic.tc == 0 or tc < topic.tc:
+            # 上游未连接时只记录，连接后随会话状态一起发出
+            self._topics.setdefault(ty, _Topic(tc)).tc = tc
+            self._forward(message, None)
+            return
+        self.coalesced += 1
+        # 缓存的推送足够新，且晚于该客户端最近的请求（不会拿到运动指令之前的状态），直接回复
+        if topic.latest is not None and topic.latest_time >= client.last_request and now - topic.latest_time <= tc / 1000.0:
+            client.topics[ty][1] = now
+            self._send(client, topic.latest)
+
+    def _resubscribe(self, ty: str):
+        """订阅者离开后，若剩余订阅者的最短周期变长，按新周期重新订阅以减轻控制器负担"""
+        periods = [c.topics[ty][0] for c in self._clients.values() if ty in c.topics]
+        topic = self._topics.get(ty)
+        if not periods or topic is None:
+            return
+        tc = round(min(periods) * 1000)
+        if tc > topic.tc:
+            topic.tc = tc
+            self._forward({"ty": ty, "tc": tc}, None)
+
+    def _send(self, client: _Client, data: bytes, droppable: bool = False):
+        if droppable and len(client.out) > self.max_client_buffer:
+            client.dropped += 1
+            return
+        client.out += data
+        self._flush(client)
+
+    def _flush(self, client: _Client):
+        try:
+            n = client.sock.send(client.out)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._drop_client(client)
+            return
+        del client.out[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多个本机进程共享一条控制器连接的代理")
+    parser.add_argument("host", help="控制器IP地址")
+    parser.add_argument("--port", type=int, default=9001, help="控制器端口号")
+    parser.add_argument("--listen", default="127.0.0.1", help='监听地址，"unix:路径"表示Unix域套接字')
+    parser.add_argument("--listen-port", type=int, default=9101)
+    args = parser.parse_args()
+    proxy = CodroidProxy(args.host, args.port, args.listen, args.listen_port)
+    print(f"代理 {args.host}:{args.port}，监听 {args.listen}" +
+          ("" if args.listen.startswith(UNIX_PREFIX) else f":{args.listen_port}"))
+    try:
+        proxy.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
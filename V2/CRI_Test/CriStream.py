@@ -0,0 +1,594 @@
+# CRI实时控制指令流
+#
+# CRI/StartControl之后，控制器在UDP 9030端口接收CommandData，按duration的节拍逐点执行。
+# 这里提供：
+#   - encode_command：CommandData打包（与C++接收端一致的64字节）；
+#     encode_commands：整条轨迹一次打包进连续的64·N字节缓冲区（有numpy时向量化），发送时只切片；
+#   - blend_path：经过多个途经点的关节空间轨迹，途经点处以抛物线过渡，不停顿；
+#   - CRIClock：按单调时钟上的绝对截止时刻定周期，粗睡眠后短暂自旋，错过截止时刻按LatePolicy处理，
+#     记录每周期的延迟直方图；
+#   - CriStreamer：按CRIClock的节拍逐点发送（在调用线程中）；
+#   - CriSender：独立发送线程从预分配的环形缓冲区取出已打包的报文按节拍发送，任意线程Feed()追加，
+#     缓冲区满时Feed()等待（背压），缓冲区空的周期计入underruns。
+#
+# 用法:
+#     cod.CRIStartControl(filterType=0, duration=10, startBuffer=3)
+#     path = blend_path([start, p1, p2, p3], velocity=30.0, blend=0.2, period=0.01)
+#     with CriStreamer(ip, 9030, period=0.01) as streamer:
+#         streamer.Stream([[math.radians(v) for v in p] for p in path])
+#     cod.CRIStopControl()
+
+import math
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from Define import CRICommandType, LatePolicy
+from Metrics import Histogram
+
+CRI_CONTROL_PORT = 9030
+
+# CommandData: int64 序号 + 6*double 位置 + uint8 指令类型 + 7字节填充 = 64字节
+COMMAND = struct.Struct("<q6dB7x")
+
+# 与COMMAND逐字节一致的numpy结构化类型，填充字节由np.zeros置零
+COMMAND_DTYPE = None if np is None else np.dtype({
+    "names": ["timestamp", "position", "cmd_type"],
+    "formats": ["<i8", ("<f8", (6,)), "u1"],
+    "offsets": [0, 8, 56],
+    "itemsize": COMMAND.size,
+})
+
+
+def encode_command(seq: int, position, cmd_type: CRICommandType = CRICommandType.Joint) -> bytes:
+    """
+    打包一条CommandData
+
+    参数:
+        seq (int): 序号
+        position: 6个关节角（rad）或末端位姿 [x, y, z, rx, ry, rz]（m/rad）
+        cmd_type (CRICommandType): 指令类型
+
+    返回值:
+        bytes: 64字节报文
+    """
+    if len(position) != 6:
+        raise ValueError("position参数长度必须为6")
+    return COMMAND.pack(seq, *position, cmd_type.value)
+
+
+def encode_commands(positions, start_seq: int = 0, cmd_type: CRICommandType = CRICommandType.Joint) -> memoryview:
+    """
+    把整条轨迹打包进一块连续缓冲区，第i个点的序号为start_seq + i
+
+    参数:
+        positions: (N, 6) 关节角（rad）或末端位姿（m/rad），numpy数组或嵌套列表
+        start_seq (int): 第一个点的序号
+        cmd_type (CRICommandType): 指令类型
+
+    返回值:
+        memoryview: 64·N字节，第i个报文为view[64 * i: 64 * (i + 1)]
+    """
+    if np is not None:
+        positions = np.asarray(positions, dtype="<f8")
+        if positions.ndim != 2 or positions.shape[1] != 6:
+            raise ValueError("positions的形状必须为(N, 6)")
+        packets = np.zeros(len(positions), dtype=COMMAND_DTYPE)
+        packets["timestamp"] = np.arange(start_seq, start_seq + len(positions))
+        packets["position"] = positions
+        packets["cmd_type"] = cmd_type.value
+        return memoryview(packets.view(np.uint8))
+    buffer = bytearray(COMMAND.size * len(positions))
+    for i, position in enumerate(positions):
+        if len(position) != 6:
+            raise ValueError("position参数长度必须为6")
+        COMMAND.pack_into(buffer, i * COMMAND.size, start_seq + i, *position, cmd_type.value)
+    return memoryview(buffer)
+
+
+def segment_steps(waypoints: list, velocity: float, period: float) -> list:
+    """
+    各段的插补点数：按最慢关节以velocity匀速走完该段计算，向上取整到period的整数倍，至少1点
+
+    参数:
+        waypoints (list): 途经点（关节角），第一个点为起点
+        velocity (float): 单关节最大速度（与途经点同单位/秒）
+        period (float): 指令周期（秒）
+
+    返回值:
+        list[int]: 每段的点数，长度为len(waypoints) - 1
+    """
+    if velocity <= 0 or period <= 0:
+        raise ValueError("velocity和period必须大于0")
+    steps = []
+    for a, b in zip(waypoints, waypoints[1:]):
+        distance = max(abs(y - x) for x, y in zip(a, b))
+        steps.append(max(math.ceil(distance / velocity / period - 1e-9), 1))
+    return steps
+
+
+def blend_path(waypoints: list, velocity: float, blend: float, period: float) -> list:
+    """
+    经过途经点的平滑轨迹
+
+    先按segment_steps生成各关节同步到达途经点的折线，再做宽度为blend的滑动平均：
+    匀速段保持不变，速度突变处变为持续blend秒的匀加速（抛物线过渡），起点和终点从静止加减速。
+    中间途经点不精确经过，过渡从到达前blend/2开始；最后一点精确到达。
+    整条轨迹比折线晚blend/2，总时长多blend。
+
+    参数:
+        waypoints (list): 途经点，第一个点为起点（通常为机器人当前关节角）
+        velocity (float): 单关节最大速度（与途经点同单位/秒）
+        blend (float): 过渡时间（秒），0表示不平滑
+        period (float): 指令周期（秒）
+
+    返回值:
+        list[list[float]]: 每个周期一个点，不含起点本身
+    """
+    if len(waypoints) < 2:
+        return []
+    points = [list(waypoints[0])]
+    for (a, b), n in zip(zip(waypoints, waypoints[1:]), segment_steps(waypoints, velocity, period)):
+        for k in range(1, n + 1):
+            s = k / n
+            points.append([x + (y - x) * s for x, y in zip(a, b)])
+    window = max(int(round(blend / period)), 1)
+    if window == 1:
+        return points[1:]
+    # 因果滑动平均：起点之前视为停在起点，终点之后补window-1个终点
+    last = points[-1]
+    points.extend([last] * (window - 1))
+    total = [x * window for x in points[0]]
+    smoothed = []
+    for k in range(1, len(points)):
+        old = points[k - window] if k >= window else points[0]
+        new = points[k]
+        total = [t + y - x for t, x, y in zip(total, old, new)]
+        smoothed.append([t / window for t in total])
+    smoothed[-1] = list(last)  # 消除累加误差，保证精确到达终点
+    return smoothed
+
+
+class CRIClock:
+    """
+    CRI发送节拍
+
+    第k个周期的截止时刻为start + k * period（time.perf_counter_ns，单调时钟），不累积唤醒误差。
+    距截止时刻还有spin以上时先睡眠到截止时刻前spin，剩余时间自旋等待，避免time.sleep的唤醒超调。
+    醒来时距截止时刻的延迟记入lateness直方图（纳秒）；延迟超过一个周期的周期计入late，按policy处理：
+    Skip跳到当前时刻所在的周期（跳过的周期计入skipped），CatchUp不等待地连续返回落后的周期，
+    Hold把时间轴整体顺延到当前时刻。
+
+    用法:
+        clock = CRIClock(0.001, policy=LatePolicy.Skip)
+        clock.start()
+        while True:
+            k = clock.wait()          # 返回本周期的序号
+            send(points[k])
+        print(clock.summary())
+    """
+
+    def __init__(self, period: float, spin: float = 0.0005, policy: LatePolicy = LatePolicy.CatchUp):
+        """
+        参数:
+            period (float): 周期（秒）
+            spin (float): 截止时刻前改为自旋等待的时长（秒），0表示只睡眠
+            policy (LatePolicy): 落后超过一个周期时的处理方式
+        """
+        if period <= 0:
+            raise ValueError("period必须大于0")
+        self.period = period
+        self.spin = spin
+        self.policy = policy
+        self._period_ns = int(round(period * 1e9))
+        self._spin_ns = int(spin * 1e9)
+        self._start = None
+        self._next = 0
+        self.lateness = Histogram()  # 每周期的唤醒延迟（纳秒）
+        self.cycles = 0
+        self.late = 0      # 延迟超过一个周期的次数
+        self.skipped = 0   # Skip策略下跳过的周期数
+
+    def start(self, at_ns: int = None):
+        """从at_ns（time.perf_counter_ns()）开始计周期，默认当前时刻；第0个周期立即到期"""
+        self._start = time.perf_counter_ns() if at_ns is None else at_ns
+        self._next = 0
+
+    def reset(self):
+        """清零cycles、late、skipped和延迟直方图，下一次wait()重新开始计周期"""
+        self._start = None
+        self._next = 0
+        self.lateness = Histogram()
+        self.cycles = 0
+        self.late = 0
+        self.skipped = 0
+
+    def deadline(self, cycle: int) -> int:
+        """第cycle个周期的截止时刻（time.perf_counter_ns()）"""
+        return self._start + cycle * self._period_ns
+
+    def wait(self, stop: Optional[threading.Event] = None) -> Optional[int]:
+        """
+        等待下一个周期
+
+        参数:
+            stop (threading.Event): 睡眠期间置位时提前返回None
+
+        返回值:
+            int: 本周期的序号（Skip策略下可能跳过若干序号），stop置位时为None
+        """
+        if self._start is None:
+            self.start()
+        cycle = self._next
+        due = self.deadline(cycle)
+        now = time.perf_counter_ns()
+        remaining = due - now - self._spin_ns
+        if remaining > 0:
+            if stop is not None:
+                if stop.wait(remaining / 1e9):
+                    return None
+            else:
+                time.sleep(remaining / 1e9)
+        elif stop is not None and stop.is_set():
+            return None
+        now = time.perf_counter_ns()
+        while now < due:
+            now = time.perf_counter_ns()
+        lateness = now - due
+        self.lateness.record(lateness)
+        self.cycles += 1
+        if lateness > self._period_ns:
+            self.late += 1
+            if self.policy == LatePolicy.Skip:
+                current = (now - self._start) // self._period_ns
+                self.skipped += current - cycle
+                cycle = current
+            elif self.policy == LatePolicy.Hold:
+                self._start += lateness
+        self._next = cycle + 1
+        return cycle
+
+    def summary(self) -> dict:
+        """cycles、late、skipped及延迟分布（微秒）"""
+        return {"cycles": self.cycles, "late": self.late, "skipped": self.skipped,
+                "lateness_us": self.lateness.summary(1e3)}
+
+
+class CriStreamer:
+    """
+    CRI指令发送器
+
+    按CRIClock的节拍逐点发送，clock保存最近一次Stream()的节拍统计。
+    Stream()在开始计时前把全部点打包进一块缓冲区，周期内只发送其中的memoryview切片（不复制）。
+    """
+
+    def __init__(self, host: str, port: int = CRI_CONTROL_PORT, period: float = 0.01,
+                 policy: LatePolicy = LatePolicy.CatchUp, spin: float = 0.0005):
+        """
+        参数:
+            host (str): 控制器IP
+            port (int): CRI实时控制端口
+            period (float): 指令周期（秒），应与CRIStartControl的duration一致
+            policy (LatePolicy): 错过截止时刻时的处理方式
+            spin (float): 截止时刻前自旋等待的时长（秒）
+        """
+        self.address = (host, port)
+        self.period = period
+        self.policy = policy
+        self.spin = spin
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.seq = 0
+        self.sent = 0
+        self.clock: Optional[CRIClock] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def close(self):
+        self.sock.close()
+
+    def Send(self, position, cmd_type: CRICommandType = CRICommandType.Joint) -> bool:
+        """立即发送一个点，返回是否发送成功"""
+        if not self._send_packet(encode_command(self.seq, position, cmd_type)):
+            return False
+        self.seq += 1
+        return True
+
+    def _send_packet(self, packet) -> bool:
+        try:
+            self.sock.sendto(packet, self.address)
+        except OSError as e:
+            print(f"CRI指令发送失败: {e}")
+            return False
+        self.sent += 1
+        return True
+
+    def Stream(self, points: list, cmd_type: CRICommandType = CRICommandType.Joint,
+               stop: Optional[threading.Event] = None, on_point=None) -> int:
+        """
+        按周期发送一组点
+
+        参数:
+            points: (N, 6) 关节角（rad）或末端位姿（m/rad），或encode_commands()已打包的缓冲区
+            cmd_type (CRICommandType): 指令类型（points已打包时不使用）
+            stop (threading.Event): 置位后停止发送
+            on_point: 每发出一点后调用on_point(index, time.monotonic())
+
+        返回值:
+            int: 实际发出的点数（Skip策略下跳过的点不计入）
+        """
+        if isinstance(points, memoryview):
+            buffer = points
+        else:
+            buffer = encode_commands(points, self.seq, cmd_type)
+        size = COMMAND.size
+        total = len(buffer) // size
+        self.clock = clock = CRIClock(self.period, self.spin, self.policy)
+        clock.start()
+        count = 0
+        while True:
+            index = clock.wait(stop)
+            if index is None or index >= total:
+                break
+            if not self._send_packet(buffer[index * size:(index + 1) * size]):
+                break
+            count += 1
+            if on_point is not None:
+                on_point(index, time.monotonic())
+        self.seq += total
+        return count
+
+
+class PacketRing:
+    """
+    预分配的CommandData环形缓冲区
+
+    多个生产者（put在锁内复制）、一个消费者（peek/advance只读写整数下标，不加锁）。
+    缓冲区满时put按poll间隔等待消费者腾出空间。
+    """
+
+    def __init__(self, capacity: int = 4096, poll: float = 0.001):
+        """
+        参数:
+            capacity (int): 最多容纳的报文数
+            poll (float): 缓冲区满时生产者重试的间隔（秒）
+        """
+        if capacity < 1:
+            raise ValueError("capacity必须大于0")
+        self.capacity = capacity
+        self.poll = poll
+        self._buffer = memoryview(bytearray(COMMAND.size * capacity))
+        self._head = 0  # 已写入的报文总数，只由持锁的生产者修改
+        self._tail = 0  # 已取出的报文总数，只由消费者修改
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._head - self._tail
+
+    @property
+    def free(self) -> int:
+        return self.capacity - (self._head - self._tail)
+
+    def put(self, packets: memoryview, timeout: float = None) -> int:
+        """
+        追加报文，空间不足时等待
+
+        参数:
+            packets (memoryview): 整数个64字节报文
+            timeout (float): 最长等待时间（秒），None表示一直等待，0表示不等待
+
+        返回值:
+            int: 写入的报文数，超时时可能少于报文总数
+        """
+        size = COMMAND.size
+        total = len(packets) // size
+        deadline = None if timeout is None else time.monotonic() + timeout
+        done = 0
+        with self._lock:
+            while done < total:
+                free = self.capacity - (self._head - self._tail)
+                if free == 0:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        break
+                    time.sleep(self.poll)
+                    continue
+                n = min(free, total - done)
+                start = self._head % self.capacity
+                first = min(n, self.capacity - start)
+                self._buffer[start * size:(start + first) * size] = packets[done * size:(done + first) * size]
+                if n > first:
+                    self._buffer[:(n - first) * size] = packets[(done + first) * size:(done + n) * size]
+                self._head += n  # 数据写完后再发布下标
+                done += n
+        return done
+
+    def peek(self) -> Optional[memoryview]:
+        """消费者：下一个报文的切片（不复制），缓冲区空时为None"""
+        if self._tail == self._head:
+            return None
+        start = (self._tail % self.capacity) * COMMAND.size
+        return self._buffer[start:start + COMMAND.size]
+
+    def advance(self, count: int = 1):
+        """消费者：丢弃已处理的count个报文"""
+        self._tail += min(count, self._head - self._tail)
+
+    def clear(self):
+        """消费者：丢弃全部未发送的报文"""
+        self._tail = self._head
+
+
+class CriSender:
+    """
+    CRI发送子系统
+
+    发送线程只做三件事：按CRIClock等待截止时刻、从环形缓冲区取一个已打包的报文、sendto，
+    不打包、不打印、不等待生产者。规划和打包在调用Feed()的线程中完成。
+
+    用法:
+        with CriSender(ip, 9030, period=0.001, capacity=2048) as sender:
+            for chunk in planner:                 # 任意线程，缓冲区满时Feed()等待
+                sender.Feed(chunk)                # (n, 6) 关节角（rad）
+            sender.Finish()
+            sender.WaitEmpty()
+        print(sender.underruns, sender.clock.summary())
+    """
+
+    def __init__(self, host: str, port: int = CRI_CONTROL_PORT, period: float = 0.001, capacity: int = 4096,
+                 policy: LatePolicy = LatePolicy.CatchUp, spin: float = 0.0005, realtime: bool = False):
+        """
+        参数:
+            host (str): 控制器IP
+            port (int): CRI实时控制端口
+            period (float): 指令周期（秒），应与CRIStartControl的duration一致
+            capacity (int): 环形缓冲区容量（报文数）
+            policy (LatePolicy): 错过截止时刻时的处理方式，Skip会丢弃跳过周期对应的报文
+            spin (float): 截止时刻前自旋等待的时长（秒）
+            realtime (bool): 尝试把发送线程设为SCHED_FIFO实时调度（Linux，需要权限）
+        """
+        self.address = (host, port)
+        self.ring = PacketRing(capacity, min(period, 0.001))
+        self.clock = CRIClock(period, spin, policy)
+        self.realtime = realtime
+        self.sock: Optional[socket.socket] = None  # Start()时创建，Stop()时关闭
+        self.seq = 0
+        self.sent = 0
+        self.underruns = 0     # 数据流进行中（Feed之后、Finish之前）缓冲区为空的周期数
+        self.send_errors = 0
+        self.max_fill = 0      # 发送线程观察到的最大填充量
+        self._streaming = False
+        self._feed_lock = threading.Lock()  # 保护seq，使打包的序号与写入顺序一致
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.Start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.Stop(drain=exc_type is None)
+        return False
+
+    @property
+    def fill(self) -> int:
+        """缓冲区中待发送的报文数"""
+        return len(self.ring)
+
+    def Start(self):
+        """
+        启动发送线程，Stop()之后可以再次启动
+
+        序号和sent、underruns等计数接着之前的继续；clock的统计（延迟、late、skipped）每次启动时清零，
+        只反映本次运行。
+        """
+        if self._thread is not None:
+            return
+        self.clock.reset()
+        if self.sock is None:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="CodroidCriSender", daemon=True)
+        self._thread.start()
+
+    def Stop(self, drain: bool = True, timeout: float = None):
+        """
+        停止发送线程
+
+        参数:
+            drain (bool): 先等待缓冲区发送完
+            timeout (float): drain的最长等待时间（秒）
+        """
+        if drain:
+            self.WaitEmpty(timeout)
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        self._streaming = False
+        self.ring.clear()
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def Feed(self, positions, cmd_type: CRICommandType = CRICommandType.Joint, timeout: float = None) -> int:
+        """
+        打包并追加一段轨迹，可在任意线程调用；缓冲区满时等待（背压）
+
+        参数:
+            positions: (n, 6) 关节角（rad）或末端位姿（m/rad）
+            cmd_type (CRICommandType): 指令类型
+            timeout (float): 最长等待时间（秒），None表示一直等待
+
+        返回值:
+            int: 写入的点数，超时时可能少于n（未写入的点不占用序号）
+        """
+        with self._feed_lock:
+            packets = encode_commands(positions, self.seq, cmd_type)
+            count = self.ring.put(packets, timeout)
+            self.seq += count
+            if count:
+                self._streaming = True
+        return count
+
+    def FeedEncoded(self, packets: memoryview, timeout: float = None) -> int:
+        """追加encode_commands()已打包的报文（序号由调用方决定），返回写入的报文数"""
+        with self._feed_lock:
+            count = self.ring.put(packets, timeout)
+            if count:
+                self._streaming = True
+        return count
+
+    def Finish(self):
+        """声明当前数据流已全部Feed，此后缓冲区为空不再计入underruns"""
+        self._streaming = False
+
+    def WaitEmpty(self, timeout: float = None) -> bool:
+        """等待缓冲区发送完，返回是否已发送完"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(self.ring):
+            if self._thread is None or (deadline is not None and time.monotonic() >= deadline):
+                return False
+            time.sleep(self.clock.period)
+        return True
+
+    def _run(self):
+        if self.realtime:
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(os.sched_get_priority_max(os.SCHED_FIFO)))
+            except (AttributeError, OSError) as e:
+                print(f"无法把CRI发送线程设为实时调度: {e}")
+        ring, clock, sock, address = self.ring, self.clock, self.sock, self.address
+        clock.start()
+        skipped = clock.skipped
+        while True:
+            if clock.wait(self._stop) is None:
+                break
+            if clock.skipped != skipped:
+                ring.advance(clock.skipped - skipped)  # Skip策略：跳过的周期对应的报文作废
+                skipped = clock.skipped
+            fill = len(ring)
+            if fill > self.max_fill:
+                self.max_fill = fill
+            packet = ring.peek()
+            if packet is None:
+                if self._streaming:
+                    self.underruns += 1
+                continue
+            try:
+                sock.sendto(packet, address)
+                self.sent += 1
+            except OSError:
+                self.send_errors += 1
+            ring.advance()
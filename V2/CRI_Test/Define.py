@@ -151,6 +151,22 @@ class ModbusTcpFunctionCodeType(Enum):
     WriteMultipleCoils = 0x0F       # 写多个线圈寄存器
     WriteMultipleHolds = 0x10       # 写多个保持寄存器
 
+class DropPolicy(Enum):
+    """publish/*订阅的投递策略"""
+    LatestOnly = 0  # 只保留最新一帧，未取走的旧帧被覆盖（状态、姿态等）
+    Lossless = 1    # 按顺序保留每一帧，队列满时丢弃新帧并计入overflows，不阻塞读线程（日志、变量更新等）
+
+class CRICommandType(Enum):
+    """CRI实时控制指令CommandData的cmd_type"""
+    Joint = 0          # 关节角（rad）
+    EndEffector = 1    # 末端位姿（m/rad）
+
+class LatePolicy(Enum):
+    """CRI发送周期错过截止时刻（落后超过一个周期）时的处理方式"""
+    Skip = 0      # 跳过错过的周期及其点位，从当前周期对应的点继续，时间轴不变
+    CatchUp = 1   # 不丢点，立即连续发出落后的点直到追上时间轴
+    Hold = 2      # 不丢点也不连发，时间轴整体顺延
+
 class PayloadDict:
     """
     负载数据字典类，用于存储关节位置和扭矩信息
@@ -0,0 +1,110 @@
+# JSON编解码后端
+#
+# 按 orjson > ujson > 标准库json 的顺序选择已安装的实现，三者都不依赖时仍可使用标准库。
+# 可通过环境变量 CODROID_JSON=orjson|ujson|json 或 use() 指定后端。
+# dumps统一返回UTF-8字节，loads接受bytes/bytearray/memoryview/str。
+#
+# TcpClient把接收缓冲区中的一帧以memoryview交给loads，是否复制取决于后端：
+#   - orjson：直接解析memoryview，不复制；
+#   - 标准库：json.loads不接受memoryview，把帧直接解码为str（本来就要做的一次UTF-8解码），不再先复制成bytes；
+#   - ujson：不接受memoryview，需要复制一次bytes。
+
+import json
+import os
+from typing import Callable, NamedTuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class Codec(NamedTuple):
+    """一种JSON编解码实现"""
+    name: str
+    dumps: Callable  # dumps(obj, ensure_ascii=True) -> bytes
+    loads: Callable  # loads(data) -> object，格式错误时抛出ValueError
+
+
+def _std_dumps(obj, ensure_ascii: bool = True) -> bytes:
+    return json.dumps(obj, ensure_ascii=ensure_ascii).encode('utf-8')
+
+
+def _std_loads(data):
+    if isinstance(data, memoryview):
+        # json.loads(bytes)内部也是先解码为str，这里直接从缓冲区解码，省去tobytes()的复制
+        data = str(data, 'utf-8')
+    return json.loads(data)
+
+
+def _orjson_dumps(obj, ensure_ascii: bool = True) -> bytes:
+    try:
+        data = orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        # orjson不支持的类型（如超过64位的整数）交给标准库
+        return _std_dumps(obj, ensure_ascii)
+    # orjson总是输出UTF-8原文，要求转义时对含非ASCII字符的报文退回标准库
+    if ensure_ascii and not data.isascii():
+        return _std_dumps(obj, ensure_ascii)
+    return data
+
+
+def _ujson_dumps(obj, ensure_ascii: bool = True) -> bytes:
+    return ujson.dumps(obj, ensure_ascii=ensure_ascii).encode('utf-8')
+
+
+def _ujson_loads(data):
+    if isinstance(data, memoryview):
+        data = data.tobytes()  # ujson只接受str/bytes
+    return ujson.loads(data)
+
+
+CODECS: dict[str, Codec] = {"json": Codec("json", _std_dumps, _std_loads)}
+if ujson is not None:
+    CODECS["ujson"] = Codec("ujson", _ujson_dumps, _ujson_loads)
+if orjson is not None:
+    CODECS["orjson"] = Codec("orjson", _orjson_dumps, orjson.loads)
+
+_PREFERENCE = ("orjson", "ujson", "json")
+
+
+def get_codec(name: str = None) -> Codec:
+    """
+    获取编解码实现
+
+    参数:
+        name (str): orjson、ujson或json，为None时按优先级选择已安装的实现
+
+    返回值:
+        Codec: 编解码实现
+    """
+    if name is not None:
+        if name not in CODECS:
+            raise ValueError(f"JSON后端不可用: {name}，可用: {list(CODECS)}")
+        return CODECS[name]
+    return next(CODECS[n] for n in _PREFERENCE if n in CODECS)
+
+
+codec = get_codec(os.environ.get("CODROID_JSON") or None)
+
+
+def use(name: str = None) -> Codec:
+    """切换全局使用的JSON后端，返回切换后的实现"""
+    global codec
+    codec = get_codec(name)
+    return codec
+
+
+def dumps(obj, ensure_ascii: bool = True) -> bytes:
+    """编码为UTF-8字节"""
+    return codec.dumps(obj, ensure_ascii)
+
+
+def loads(data):
+    """解码JSON，格式错误时抛出ValueError"""
+    return codec.loads(data)
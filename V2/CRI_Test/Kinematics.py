@@ -0,0 +1,379 @@
+# 本地运动学（NumPy向量化）
+#
+# Robot/apostocpos、Robot/cpostoapos每次一个往返；路径校验、工作空间检查、笛卡尔CRI流需要大量正逆解，
+# 这里在本地对(N, 6)数组一次算完：
+#   - forward：正解，关节角（度）-> [x, y, z（mm）, rx, ry, rz（度，Z-Y-X欧拉角）]；
+#   - inverse：解析逆解，每个位姿最多8组解，选离参考关节角最近的一组（关节按360°就近折算）；
+#   - calibrate：用控制器apostocpos的应答校验（或最小二乘拟合）DH参数，报告残差。
+#
+# 用法:
+#     kin = Kinematics()
+#     cpos = kin.forward(joints)                       # joints: (N, 6)
+#     apos, errors = kin.inverse(cpos, reference)      # reference: (6,) 或 (N, 6)
+#     report = calibrate(cod, samples=50)              # 与控制器比较，report.position_max单位mm
+#
+# DH参数同时被MockController使用，本模块在没有numpy时仍可导入。
+
+from typing import NamedTuple, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 标准DH参数（mm、度），关节零位偏置；基座绕z轴旋转180°。
+# 取值使 [0, 0, 90, 0, 90, 0] 的正解为 [494, 191, 424.5, 180, 0, -90]（与V2/Python/Demo.py中的示例一致）。
+DH_D = (146.5, 0.0, 0.0, 191.0, -114.0, 112.0)
+DH_A = (0.0, -390.0, -380.0, 0.0, 0.0, 0.0)
+DH_ALPHA = (90.0, 0.0, 0.0, 90.0, -90.0, 0.0)
+DH_OFFSET = (0.0, -90.0, 0.0, 90.0, 0.0, 180.0)
+BASE_RZ = 180.0
+
+ROT_WEIGHT = 200.0  # 姿态误差（弧度）换算到与位置（mm）相当的量级，用于拟合
+
+
+class DHParameters(NamedTuple):
+    """标准DH参数，长度单位mm，角度单位度"""
+    d: tuple = DH_D
+    a: tuple = DH_A
+    alpha: tuple = DH_ALPHA
+    offset: tuple = DH_OFFSET
+    base_rz: float = BASE_RZ
+
+
+CODROID_DH = DHParameters()
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Kinematics需要numpy: pip install numpy")
+
+
+def pose_to_matrix(pose):
+    """[x, y, z, rx, ry, rz]（mm/度）-> (..., 4, 4) 齐次矩阵"""
+    _require_numpy()
+    pose = np.asarray(pose, dtype=float)
+    rx, ry, rz = np.radians(pose[..., 3]), np.radians(pose[..., 4]), np.radians(pose[..., 5])
+    cx, sx, cy, sy, cz, sz = np.cos(rx), np.sin(rx), np.cos(ry), np.sin(ry), np.cos(rz), np.sin(rz)
+    t = np.zeros(pose.shape[:-1] + (4, 4))
+    t[..., 0, 0] = cz * cy
+    t[..., 0, 1] = cz * sy * sx - sz * cx
+    t[..., 0, 2] = cz * sy * cx + sz * sx
+    t[..., 1, 0] = sz * cy
+    t[..., 1, 1] = sz * sy * sx + cz * cx
+    t[..., 1, 2] = sz * sy * cx - cz * sx
+    t[..., 2, 0] = -sy
+    t[..., 2, 1] = cy * sx
+    t[..., 2, 2] = cy * cx
+    t[..., :3, 3] = pose[..., :3]
+    t[..., 3, 3] = 1.0
+    return t
+
+
+def matrix_to_pose(t):
+    """(..., 4, 4) 齐次矩阵 -> [x, y, z, rx, ry, rz]（mm/度）"""
+    _require_numpy()
+    ry = np.arctan2(-t[..., 2, 0], np.hypot(t[..., 0, 0], t[..., 1, 0]))
+    rz = np.arctan2(t[..., 1, 0], t[..., 0, 0])
+    rx = np.arctan2(t[..., 2, 1], t[..., 2, 2])
+    return np.concatenate([t[..., :3, 3], np.degrees(np.stack([rx, ry, rz], axis=-1))], axis=-1)
+
+
+def _rotation_error(r_target, r_actual):
+    """两组旋转矩阵之间的旋转角（弧度）"""
+    e = np.einsum("...ik,...jk->...ij", r_target, r_actual)
+    cos = (np.trace(e, axis1=-2, axis2=-1) - 1.0) / 2.0
+    return np.arccos(np.clip(cos, -1.0, 1.0))
+
+
+def _rotation_vector(r_target, r_actual):
+    """R_target * R_actual^T 的旋转向量（弧度），小角度下足够精确，用于拟合"""
+    e = np.einsum("...ik,...jk->...ij", r_target, r_actual)
+    return 0.5 * np.stack([e[..., 2, 1] - e[..., 1, 2], e[..., 0, 2] - e[..., 2, 0], e[..., 1, 0] - e[..., 0, 1]],
+                          axis=-1)
+
+
+class Kinematics:
+    """
+    6轴机器人（UR构型：a2、a3在同一平面，腕部三轴相交于两段偏置）的正逆解
+
+    全部方法接受(6,)或(N, 6)，返回对应形状；角度单位度，长度单位mm。
+    """
+
+    def __init__(self, dh: DHParameters = CODROID_DH, tool: list[float] = None, coor: list[float] = None):
+        """
+        参数:
+            dh (DHParameters): DH参数
+            tool (list[float]): 工具坐标系 [x, y, z, rx, ry, rz]，None表示法兰
+            coor (list[float]): 用户坐标系 [x, y, z, rx, ry, rz]，None表示基坐标系
+        """
+        _require_numpy()
+        self.dh = dh
+        self._d = np.asarray(dh.d, dtype=float)
+        self._a = np.asarray(dh.a, dtype=float)
+        self._alpha = np.radians(np.asarray(dh.alpha, dtype=float))
+        self._offset = np.asarray(dh.offset, dtype=float)
+        c, s = np.cos(np.radians(dh.base_rz)), np.sin(np.radians(dh.base_rz))
+        self._base = np.array([[c, -s, 0, 0], [s, c, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1.0]])
+        self.set_frames(tool, coor)
+
+    def set_frames(self, tool: list[float] = None, coor: list[float] = None):
+        """更换工具坐标系和用户坐标系"""
+        self.tool = None if tool is None else list(tool)
+        self.coor = None if coor is None else list(coor)
+        self._tool = np.eye(4) if tool is None else pose_to_matrix(tool)
+        self._coor = np.eye(4) if coor is None else pose_to_matrix(coor)
+        # 基座、用户坐标系合并为一次左乘；逆解时整体求逆
+        self._world = np.linalg.inv(self._coor) @ self._base
+        self._world_inv = np.linalg.inv(self._world)
+        self._tool_inv = np.linalg.inv(self._tool)
+
+    def _link(self, i: int, theta):
+        """第i个关节的DH变换，theta为DH角（弧度），形状(...) -> (..., 4, 4)"""
+        ct, st = np.cos(theta), np.sin(theta)
+        ca, sa = np.cos(self._alpha[i]), np.sin(self._alpha[i])
+        t = np.zeros(np.shape(theta) + (4, 4))
+        t[..., 0, 0] = ct
+        t[..., 0, 1] = -st * ca
+        t[..., 0, 2] = st * sa
+        t[..., 0, 3] = self._a[i] * ct
+        t[..., 1, 0] = st
+        t[..., 1, 1] = ct * ca
+        t[..., 1, 2] = -ct * sa
+        t[..., 1, 3] = self._a[i] * st
+        t[..., 2, 1] = sa
+        t[..., 2, 2] = ca
+        t[..., 2, 3] = self._d[i]
+        t[..., 3, 3] = 1.0
+        return t
+
+    def forward_matrix(self, joints):
+        """正解，关节角（度）(..., 6) -> 用户坐标系下工具的齐次矩阵 (..., 4, 4)"""
+        theta = np.radians(np.asarray(joints, dtype=float) + self._offset)
+        t = np.broadcast_to(self._world, theta.shape[:-1] + (4, 4))
+        for i in range(6):
+            t = t @ self._link(i, theta[..., i])
+        return t @ self._tool
+
+    def forward(self, joints):
+        """
+        正解
+
+        参数:
+            joints: (6,)或(N, 6) 关节角（度）
+
+        返回值:
+            ndarray: 同形状的 [x, y, z（mm）, rx, ry, rz（度）]
+        """
+        return matrix_to_pose(self.forward_matrix(joints))
+
+    def inverse_all(self, cpos, reference=None):
+        """
+        全部8组解析解
+
+        参数:
+            cpos: (..., 6) 末端位姿
+            reference: (..., 6) 参考关节角（度），用于腕部奇异（q5≈0）时确定q6，以及把解折算到参考角附近
+
+        返回值:
+            ndarray: (..., 8, 6) 关节角（度），无解的组为nan
+        """
+        cpos = np.asarray(cpos, dtype=float)
+        if reference is None:
+            reference = np.zeros(6)
+        reference = np.broadcast_to(np.asarray(reference, dtype=float), cpos.shape)
+        d4, d6 = self._d[3], self._d[5]
+        a2, a3 = self._a[1], self._a[2]
+        t06 = self._world_inv @ pose_to_matrix(cpos) @ self._tool_inv  # 法兰相对基座DH坐标系
+        t06 = t06[..., None, :, :]  # 为8组解广播
+        r, p = t06[..., :3, :3], t06[..., :3, 3]
+        # 分支组合：第k组解取 (q1符号, q5符号, q3符号) = 第k的三个二进制位
+        branch = np.arange(8)
+        s1 = np.where(branch & 4, -1.0, 1.0)
+        s5 = np.where(branch & 2, -1.0, 1.0)
+        s3 = np.where(branch & 1, -1.0, 1.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # q1：腕心p05在xy平面上与d4偏置相切
+            p05 = p - d6 * r[..., :, 2]
+            radius = np.hypot(p05[..., 0], p05[..., 1])
+            theta1 = np.arctan2(p05[..., 1], p05[..., 0]) + s1 * np.arccos(d4 / radius) + np.pi / 2
+            c1, sn1 = np.cos(theta1), np.sin(theta1)
+            # q5
+            cos5 = (p[..., 0] * sn1 - p[..., 1] * c1 - d4) / d6
+            theta5 = s5 * np.arccos(np.where(np.abs(cos5) > 1 + 1e-9, np.nan, np.clip(cos5, -1.0, 1.0)))
+            sn5 = np.sin(theta5)
+            # q6；腕部奇异时取参考值
+            ref_theta6 = np.radians(reference[..., None, 5] + self._offset[5])
+            singular = np.abs(sn5) < 1e-9
+            safe5 = np.where(singular, 1.0, sn5)
+            theta6 = np.where(singular, ref_theta6,
+                              np.arctan2((-r[..., 0, 1] * sn1 + r[..., 1, 1] * c1) / safe5,
+                                         (r[..., 0, 0] * sn1 - r[..., 1, 0] * c1) / safe5))
+            # q2、q3、q4：平面二连杆
+            t01 = self._link(0, theta1)
+            t46 = self._link(4, theta5) @ self._link(5, theta6)
+            t14 = np.linalg.inv(t01) @ t06 @ np.linalg.inv(t46)
+            # 第4坐标系原点在第1坐标系中为 [a2*c2 + a3*c23, a2*s2 + a3*s23, d4]
+            px, py = t14[..., 0, 3], t14[..., 1, 3]
+            cos3 = (px ** 2 + py ** 2 - a2 ** 2 - a3 ** 2) / (2 * a2 * a3)
+            theta3 = s3 * np.arccos(np.where(np.abs(cos3) > 1 + 1e-9, np.nan, np.clip(cos3, -1.0, 1.0)))
+            theta2 = np.arctan2(py, px) - np.arctan2(a3 * np.sin(theta3), a2 + a3 * np.cos(theta3))
+            t13 = self._link(1, theta2) @ self._link(2, theta3)
+            t34 = np.linalg.inv(t13) @ t14
+            theta4 = np.arctan2(t34[..., 1, 0], t34[..., 0, 0])
+        theta = np.stack([theta1, theta2, theta3, theta4, theta5, theta6], axis=-1)
+        joints = np.degrees(theta) - self._offset
+        # 折算到参考角±180°范围内
+        ref = reference[..., None, :]
+        return ref + (joints - ref + 180.0) % 360.0 - 180.0
+
+    def inverse(self, cpos, reference=None, limits=None, tolerance: float = 1e-3):
+        """
+        逆解：在8组解析解中选取离参考关节角最近的一组
+
+        参数:
+            cpos: (6,)或(N, 6) 末端位姿 [x, y, z（mm）, rx, ry, rz（度）]
+            reference: (6,)或(N, 6) 参考关节角（度），None为全零
+            limits: (6, 2) 关节角范围（度），超出范围的解不参与选择
+            tolerance (float): 解的正解与目标之间允许的位置误差（mm）
+
+        返回值:
+            tuple: (joints, errors)，joints与cpos同形状，errors为无解的行（布尔），无解的行为nan
+        """
+        cpos = np.asarray(cpos, dtype=float)
+        single = cpos.ndim == 1
+        cpos = cpos.reshape(-1, 6)
+        if reference is None:
+            reference = np.zeros(6)
+        reference = np.broadcast_to(np.asarray(reference, dtype=float), cpos.shape)
+        candidates = self.inverse_all(cpos, reference)
+        # 解析式在奇异附近会有误差，用正解复核
+        check = self.forward_matrix(np.nan_to_num(candidates))
+        target = pose_to_matrix(cpos)[:, None]
+        valid = ~np.isnan(candidates).any(axis=-1)
+        valid &= np.linalg.norm(check[..., :3, 3] - target[..., :3, 3], axis=-1) < tolerance
+        valid &= _rotation_error(target[..., :3, :3], check[..., :3, :3]) < tolerance / ROT_WEIGHT + 1e-9
+        if limits is not None:
+            limits = np.asarray(limits, dtype=float)
+            valid &= ((candidates >= limits[:, 0]) & (candidates <= limits[:, 1])).all(axis=-1)
+        distance = np.where(valid, np.abs(candidates - reference[:, None]).sum(axis=-1), np.inf)
+        best = distance.argmin(axis=-1)
+        joints = candidates[np.arange(len(cpos)), best]
+        errors = ~valid.any(axis=-1)
+        joints[errors] = np.nan
+        if single:
+            return joints[0], bool(errors[0])
+        return joints, errors
+
+
+class CalibrationReport(NamedTuple):
+    """DH参数与控制器正解的比较结果"""
+    dh: DHParameters          # 比较（或拟合得到）的DH参数
+    samples: int              # 参与比较的样本数
+    rejected: int             # 控制器应答出错的样本数
+    position_rms: float       # 位置误差均方根（mm）
+    position_max: float       # 位置误差最大值（mm）
+    orientation_max: float    # 姿态误差最大值（度）
+
+
+def residuals(kinematics: Kinematics, joints, measured):
+    """
+    本地正解与测量位姿的误差
+
+    返回值:
+        tuple: (position, orientation)，每个样本的位置误差（mm）和姿态误差（度）
+    """
+    local = kinematics.forward_matrix(joints)
+    target = pose_to_matrix(measured)
+    position = np.linalg.norm(local[..., :3, 3] - target[..., :3, 3], axis=-1)
+    orientation = np.degrees(_rotation_error(target[..., :3, :3], local[..., :3, :3]))
+    return position, orientation
+
+
+def fit_dh(joints, measured, dh: DHParameters = CODROID_DH, iterations: int = 20) -> DHParameters:
+    """
+    以Levenberg-Marquardt最小二乘拟合DH参数中的d、a、offset（alpha和基座旋转保持不变）
+
+    关节2、3、4轴线平行，d2、d3、d4只有总和可辨识，拟合结果中三者的分配不唯一，正解不受影响。
+
+    参数:
+        joints: (N, 6) 关节角（度）
+        measured: (N, 6) 对应的控制器正解
+        dh (DHParameters): 初值
+
+    返回值:
+        DHParameters: 拟合结果
+    """
+    _require_numpy()
+    joints = np.asarray(joints, dtype=float)
+    target = pose_to_matrix(measured)
+
+    def unpack(x):
+        values = x.tolist()
+        return dh._replace(d=tuple(values[:6]), a=tuple(values[6:12]), offset=tuple(values[12:]))
+
+    def error(x):
+        local = Kinematics(unpack(x)).forward_matrix(joints)
+        position = (target[..., :3, 3] - local[..., :3, 3]).ravel()
+        rotation = _rotation_vector(target[..., :3, :3], local[..., :3, :3]).ravel() * ROT_WEIGHT
+        return np.concatenate([position, rotation])
+
+    x = np.concatenate([dh.d, dh.a, dh.offset]).astype(float)
+    e = error(x)
+    damping = 1e-3
+    step = 1e-6
+    for _ in range(iterations):
+        jac = np.empty((len(e), len(x)))
+        for j in range(len(x)):
+            dx = np.zeros_like(x)
+            dx[j] = step
+            jac[:, j] = (error(x + dx) - e) / step
+        jtj = jac.T @ jac
+        gradient = jac.T @ e
+        improved = False
+        while damping < 1e6:
+            delta = np.linalg.solve(jtj + damping * np.diag(np.diag(jtj) + 1e-12), -gradient)
+            candidate = error(x + delta)
+            if candidate @ candidate < e @ e:
+                x, e = x + delta, candidate
+                damping = max(damping / 10.0, 1e-9)
+                improved = True
+                break
+            damping *= 10.0
+        if not improved or np.abs(delta).max() < 1e-9:
+            break
+    return unpack(x)
+
+
+def calibrate(codroid, joints=None, samples: int = 50, fit: bool = False, dh: DHParameters = CODROID_DH,
+              span: float = 60.0, seed: Optional[int] = None) -> Optional[CalibrationReport]:
+    """
+    用控制器Robot/apostocpos的应答校验（fit为True时拟合）DH参数
+
+    参数:
+        codroid: 已连接的Codroid
+        joints: (N, 6) 采样关节角（度），None时在Home位附近±span度内随机取samples个
+        samples (int): 随机采样数
+        fit (bool): 是否拟合d、a、offset
+        dh (DHParameters): 校验的参数（拟合的初值）
+        span (float): 随机采样范围（度）
+        seed (int): 随机种子
+
+    返回值:
+        CalibrationReport: 比较结果，fit为True时为拟合后的参数和残差；全部样本出错时返回None
+    """
+    _require_numpy()
+    if joints is None:
+        rng = np.random.default_rng(seed)
+        joints = np.array([0.0, 0.0, 90.0, 0.0, 90.0, 0.0]) + rng.uniform(-span, span, (samples, 6))
+    joints = np.asarray(joints, dtype=float).reshape(-1, 6)
+    measured, errors = codroid.Apos2CposBatch(joints)
+    if errors.all():
+        print("控制器正解全部失败，无法校准")
+        return None
+    joints, measured = joints[~errors], measured[~errors]
+    if fit:
+        dh = fit_dh(joints, measured, dh)
+    position, orientation = residuals(Kinematics(dh), joints, measured)
+    return CalibrationReport(dh, len(joints), int(errors.sum()), float(np.sqrt(np.mean(position ** 2))),
+                             float(position.max()), float(orientation.max()))
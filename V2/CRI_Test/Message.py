@@ -0,0 +1,489 @@
+# Codroid JSON协议报文构造与应答匹配
+
+import functools
+import itertools
+import math
+import os
+import threading
+from collections import deque
+
+import JsonCodec
+
+# 进程内唯一的请求ID：随机前缀 + 自增序号
+_ID_PREFIX = "m" + os.urandom(3).hex()
+_id_counter = itertools.count(1)
+
+
+def new_id() -> str:
+    """生成一个进程内唯一的请求ID"""
+    return f"{_ID_PREFIX}{next(_id_counter):08x}"
+
+
+def is_publish(ty: str) -> bool:
+    """是否为publish/*订阅类报文（这类报文没有id，按ty匹配应答）"""
+    return ty.startswith("publish/")
+
+
+def assign_id(message: dict, force: bool = False) -> dict:
+    """
+    为请求分配唯一id
+
+    参数:
+        message (dict): 请求报文
+        force (bool): 为True时覆盖已有id（流水线模式需要保证id唯一）
+
+    返回值:
+        dict: 原报文
+    """
+    if not is_publish(message.get("ty", "")) and (force or "id" not in message):
+        message["id"] = new_id()
+    return message
+
+
+def reply_key(message: dict) -> tuple:
+    """请求对应的应答匹配键：publish/*或无id的报文按ty，其余按id"""
+    ty = message.get("ty", "")
+    if is_publish(ty) or "id" not in message:
+        return "ty", ty
+    return "id", str(message["id"])
+
+
+def is_reply(message: dict, frame: dict) -> bool:
+    """判断frame是否为message的应答；应答中缺少id时退回按ty比较"""
+    if not isinstance(frame, dict):
+        return False
+    if reply_key(message) == reply_key(frame):
+        return True
+    return "id" not in frame and frame.get("ty") == message.get("ty")
+
+
+class PendingReplies:
+    """
+    待完成应答登记表
+
+    同一个键上可以有多个请求（例如重复的publish/*），按先进先出匹配。
+    """
+
+    def __init__(self):
+        self._by_key: dict[tuple, deque] = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, message: dict, waiter):
+        """登记一个等待应答的请求"""
+        self._by_key.setdefault(reply_key(message), deque()).append((message.get("ty"), waiter))
+        self._count += 1
+
+    def pop(self, frame: dict):
+        """
+        取出与frame匹配的等待者
+
+        返回值:
+            匹配到的waiter，没有匹配时返回None
+        """
+        key = reply_key(frame)
+        queue = self._by_key.get(key)
+        if not queue and "id" not in frame:
+            # 应答缺少id：在按id登记的请求中找同ty最早的一个
+            ty = frame.get("ty")
+            for k, q in self._by_key.items():
+                if k[0] == "id" and q and q[0][0] == ty:
+                    key, queue = k, q
+                    break
+        if not queue:
+            return None
+        _, waiter = queue.popleft()
+        if not queue:
+            del self._by_key[key]
+        self._count -= 1
+        return waiter
+
+    def prune(self, predicate):
+        """删除predicate(waiter)为True的等待者，如调用方已超时取消的Future"""
+        for key in list(self._by_key):
+            queue = self._by_key[key]
+            kept = deque(item for item in queue if not predicate(item[1]))
+            self._count -= len(queue) - len(kept)
+            if kept:
+                self._by_key[key] = kept
+            else:
+                del self._by_key[key]
+
+    def drain(self) -> list:
+        """取出全部等待者（连接断开时使用）"""
+        waiters = [waiter for queue in self._by_key.values() for _, waiter in queue]
+        self._by_key.clear()
+        self._count = 0
+        return waiters
+
+
+class Inbox:
+    """
+    未被请求认领的帧（publish/*推送、日志等）
+
+    接收应答时顺带读到的其他帧不再丢弃，按ty分别缓存，供使用方取走。
+    每个ty的队列有长度上限，满时丢弃该ty最旧的帧，避免无人读取时无限增长。
+    I/O线程写入、调用方线程读取，内部加锁。
+    """
+
+    def __init__(self, maxlen: int = 256):
+        """
+        参数:
+            maxlen (int): 每个ty最多缓存的帧数
+        """
+        self.maxlen = maxlen
+        self._by_ty: dict[str, deque] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(q) for q in self._by_ty.values())
+
+    def put(self, frame):
+        """缓存一帧"""
+        ty = frame.get("ty", "") if isinstance(frame, dict) else ""
+        with self._lock:
+            queue = self._by_ty.get(ty)
+            if queue is None:
+                queue = self._by_ty[ty] = deque(maxlen=self.maxlen)
+            queue.append((next(self._seq), frame))
+
+    def pop_all(self, ty: str = None) -> list:
+        """
+        取出缓存的帧
+
+        参数:
+            ty (str): 只取该类型的帧，为None时取出全部
+
+        返回值:
+            list: 按到达顺序排列的帧
+        """
+        with self._lock:
+            if ty is not None:
+                queue = self._by_ty.pop(ty, None)
+                return [frame for _, frame in queue] if queue else []
+            items = [item for queue in self._by_ty.values() for item in queue]
+            self._by_ty.clear()
+        items.sort(key=lambda item: item[0])
+        return [frame for _, frame in items]
+
+    def clear(self):
+        with self._lock:
+            self._by_ty.clear()
+
+
+class Session:
+    """
+    会话状态记录
+
+    控制器按连接保存的状态在断线后会丢失，重连后需要重新发送：
+    publish/*订阅（同一ty只保留最后一次）、CRI/StartDataPush（CRI/StopDataPush后清除）、
+    project/enterRemoteScriptMode。
+    """
+
+    REMOTE_SCRIPT_MODE = "project/enterRemoteScriptMode"
+    START_DATA_PUSH = "CRI/StartDataPush"
+    STOP_DATA_PUSH = "CRI/StopDataPush"
+
+    def __init__(self):
+        self._remote_script = None
+        self._data_push = None
+        self._subscriptions: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.messages())
+
+    def record(self, message):
+        """记录一条已发送的请求（dict或MessageTemplate），与会话状态无关的请求直接忽略"""
+        ty = message.ty if isinstance(message, MessageTemplate) else message.get("ty", "")
+        with self._lock:
+            if is_publish(ty):
+                self._subscriptions[ty] = message
+            elif ty == self.START_DATA_PUSH:
+                self._data_push = message
+            elif ty == self.STOP_DATA_PUSH:
+                self._data_push = None
+            elif ty == self.REMOTE_SCRIPT_MODE:
+                self._remote_script = message
+
+    def discard(self, ty: str):
+        """删除一个publish/*订阅的记录"""
+        with self._lock:
+            self._subscriptions.pop(ty, None)
+
+    def messages(self) -> list:
+        """需要在重连后按顺序重新发送的请求"""
+        with self._lock:
+            replay = [m for m in (self._remote_script, self._data_push) if m is not None]
+            replay.extend(self._subscriptions.values())
+        return replay
+
+    def clear(self):
+        with self._lock:
+            self._remote_script = None
+            self._data_push = None
+            self._subscriptions.clear()
+
+
+class MessageTemplate:
+    """
+    预编码报文模板
+
+    报文内容固定、只有id每次不同的请求，预先把id前后的部分编码成UTF-8字节，
+    发送时直接拼接 prefix + id + suffix，不再构造dict和调用JsonCodec.dumps。
+    publish/*报文没有id，整段字节直接复用。
+    """
+    __slots__ = ("ty", "prefix", "suffix")
+
+    def __init__(self, message_dict: dict):
+        body = {k: v for k, v in message_dict.items() if k != "id"}
+        self.ty = body["ty"]
+        encoded = JsonCodec.dumps(body, ensure_ascii=False)
+        if is_publish(self.ty):
+            self.prefix = encoded
+            self.suffix = None
+        else:
+            # {"id":"<id>", + 原报文去掉开头的{
+            self.prefix = b'{"id":"'
+            self.suffix = b'",' + encoded[1:]
+
+    def render(self) -> tuple:
+        """
+        生成一次待发送的报文
+
+        返回值:
+            tuple: (用于应答匹配的报文dict, 待发送的字节)
+        """
+        if self.suffix is None:
+            return {"ty": self.ty}, self.prefix
+        message_id = new_id()
+        return {"id": message_id, "ty": self.ty}, self.prefix + message_id.encode('ascii') + self.suffix
+
+
+def encode(message, ensure_ascii: bool = True, force_id: bool = False) -> tuple:
+    """
+    将请求编码为待发送的字节
+
+    参数:
+        message: 报文dict或MessageTemplate
+        ensure_ascii (bool): 是否将非ASCII字符转义（仅对dict有效）
+        force_id (bool): 是否覆盖dict中已有的id
+
+    返回值:
+        tuple: (用于应答匹配的报文dict, 待发送的字节)
+    """
+    if isinstance(message, MessageTemplate):
+        return message.render()
+    assign_id(message, force_id)
+    return message, JsonCodec.dumps(message, ensure_ascii)
+
+
+@functools.lru_cache(maxsize=None)
+def fixed_template(ty: str, db=None) -> MessageTemplate:
+    """
+    固定内容报文的模板，如心跳、停止、状态查询
+
+    参数:
+        ty (str): 报文类型
+        db: None表示报文不带db字段，否则为db的值（需可哈希，如""）
+    """
+    message_dict = {"ty": ty}
+    if db is not None:
+        message_dict["db"] = db
+    return MessageTemplate(message_dict)
+
+
+@functools.lru_cache(maxsize=256)
+def io_value_template(io_type: str, port: int) -> MessageTemplate:
+    """读取单个IO端口的模板，如GetDI(port)"""
+    return MessageTemplate(get_io_value([{"type": io_type, "port": port}]))
+
+
+@functools.lru_cache(maxsize=256)
+def register_value_template(address: int) -> MessageTemplate:
+    """读取单个寄存器的模板"""
+    return MessageTemplate(get_register_value([address]))
+
+
+@functools.lru_cache(maxsize=64)
+def subscribe_template(topic: str, recvTime: int = 200) -> MessageTemplate:
+    """publish/*订阅报文的模板，如GetRobotStates(recvTime)"""
+    return MessageTemplate(subscribe(topic, recvTime))
+
+
+# ---------------- 报文构造 ----------------
+
+def get_io_value(data: list[dict]) -> dict:
+    """IOManager/GetIOValue，data形如[{"type": "DI", "port": 0}]"""
+    return {"ty": "IOManager/GetIOValue", "db": data}
+
+
+def set_io_value(data) -> dict:
+    """IOManager/SetIOValue，data形如[{"type": "DO", "port": 0, "value": 1}]"""
+    return {"ty": "IOManager/SetIOValue", "db": data}
+
+
+def get_register_value(addrlist: list[int]) -> dict:
+    """RegisterManager/GetRegisterValue"""
+    return {"ty": "RegisterManager/GetRegisterValue", "db": addrlist}
+
+
+def set_register_value(addrlist) -> dict:
+    """RegisterManager/SetRegisterValue，addrlist形如{"address": 10000, "value": 0}"""
+    return {"ty": "RegisterManager/SetRegisterValue", "db": addrlist}
+
+
+def subscribe(topic: str, recvTime: int = 200) -> dict:
+    """publish/* 订阅报文，topic如"RobotStatus"或"publish/RobotStatus"，recvTime为推送周期（毫秒）"""
+    if not is_publish(topic):
+        topic = "publish/" + topic
+    return {"ty": topic, "tc": recvTime}
+
+
+def run_script(mainProgram: str, subThreadsName: str = None, subThreads: str = None,
+               subProgramsName: str = None, subPrograms: str = None, interruptsName: str = None,
+               interrupts: str = None, vars: dict = None, id: int = 1) -> dict:
+    """project/runScript，参数含义见Codroid.RunScript"""
+    if mainProgram is None:
+        raise Exception("主程序不能为空")
+    if vars is None:
+        vars = {}
+
+    # 构建消息字典，包含脚本信息和变量
+    message_dict = {
+        "id": id,
+        "ty": "project/runScript",
+        "db": {
+            "scripts": {
+                "main": mainProgram,
+            },
+            "vars": vars
+        }
+    }
+
+    # 添加子线程脚本（如果提供）
+    if subThreadsName is not None and subThreads is not None:
+        message_dict["db"]["scripts"]["subThreads"] = {
+            subThreadsName: subThreads
+        }
+
+    # 添加子程序脚本（如果提供）
+    if subProgramsName is not None and subPrograms is not None:
+        message_dict["db"]["scripts"]["subPrograms"] = {
+            subProgramsName: subPrograms
+        }
+
+    # 添加中断处理脚本（如果提供）
+    if interruptsName is not None and interrupts is not None:
+        message_dict["db"]["scripts"]["interrupts"] = {
+            interruptsName: interrupts
+        }
+    return message_dict
+
+
+def enter_remote_script_mode(id: int = 1) -> dict:
+    """project/enterRemoteScriptMode"""
+    return {"id": id, "ty": "project/enterRemoteScriptMode"}
+
+
+def apos_to_cpos(apos: list[float], coor: list[float] = None, tool: list[float] = None) -> dict:
+    """Robot/apostocpos 正解，coor/tool缺省为零坐标系"""
+    if len(apos) != 6:
+        raise ValueError("cpos参数长度必须为6")
+    if coor is None:
+        coor = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+    if tool is None:
+        tool = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+    return {
+        "ty": "Robot/apostocpos",
+        "db": {
+            "jp": apos,
+            "coor": coor,
+            "tool": tool,
+            "ep": []
+        }
+    }
+
+
+def cpos_to_apos(cpos: list[float], reference_joint=None, radians: bool = False) -> dict:
+    """Robot/cpostoapos 逆解，reference_joint单位为度，报文中转换为弧度；radians为True时reference_joint已是弧度"""
+    if len(cpos) != 6:
+        raise ValueError("cpos参数长度必须为6")
+    if reference_joint is None:
+        reference_joint = [20, 20, 20, 20, 20, 20]
+    if len(reference_joint) != 6:
+        raise ValueError("reference_joint参数长度必须为6")
+    return {
+        "ty": "Robot/cpostoapos",
+        "db": {
+            "cp": [cpos[0], cpos[1], cpos[2], cpos[3], cpos[4], cpos[5]],
+            "rj": list(reference_joint) if radians else [math.radians(j) for j in reference_joint],
+            "ep": []
+        }
+    }
+
+
+def reply_pose(response, key: str):
+    """
+    从Robot/apostocpos（key为"cp"）或Robot/cpostoapos（key为"jp"）的应答中取出6维位姿
+
+    返回值:
+        list | str: 位姿；无应答、错误应答或格式不符时返回说明原因的字符串
+    """
+    if response is None:
+        return "无应答"
+    if "err" in response:
+        return str(response["err"])
+    db = response.get("db")
+    pose = db.get(key) if isinstance(db, dict) else db
+    if not isinstance(pose, list) or len(pose) != 6:
+        return f"应答格式错误: {db}"
+    return pose
+
+
+def cri_start_data_push(ip: str, port: int, duration: int) -> dict:
+    """CRI/StartDataPush"""
+    if port < 1000 or port > 65534:
+        raise ValueError("端口号必须在1000-65534之间")
+    if duration < 1:
+        raise ValueError("duration必须大于等于1")
+    return {
+        "ty": "CRI/StartDataPush",
+        "db": {
+            "ip": ip,
+            "port": port,
+            "duration": duration
+        }
+    }
+
+
+def cri_stop_data_push() -> MessageTemplate:
+    """CRI/StopDataPush，内容固定，返回预编码模板"""
+    return fixed_template("CRI/StopDataPush")
+
+
+def cri_start_control(filterType: int, duration: int, startBuffer: int) -> dict:
+    """CRI/StartControl"""
+    if filterType < 0 or filterType > 3:
+        raise ValueError("filterType必须在0-3之间")
+    if duration < 1:
+        raise ValueError("duration必须大于等于1")
+    if startBuffer < 1 or startBuffer > 100:
+        raise ValueError("startBuffer必须在1-100之间")
+    return {
+        "ty": "CRI/StartControl",
+        "db": {
+            "filterType": filterType,
+            "duration": duration,
+            "startBuffer": startBuffer
+        }
+    }
+
+
+def cri_stop_control() -> MessageTemplate:
+    """CRI/StopControl，内容固定，返回预编码模板"""
+    return fixed_template("CRI/StopControl")
@@ -0,0 +1,191 @@
+# 按报文类型统计的延迟直方图和计数器
+
+import threading
+
+# 纳秒转微秒
+_NS_PER_US = 1000.0
+
+
+class Histogram:
+    """
+    对数-线性分桶直方图（HDR风格）
+
+    小于2^sub_bits的值逐个计数；更大的值按2的幂分段，每段再线性分成2^(sub_bits-1)个子桶，
+    sub_bits=5时相对误差不超过约3%。记录只是一次整数位运算加一次列表自增，不保存原始样本，
+    内存与样本数无关。值为非负整数（纳秒、字节数等）。
+    """
+    __slots__ = ("sub_bits", "_sub_count", "_half", "_counts", "count", "total", "min", "max")
+
+    def __init__(self, sub_bits: int = 5):
+        self.sub_bits = sub_bits
+        self._sub_count = 1 << sub_bits
+        self._half = self._sub_count >> 1
+        self._counts = [0] * self._sub_count
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value: int) -> int:
+        if value < self._sub_count:
+            return value
+        shift = value.bit_length() - self.sub_bits
+        return self._sub_count + (shift - 1) * self._half + (value >> shift) - self._half
+
+    def _bucket_value(self, index: int) -> int:
+        """桶的中间值"""
+        if index < self._sub_count:
+            return index
+        shift, offset = divmod(index - self._sub_count, self._half)
+        shift += 1
+        low = (offset + self._half) << shift
+        return low + (1 << shift) // 2
+
+    def record(self, value: int):
+        """记录一个样本，负值按0处理"""
+        value = int(value) if value > 0 else 0
+        index = self._index(value)
+        counts = self._counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> int:
+        """
+        分位数
+
+        参数:
+            p (float): 百分位，如50、99、99.9
+
+        返回值:
+            int: 分位数所在桶的中间值（不超过实际最大值），没有样本时为0
+        """
+        if not self.count:
+            return 0
+        rank = max(1, -(-self.count * p // 100))
+        seen = 0
+        for index, n in enumerate(self._counts):
+            seen += n
+            if seen >= rank:
+                return min(self._bucket_value(index), self.max)
+        return self.max
+
+    def merge(self, other: "Histogram"):
+        """合并另一个直方图（sub_bits需相同）"""
+        if other.sub_bits != self.sub_bits:
+            raise ValueError("sub_bits不同的直方图不能合并")
+        if len(other._counts) > len(self._counts):
+            self._counts.extend([0] * (len(other._counts) - len(self._counts)))
+        for index, n in enumerate(other._counts):
+            self._counts[index] += n
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def summary(self, scale: float = 1.0) -> dict:
+        """count、mean、min、max、p50、p90、p99、p999，数值除以scale"""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.total / self.count / scale,
+            "min": self.min / scale,
+            "max": self.max / scale,
+            "p50": self.percentile(50) / scale,
+            "p90": self.percentile(90) / scale,
+            "p99": self.percentile(99) / scale,
+            "p999": self.percentile(99.9) / scale,
+        }
+
+
+class TypeStats:
+    """单个报文类型的统计：编码、往返、解码耗时（纳秒），发送、接收字节数，超时次数"""
+    __slots__ = ("encode", "rtt", "decode", "bytes_out", "bytes_in", "timeouts")
+
+    def __init__(self):
+        self.encode = Histogram()
+        self.rtt = Histogram()
+        self.decode = Histogram()
+        self.bytes_out = Histogram()
+        self.bytes_in = Histogram()
+        self.timeouts = 0
+
+
+class Metrics:
+    """
+    按ty（如Robot/moveTo、IOManager/GetIOValue）分别统计的请求指标
+
+    Codroid.EnableMetrics()后由客户端在请求路径上记录，未启用时客户端只做一次None判断。
+    可在任意线程调用snapshot()。
+    """
+
+    def __init__(self):
+        self._by_ty: dict[str, TypeStats] = {}
+        self._lock = threading.Lock()
+
+    def _stats(self, ty: str) -> TypeStats:
+        stats = self._by_ty.get(ty)
+        if stats is None:
+            stats = self._by_ty[ty] = TypeStats()
+        return stats
+
+    def record(self, ty: str, encode_ns: int, rtt_ns: int, decode_ns: int, bytes_out: int, bytes_in: int):
+        """记录一次完成的请求"""
+        with self._lock:
+            stats = self._stats(ty)
+            stats.encode.record(encode_ns)
+            stats.rtt.record(rtt_ns)
+            stats.decode.record(decode_ns)
+            stats.bytes_out.record(bytes_out)
+            stats.bytes_in.record(bytes_in)
+
+    def record_timeout(self, ty: str):
+        """记录一次超时"""
+        with self._lock:
+            self._stats(ty).timeouts += 1
+
+    def reset(self):
+        with self._lock:
+            self._by_ty.clear()
+
+    def snapshot(self) -> dict:
+        """
+        当前统计的快照
+
+        返回值:
+            dict: {ty: {"encode_us": {...}, "rtt_us": {...}, "decode_us": {...},
+                        "bytes_out": {...}, "bytes_in": {...}, "timeouts": n}}，
+                  耗时单位为微秒，每项含count、mean、min、max、p50、p90、p99、p999
+        """
+        with self._lock:
+            return {
+                ty: {
+                    "encode_us": stats.encode.summary(_NS_PER_US),
+                    "rtt_us": stats.rtt.summary(_NS_PER_US),
+                    "decode_us": stats.decode.summary(_NS_PER_US),
+                    "bytes_out": stats.bytes_out.summary(),
+                    "bytes_in": stats.bytes_in.summary(),
+                    "timeouts": stats.timeouts,
+                }
+                for ty, stats in self._by_ty.items()
+            }
+
+    def report(self) -> str:
+        """按ty输出往返时间分位数的文本表格"""
+        lines = [f"{'ty':<36}{'count':>8}{'p50(us)':>10}{'p99(us)':>10}{'p999(us)':>10}{'max(us)':>10}{'超时':>6}"]
+        for ty, item in sorted(self.snapshot().items()):
+            rtt = item["rtt_us"]
+            if rtt["count"]:
+                lines.append(f"{ty:<36}{rtt['count']:>8}{rtt['p50']:>10.1f}{rtt['p99']:>10.1f}"
+                             f"{rtt['p999']:>10.1f}{rtt['max']:>10.1f}{item['timeouts']:>6}")
+            else:
+                lines.append(f"{ty:<36}{0:>8}{'':>40}{item['timeouts']:>6}")
+        return "\n".join(lines)
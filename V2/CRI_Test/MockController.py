@@ -0,0 +1,700 @@
+# Codroid控制器模拟器（JSON协议，默认端口9001）
+#
+# 在本机模拟Codroid使用到的各类接口：project、globalVar、IOManager、RegisterManager、ModbusTcp、
+# Robot/moveTo及其心跳、Robot/apostocpos/cpostoapos、publish/*推送、CRI数据推送与实时控制。
+# 可注入应答时延、抖动、分包和粘包，用于负载测试、基准测试和CI，不需要真实机器人。
+#
+# 进程内使用:
+#     with MockController(network=NetworkProfile(latency=0.002, jitter=0.001, fragment=7)) as mock:
+#         cod = Codroid("127.0.0.1", mock.port)
+# 独立运行:
+#     python MockController.py --port 9001 --latency 0.002 --jitter 0.001 --fragment 7 --sticky 0.3
+
+import argparse
+import heapq
+import itertools
+import math
+import random
+import select
+import socket
+import struct
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import JsonCodec
+from Kinematics import DH_A, DH_ALPHA, DH_D, DH_OFFSET
+from TcpClient import JsonFrameDecoder
+
+
+class NetworkProfile(NamedTuple):
+    """注入的网络行为"""
+    latency: float = 0.0   # 应答基础时延（秒）
+    jitter: float = 0.0    # 在基础时延上叠加的随机时延上限（秒），均匀分布
+    fragment: int = 0      # 大于0时每次写出切成不超过该字节数的小段逐段发送（分包）
+    sticky: float = 0.0    # 0~1，到期的应答被多留sticky_hold秒、与后续应答合并发送的概率（粘包）
+    sticky_hold: float = 0.005
+
+
+# ---------------- 运动学 ----------------
+# DH参数与Kinematics模块共用；这里是不依赖numpy的纯Python实现，基座绕z轴旋转180°。
+_BASE = ((-1.0, 0.0, 0.0, 0.0), (0.0, -1.0, 0.0, 0.0), (0.0, 0.0, 1.0, 0.0), (0.0, 0.0, 0.0, 1.0))
+
+
+def _matmul(a, b):
+    return tuple(tuple(sum(a[i][k] * b[k][j] for k in range(4)) for j in range(4)) for i in range(4))
+
+
+def _dh(a, alpha, d, theta):
+    ct, st = math.cos(theta), math.sin(theta)
+    ca, sa = math.cos(alpha), math.sin(alpha)
+    return ((ct, -st * ca, st * sa, a * ct),
+            (st, ct * ca, -ct * sa, a * st),
+            (0.0, sa, ca, d),
+            (0.0, 0.0, 0.0, 1.0))
+
+
+def _fk_matrix(joints_deg):
+    t = _BASE
+    for i in range(6):
+        t = _matmul(t, _dh(DH_A[i], math.radians(DH_ALPHA[i]), DH_D[i], math.radians(joints_deg[i] + DH_OFFSET[i])))
+    return t
+
+
+def _rotation_to_rpy(r):
+    """旋转矩阵转rx、ry、rz（度，Z-Y-X欧拉角）"""
+    ry = math.atan2(-r[2][0], math.hypot(r[0][0], r[1][0]))
+    rz = math.atan2(r[1][0], r[0][0])
+    rx = math.atan2(r[2][1], r[2][2])
+    return [math.degrees(rx), math.degrees(ry), math.degrees(rz)]
+
+
+def _rpy_to_rotation(rx, ry, rz):
+    rx, ry, rz = math.radians(rx), math.radians(ry), math.radians(rz)
+    cx, sx, cy, sy, cz, sz = math.cos(rx), math.sin(rx), math.cos(ry), math.sin(ry), math.cos(rz), math.sin(rz)
+    return ((cz * cy, cz * sy * sx - sz * cx, cz * sy * cx + sz * sx),
+            (sz * cy, sz * sy * sx + cz * cx, sz * sy * cx - cz * sx),
+            (-sy, cy * sx, cy * cx))
+
+
+def forward_kinematics(joints_deg) -> list:
+    """正解：关节角（度）-> [x, y, z（mm）, rx, ry, rz（度）]"""
+    t = _fk_matrix(joints_deg)
+    return [t[0][3], t[1][3], t[2][3]] + _rotation_to_rpy(t)
+
+
+def _pose_error(target_pos, target_rot, joints_deg):
+    """位置误差（mm）和姿态误差（旋转向量，弧度）"""
+    t = _fk_matrix(joints_deg)
+    # R_err = R_target * R_current^T
+    e = [[sum(target_rot[i][k] * t[j][k] for k in range(3)) for j in range(3)] for i in range(3)]
+    angle = math.acos(max(-1.0, min(1.0, (e[0][0] + e[1][1] + e[2][2] - 1.0) / 2.0)))
+    s = math.sin(angle)
+    if s < 1e-9:
+        w = [0.0, 0.0, 0.0] if angle < 1e-9 else [angle * math.sqrt(max((e[i][i] + 1.0) / 2.0, 0.0)) for i in range(3)]
+    else:
+        k = angle / (2.0 * s)
+        w = [(e[2][1] - e[1][2]) * k, (e[0][2] - e[2][0]) * k, (e[1][0] - e[0][1]) * k]
+    return [target_pos[i] - t[i][3] for i in range(3)] + w
+
+
+def _solve(a, b):
+    """高斯消元解线性方程组（部分选主元）"""
+    n = len(b)
+    m = [row[:] + [b[i]] for i, row in enumerate(a)]
+    for c in range(n):
+        p = max(range(c, n), key=lambda r: abs(m[r][c]))
+        m[c], m[p] = m[p], m[c]
+        for r in range(c + 1, n):
+            f = m[r][c] / m[c][c]
+            for k in range(c, n + 1):
+                m[r][k] -= f * m[c][k]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        x[r] = (m[r][n] - sum(m[r][k] * x[k] for k in range(r + 1, n))) / m[r][r]
+    return x
+
+
+def inverse_kinematics(cpos, reference_deg, iterations: int = 200, tolerance: float = 1e-4) -> Optional[list]:
+    """
+    逆解：阻尼最小二乘迭代，从参考关节角出发，得到离参考关节角最近的一组解
+
+    参数:
+        cpos: [x, y, z（mm）, rx, ry, rz（度）]
+        reference_deg: 参考关节角（度）
+
+    返回值:
+        list: 关节角（度），不收敛时为None
+    """
+    target_pos = cpos[:3]
+    target_rot = _rpy_to_rotation(*cpos[3:6])
+    q = list(reference_deg)
+    rot_weight = 200.0  # 姿态误差（弧度）换算到与位置（mm）相当的量级
+    damping = 1.0
+    h = 1e-4
+    for _ in range(iterations):
+        err = _pose_error(target_pos, target_rot, q)
+        err = err[:3] + [v * rot_weight for v in err[3:]]
+        if max(abs(v) for v in err) < tolerance:
+            return q
+        # 数值雅可比（每列为单个关节变化h度时误差的变化）
+        cols = []
+        for j in range(6):
+            qj = q[:]
+            qj[j] += h
+            ej = _pose_error(target_pos, target_rot, qj)
+            ej = ej[:3] + [v * rot_weight for v in ej[3:]]
+            cols.append([(err[i] - ej[i]) / h for i in range(6)])
+        jac = [[cols[j][i] for j in range(6)] for i in range(6)]
+        jjt = [[sum(jac[i][k] * jac[r][k] for k in range(6)) + (damping if i == r else 0.0) for r in range(6)]
+               for i in range(6)]
+        y = _solve(jjt, err)
+        q = [q[j] + sum(jac[i][j] * y[i] for i in range(6)) for j in range(6)]
+    return None
+
+
+# ---------------- 机器人状态 ----------------
+
+# 预设位置（关节角，度）
+PRESET_POSITIONS = {
+    0: [0.0, 0.0, 90.0, 0.0, 90.0, 0.0],    # Home
+    1: [0.0, -30.0, 120.0, 0.0, 90.0, 0.0],  # Safety
+    2: [0.0, 0.0, 0.0, 0.0, 0.0, 0.0],       # Candle
+    3: [0.0, -60.0, 150.0, 0.0, 90.0, 0.0],  # Package
+}
+STATE_IDLE = 0
+STATE_MOVING = 4
+
+
+class RobotModel:
+    """
+    模拟的控制器状态，所有连接共享
+
+    moveTo后机器人以joint_speed（度/秒）在关节空间线性插补，运动中state为4；
+    超过heartbeat_timeout没有收到Robot/moveToHeartbeat时停在当前位置并记录一条警告日志。
+    """
+
+    def __init__(self, joint_speed: float = 90.0, heartbeat_timeout: float = 1.0):
+        self.lock = threading.RLock()
+        self.joint_speed = joint_speed
+        self.heartbeat_timeout = heartbeat_timeout
+        self.joints = list(PRESET_POSITIONS[0])
+        self.state = STATE_IDLE
+        self.servo_on = True
+        self.operate_mode = 0
+        self.speed_ratio = 100
+        self.project_state = 0
+        self.remote_script_mode = False
+        self.io: dict[tuple, float] = {}
+        self.registers: dict[int, int] = {}
+        self.global_vars: dict[str, dict] = {}
+        self.var_updates: dict[str, dict] = {}
+        self.modbus: dict[str, dict] = {}
+        self.logs: list = []
+        self.errors: list = []
+        self.cri_controlling = False
+        self._motion = None  # (起点, 终点, 开始时刻, 时长)
+        self._heartbeat_deadline = 0.0
+
+    def update(self, now: float = None):
+        """推进运动插补"""
+        if self._motion is None:
+            return
+        now = time.monotonic() if now is None else now
+        start, target, t0, duration = self._motion
+        if now > self._heartbeat_deadline:
+            now = self._heartbeat_deadline
+            self._finish(start, target, t0, duration, now)
+            self.log(4, 1, "moveTo心跳超时，运动停止")
+            return
+        if now - t0 >= duration:
+            self._finish(start, target, t0, duration, now)
+            return
+        ratio = (now - t0) / duration
+        self.joints = [s + (e - s) * ratio for s, e in zip(start, target)]
+
+    def _finish(self, start, target, t0, duration, now):
+        ratio = 1.0 if duration <= 0 else min(max((now - t0) / duration, 0.0), 1.0)
+        self.joints = [s + (e - s) * ratio for s, e in zip(start, target)]
+        self.state = STATE_IDLE
+        self._motion = None
+
+    def move_to(self, target: list):
+        now = time.monotonic()
+        self.update(now)
+        duration = max(abs(e - s) for s, e in zip(self.joints, target)) / self.joint_speed
+        self._motion = (list(self.joints), list(target), now, duration)
+        self._heartbeat_deadline = now + self.heartbeat_timeout
+        self.state = STATE_MOVING
+
+    def heartbeat(self):
+        self.update()
+        if self._motion is not None:
+            self._heartbeat_deadline = time.monotonic() + self.heartbeat_timeout
+
+    def stop(self):
+        self.update()
+        self._motion = None
+        self.state = STATE_IDLE
+
+    def log(self, typecode: int, errcode: int, msg: str):
+        self.logs.append([typecode, errcode, int(time.time()), msg])
+        del self.logs[:-100]
+
+    def cartesian(self) -> list:
+        return forward_kinematics(self.joints)
+
+
+# ---------------- 服务器 ----------------
+
+class _Connection:
+    """一个客户端连接的发送计划和订阅"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.decoder = JsonFrameDecoder()
+        self.schedule = []  # (发送时刻, 序号, 字节, 是否已按粘包延后)
+        self.subscriptions: dict[str, list] = {}  # ty -> [周期秒数, 下次推送时刻]
+
+
+class MockController:
+    """
+    模拟Codroid控制器
+
+    每个连接一个线程：读取请求、按NetworkProfile安排应答时刻、按订阅周期推送publish/*。
+    未实现的ty回复不带db的应答，保证调用方不会卡住。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, network: NetworkProfile = None,
+                 robot: RobotModel = None, seed: int = None):
+        """
+        参数:
+            host (str): 监听地址
+            port (int): 监听端口，0表示自动分配
+            network (NetworkProfile): 注入的时延、抖动、分包、粘包
+            robot (RobotModel): 机器人状态，多个模拟器可共享
+            seed (int): 随机数种子，便于复现
+        """
+        self.host = host
+        self.port = port
+        self.network = network or NetworkProfile()
+        self.robot = robot or RobotModel()
+        self.requests = 0  # 已处理的请求数
+        self._random = random.Random(seed)
+        self._seq = itertools.count()
+        self._server: Optional[socket.socket] = None
+        self._running = False
+        self._push_thread: Optional[threading.Thread] = None
+        self._push_stop = threading.Event()
+        self._cri_thread: Optional[threading.Thread] = None
+        self._cri_stop = threading.Event()
+        self.cri_port = 0  # CRI实时控制的UDP端口，StartControl后有效
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def start(self) -> int:
+        """开始监听，返回端口号"""
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.port))
+        self._server.listen()
+        self.port = self._server.getsockname()[1]
+        self._running = True
+        threading.Thread(target=self._accept_loop, name="MockController", daemon=True).start()
+        return self.port
+
+    def close(self):
+        """停止模拟器"""
+        self._running = False
+        self._push_stop.set()
+        self._cri_stop.set()
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                readable, _, _ = select.select([self._server], [], [], 0.1)
+                if readable:
+                    sock, _ = self._server.accept()
+            except (OSError, ValueError, AttributeError):
+                break
+            if readable:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                threading.Thread(target=self._serve, args=(_Connection(sock),), daemon=True).start()
+
+    # ---- 连接收发 ----
+
+    def _serve(self, conn: _Connection):
+        try:
+            while self._running:
+                now = time.monotonic()
+                due = [item[0] for item in conn.schedule[:1]]
+                due += [sub[1] for sub in conn.subscriptions.values()]
+                timeout = max(min(due) - now, 0.0) if due else 0.1
+                readable, _, _ = select.select([conn.sock], [], [], min(timeout, 0.1))
+                if readable:
+                    n = conn.sock.recv_into(conn.decoder.writable(4096))
+                    if not n:
+                        break
+                    conn.decoder.commit(n)
+                    while (frame := conn.decoder.next_frame_view()) is not None:
+                        try:
+                            request = JsonCodec.loads(frame)
+                        except ValueError:
+                            continue
+                        self._on_request(conn, request)
+                self._publish_due(conn)
+                self._flush_due(conn)
+        except OSError:
+            pass
+        finally:
+            conn.sock.close()
+
+    def _delay(self) -> float:
+        net = self.network
+        return net.latency + (self._random.uniform(0.0, net.jitter) if net.jitter > 0 else 0.0)
+
+    def _queue(self, conn: _Connection, message: dict, delay: float = None):
+        due = time.monotonic() + (self._delay() if delay is None else delay)
+        heapq.heappush(conn.schedule, (due, next(self._seq), JsonCodec.dumps(message, ensure_ascii=False), False))
+
+    def _flush_due(self, conn: _Connection):
+        now = time.monotonic()
+        out = []
+        net = self.network
+        while conn.schedule and conn.schedule[0][0] <= now:
+            due, seq, data, held = heapq.heappop(conn.schedule)
+            if not held and net.sticky > 0 and self._random.random() < net.sticky:
+                heapq.heappush(conn.schedule, (now + net.sticky_hold, seq, data, True))
+                continue
+            out.append(data)
+        if not out:
+            return
+        data = b"".join(out)
+        if net.fragment > 0:
+            pos = 0
+            while pos < len(data):
+                size = self._random.randint(1, net.fragment)
+                conn.sock.sendall(data[pos:pos + size])
+                pos += size
+        else:
+            conn.sock.sendall(data)
+
+    # ---- 请求分发 ----
+
+    def _on_request(self, conn: _Connection, request: dict):
+        self.requests += 1
+        ty = request.get("ty", "")
+        db = request.get("db")
+        with self.robot.lock:
+            self.robot.update()
+            if ty.startswith("publish/"):
+                period = max(int(request.get("tc", 200)), 1) / 1000.0
+                conn.subscriptions[ty] = [period, time.monotonic() + period]
+                self._queue(conn, {"ty": ty, "db": self._topic(ty)})
+                return
+            handler = self._HANDLERS.get(ty) or self._FAMILY_HANDLERS.get(ty.split("/", 1)[0])
+            try:
+                result = handler(self, ty, db) if handler is not None else None
+                reply = {"ty": ty}
+                if result is not None:
+                    reply["db"] = result
+            except (KeyError, IndexError, TypeError, ValueError) as e:
+                reply = {"ty": ty, "err": str(e)}
+        if "id" in request:
+            reply = {"id": request["id"], **reply}
+        self._queue(conn, reply)
+
+    def _publish_due(self, conn: _Connection):
+        if not conn.subscriptions:
+            return
+        now = time.monotonic()
+        with self.robot.lock:
+            self.robot.update(now)
+            for ty, sub in conn.subscriptions.items():
+                if sub[1] <= now:
+                    sub[1] = max(sub[1] + sub[0], now)
+                    self._queue(conn, {"ty": ty, "db": self._topic(ty)}, delay=0.0)
+
+    def _topic(self, ty: str):
+        robot = self.robot
+        topic = ty[len("publish/"):]
+        if topic == "RobotStatus":
+            return {"state": robot.state, "servoEnable": robot.servo_on, "operateMode": robot.operate_mode,
+                    "speedRatio": robot.speed_ratio, "joint": list(robot.joints), "cartesian": robot.cartesian(),
+                    "criControlling": robot.cri_controlling}
+        if topic == "RobotPosture":
+            return {"joint": list(robot.joints), "cartesian": robot.cartesian()}
+        if topic == "ProjectState":
+            return {"state": robot.project_state, "remoteScriptMode": robot.remote_script_mode}
+        if topic == "VarUpdate":
+            updates, robot.var_updates = robot.var_updates, {}
+            return updates
+        if topic == "Log":
+            logs, robot.logs = robot.logs, []
+            return logs
+        if topic == "Error":
+            return list(robot.errors)
+        if topic in ("RobotCoordinate", "obotCoordinate"):
+            return {"coor": [0.0] * 6, "tool": [0.0] * 6}
+        return None
+
+    # ---- 各类接口 ----
+
+    def _project(self, ty, db):
+        robot = self.robot
+        action = ty.split("/", 1)[1]
+        if action in ("run", "runByIndex", "runStep", "runScript", "resume"):
+            robot.project_state = 1
+        elif action == "pause":
+            robot.project_state = 2
+        elif action == "stop":
+            robot.project_state = 0
+            robot.remote_script_mode = False
+        elif action == "enterRemoteScriptMode":
+            robot.remote_script_mode = True
+        return None
+
+    def _global_var(self, ty, db):
+        robot = self.robot
+        action = ty.split("/", 1)[1]
+        if action == "saveVars":
+            robot.global_vars.update(db)
+            robot.var_updates.update(db)
+            return None
+        if action == "removeVars":
+            for name in db:
+                robot.global_vars.pop(name, None)
+            return None
+        if action == "getVars":
+            return dict(robot.global_vars)
+        return {}
+
+    def _get_io(self, ty, db):
+        return [{"type": item["type"], "port": item["port"],
+                 "value": self.robot.io.get((item["type"], item["port"]), 0)} for item in db]
+
+    def _set_io(self, ty, db):
+        for item in (db if isinstance(db, list) else [db]):
+            self.robot.io[(item["type"], item["port"])] = item["value"]
+        return None
+
+    def _get_register(self, ty, db):
+        return [{"address": address, "value": self.robot.registers.get(address, 0)} for address in db]
+
+    def _set_register(self, ty, db):
+        for item in (db if isinstance(db, list) else [db]):
+            self.robot.registers[item["address"]] = item["value"]
+        return None
+
+    def _modbus(self, ty, db):
+        devices = self.robot.modbus
+        action = ty.split("/", 1)[1]
+        if action == "getConfig":
+            config = {}
+            for name, dev in devices.items():
+                config[name] = {k: v for k, v in dev.items() if k != "tables"}
+                config[name]["tables"] = {t: {k: v for k, v in table.items() if k != "val"}
+                                          for t, table in dev["tables"].items()}
+            return config
+        if action == "getState":
+            return {name: {"connected": True, "tables": {t: {"val": list(table["val"])} for t, table in dev["tables"].items()}}
+                    for name, dev in devices.items()}
+        if action == "setDevice":
+            tables = devices.get(db["name"], {}).get("tables", {})
+            devices[db["name"]] = {"ip": db["ip"], "port": db["port"], "slaveId": db["slaveId"],
+                                   "endian": db["endian"], "tables": tables}
+        elif action == "removeDevice":
+            devices.pop(db["name"], None)
+        elif action == "setTable":
+            devices[db["name"]]["tables"][db["tableName"]] = {
+                "functionCode": db["functionCode"], "addr": db["addr"], "count": db["count"],
+                "period": db["period"], "val": [0] * db["count"]}
+        elif action == "removeTable":
+            devices[db["name"]]["tables"].pop(db["tableName"], None)
+        elif action == "setVal":
+            table = devices[db["name"]]["tables"][db["tableName"]]
+            table["val"][db["addr"] - table["addr"]] = db["val"]
+        elif action == "setPeriod":
+            devices[db["name"]]["tables"][db["tableName"]]["period"] = db["period"]
+        elif action == "setName":
+            table = devices[db["name"]]["tables"][db["tableName"]]
+            table.setdefault("names", {})[str(db["addr"])] = db["alias"]
+        elif action == "setType":
+            table = devices[db["name"]]["tables"][db["tableName"]]
+            table.setdefault("types", {})[str(db["addr"])] = {"type": db["type"], "count": db["count"]}
+        return None
+
+    def _move_to(self, ty, db):
+        robot = self.robot
+        move_type = db["type"]
+        if move_type in PRESET_POSITIONS:
+            target = PRESET_POSITIONS[move_type]
+        elif move_type == 4:
+            target = [float(v) for v in db["target"]["jp"]]
+        elif move_type == 5:
+            target = inverse_kinematics(db["target"]["cp"], robot.joints)
+            if target is None:
+                raise ValueError("逆解失败")
+        else:
+            raise ValueError(f"不支持的运动类型: {move_type}")
+        robot.move_to(target)
+        return None
+
+    def _robot(self, ty, db):
+        robot = self.robot
+        action = ty.split("/", 1)[1]
+        if action == "moveToHeartbeat":
+            robot.heartbeat()
+        elif action in ("stop", "stopJog"):
+            robot.stop()
+        elif action == "switchOn":
+            robot.servo_on = True
+        elif action == "switchOff":
+            robot.servo_on = False
+            robot.stop()
+        elif action in ("toManual", "toAuto", "toRemote"):
+            robot.operate_mode = ("toManual", "toAuto", "toRemote").index(action)
+        elif action == "apostocpos":
+            return {"cp": forward_kinematics(db["jp"])}
+        elif action == "cpostoapos":
+            joints = inverse_kinematics(db["cp"], [math.degrees(v) for v in db["rj"]])
+            if joints is None:
+                raise ValueError("逆解失败")
+            return {"jp": joints}
+        elif action in ("GetDragSensitivity",):
+            return {"sensitivity": 5}
+        elif action in ("GetDragMode", "GetCartOriLockState", "IsOnGivenSamplePosition"):
+            return 0
+        return None
+
+    def _cri(self, ty, db):
+        robot = self.robot
+        action = ty.split("/", 1)[1]
+        if action == "StartDataPush":
+            self._stop_thread("_push_thread", self._push_stop)
+            self._push_stop.clear()
+            self._push_thread = threading.Thread(target=self._data_push_loop,
+                                                 args=(db["ip"], db["port"], db["duration"] / 1000.0), daemon=True)
+            self._push_thread.start()
+        elif action == "StopDataPush":
+            self._stop_thread("_push_thread", self._push_stop)
+        elif action == "StartControl":
+            self._stop_thread("_cri_thread", self._cri_stop)
+            self._cri_stop.clear()
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((self.host, self.cri_port))
+            self.cri_port = sock.getsockname()[1]
+            robot.stop()
+            robot.cri_controlling = True
+            self._cri_thread = threading.Thread(target=self._cri_control_loop, args=(sock,), daemon=True)
+            self._cri_thread.start()
+        elif action == "StopControl":
+            self._stop_thread("_cri_thread", self._cri_stop)
+            robot.cri_controlling = False
+        return None
+
+    def _stop_thread(self, name: str, stop: threading.Event):
+        thread = getattr(self, name)
+        if thread is not None and thread is not threading.current_thread():
+            stop.set()
+            thread.join()
+            setattr(self, name, None)
+
+    def _data_push_loop(self, ip: str, port: int, period: float):
+        """按CRI实时数据定义推送PushData（关节rad，末端m/rad）"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        next_time = time.monotonic()
+        try:
+            while not self._push_stop.is_set():
+                # StopDataPush的处理持有robot.lock并等待本线程退出，不能无限期等锁
+                if not self.robot.lock.acquire(timeout=0.1):
+                    continue
+                try:
+                    self.robot.update()
+                    joints = [math.radians(v) for v in self.robot.joints]
+                    cp = self.robot.cartesian()
+                    controlling = self.robot.cri_controlling
+                finally:
+                    self.robot.lock.release()
+                end = [v / 1000.0 for v in cp[:3]] + [math.radians(v) for v in cp[3:]]
+                sock.sendto(struct.pack('?B6B6d6d', controlling, 0, 0, 0, 0, 0, 0, 0, *joints, *end), (ip, port))
+                next_time += period
+                self._push_stop.wait(max(next_time - time.monotonic(), 0.0))
+        finally:
+            sock.close()
+
+    def _cri_control_loop(self, sock: socket.socket):
+        """接收CommandData（关节rad或末端m/rad）并直接更新机器人位置"""
+        sock.settimeout(0.1)
+        try:
+            while not self._cri_stop.is_set():
+                try:
+                    data = sock.recv(64)
+                except socket.timeout:
+                    continue
+                if len(data) != 64:
+                    continue
+                _, *position, cmd_type = struct.unpack('<q6dB7x', data)
+                # 同上，StopControl的处理持有robot.lock并等待本线程退出
+                if not self.robot.lock.acquire(timeout=0.1):
+                    continue
+                try:
+                    if cmd_type == 0:
+                        self.robot.joints = [math.degrees(v) for v in position]
+                    else:
+                        cp = [v * 1000.0 for v in position[:3]] + [math.degrees(v) for v in position[3:]]
+                        joints = inverse_kinematics(cp, self.robot.joints)
+                        if joints is not None:
+                            self.robot.joints = joints
+                finally:
+                    self.robot.lock.release()
+        finally:
+            sock.close()
+
+    _HANDLERS = {
+        "IOManager/GetIOValue": _get_io,
+        "IOManager/SetIOValue": _set_io,
+        "RegisterManager/GetRegisterValue": _get_register,
+        "RegisterManager/SetRegisterValue": _set_register,
+        "Robot/moveTo": _move_to,
+    }
+    _FAMILY_HANDLERS = {
+        "project": _project,
+        "globalVar": _global_var,
+        "ModbusTcp": _modbus,
+        "Robot": _robot,
+        "CRI": _cri,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Codroid控制器模拟器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency", type=float, default=0.0, help="应答时延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="随机抖动上限（秒）")
+    parser.add_argument("--fragment", type=int, default=0, help="分包的最大字节数，0表示不分包")
+    parser.add_argument("--sticky", type=float, default=0.0, help="粘包概率")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    mock = MockController(args.host, args.port, NetworkProfile(args.latency, args.jitter, args.fragment, args.sticky),
+                          seed=args.seed)
+    print(f"模拟控制器已启动 {args.host}:{mock.start()}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        mock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,585 @@
+# 非阻塞运动句柄与共享心跳定时器
+#
+# Robot/moveTo、Robot/jog发出后，控制器要求每0.5s收到一次对应的心跳，否则停止运动。
+# 原先的做法是不停地GetRobotStates + 心跳直到state != 4，每个样本一次请求，且占满一个CPU核。
+# 这里：
+#   - 运动完成由状态镜像（publish/RobotStatus推送）的监听回调判断；
+#   - 所有机器人的全部心跳由一个共享定时线程按绝对截止时刻发送（只写出、不等待应答）；
+#   - MotionHandle提供wait()/cancel()/done()/progress，等待的线程在Future上睡眠，
+#     一个线程可以同时等待多台机器人的运动（wait_motions）；
+#   - MotionQueue批量校验目标后连续执行，或经CRI实时控制走一条不停顿的过渡轨迹。
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, wait
+from typing import Callable, Optional
+
+import CriStream
+import Message
+from CriStream import CriStreamer
+from Define import LatePolicy, MoveType
+from StateMirror import RobotSnapshot, RobotStateMirror
+from TcpClient import CodroidTimeoutError
+
+HEARTBEAT_PERIOD = 0.5  # moveTo/jog心跳周期（秒）
+STATE_MOVING = 4
+
+
+class HeartbeatTimer:
+    """
+    所有心跳共用的定时线程
+
+    任务按绝对截止时刻排入最小堆，每次触发后截止时刻加一个周期，不累积发送耗时和唤醒误差；
+    落后超过一个周期时从当前时刻重新计。任务的tick(now)返回False时移出。
+    """
+
+    def __init__(self):
+        self._heap = []  # (截止时刻, 序号, 任务)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.max_lateness = 0.0  # 触发时刻相对截止时刻的最大延迟（秒）
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap)
+
+    def add(self, task, due: float = None):
+        """登记任务，due为第一次触发的time.monotonic()时刻，默认立即"""
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() if due is None else due, next(self._seq), task))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="CodroidHeartbeat", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                due, _, task = self._heap[0]
+                now = time.monotonic()
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+                heapq.heappop(self._heap)
+            self.max_lateness = max(self.max_lateness, now - due)
+            try:
+                keep = task.tick(now)
+            except Exception as e:
+                print(f"心跳任务出错: {e}")
+                keep = False
+            if keep:
+                due += task.period
+                if due <= now:
+                    due = now + task.period
+                with self._cond:
+                    heapq.heappush(self._heap, (due, next(self._seq), task))
+
+
+_timer: Optional[HeartbeatTimer] = None
+_timer_lock = threading.Lock()
+
+
+def heartbeat_timer() -> HeartbeatTimer:
+    """进程内共享的心跳定时器，第一次使用时创建"""
+    global _timer
+    with _timer_lock:
+        if _timer is None:
+            _timer = HeartbeatTimer()
+        return _timer
+
+
+class MotionHandle:
+    """
+    一次运动（moveTo或jog）的句柄
+
+    心跳由共享定时器发送，直到运动完成、超时或被取消。
+    moveTo完成条件：在moveTo应答之后收到的推送中state != 4，并且之前已看到过state == 4，
+    或者该推送比moveTo应答晚settle秒以上（目标就是当前位置时机器人不会进入运动状态；
+    推送和应答不在同一连接上，应答之后到达的推送可能是控制器在执行moveTo之前采样的）。
+    jog没有完成条件，只能取消或超时结束。
+    """
+
+    def __init__(self, codroid, mirror: Optional[RobotStateMirror], heartbeat, stop=None,
+                 timeout: float = None, callback: Callable[[Optional[RobotSnapshot]], None] = None,
+                 target: list = None, target_kind: str = None):
+        """
+        参数:
+            codroid: 发送心跳使用的Codroid
+            mirror (RobotStateMirror): 状态镜像，为None时运动不会自行完成（jog）
+            heartbeat: 心跳报文（Message.MessageTemplate）
+            stop: 取消或超时时发送的报文，如Robot/stopJog；为None时只停止心跳，控制器随之停止运动
+            timeout (float): 运动完成的最长时间（秒），None表示不限
+            callback: 完成时调用callback(snapshot)，超时或取消时调用callback(None)
+            target (list): 目标位置，用于计算progress
+            target_kind (str): "joints"（关节角）或"cartesian"（末端位置）
+        """
+        now = time.monotonic()
+        self.codroid = codroid
+        self.mirror = mirror
+        self.heartbeat = heartbeat
+        self.stop = stop
+        self.callback = callback
+        self.period = HEARTBEAT_PERIOD
+        self.future = Future()
+        self.start_time = now
+        self.deadline = None if timeout is None else now + timeout
+        self.heartbeats = 0
+        self.seen_moving = False
+        self._target = target
+        self._target_kind = target_kind
+        self._start = None
+        if mirror is not None:
+            snap = mirror.snapshot
+            self.start_seq = snap.seq
+            self.settle = max(2 * mirror.period / 1000.0, 0.05)
+            self._start = self._position(snap)
+            mirror.add_listener(self._on_snapshot)
+        heartbeat_timer().add(self)
+
+    def done(self) -> bool:
+        """运动是否已结束（完成、超时或取消）"""
+        return self.future.done()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        等待运动结束
+
+        参数:
+            timeout (float): 最长等待时间（秒），None表示一直等待
+
+        返回值:
+            bool: 是否已结束；运动超时抛出CodroidTimeoutError，被取消时返回True
+        """
+        try:
+            self.future.result(timeout)
+        except CancelledError:
+            pass
+        except TimeoutError as e:
+            if isinstance(e, CodroidTimeoutError):
+                raise
+            return False
+        return True
+
+    def cancel(self) -> bool:
+        """
+        取消运动：停止心跳，并发送stop报文（jog为Robot/stopJog）
+
+        返回值:
+            bool: 运动在取消前尚未结束
+        """
+        if not self.future.cancel():
+            return False
+        self._release()
+        if self.stop is not None:
+            self.codroid.client.post(self.stop)
+        self._notify(None)
+        return True
+
+    @property
+    def progress(self) -> Optional[float]:
+        """进度0~1：MovJ按关节空间距离、MovL按末端位置距离计算；无法计算时为None，完成后为1.0"""
+        if self.future.done() and not self.future.cancelled() and self.future.exception() is None:
+            return 1.0
+        if self.mirror is None or self._start is None or self._target is None:
+            return None
+        current = self._position(self.mirror.snapshot)
+        if current is None:
+            return None
+        total = math.dist(self._start, self._target)
+        if total == 0:
+            return 1.0
+        return min(max(1.0 - math.dist(current, self._target) / total, 0.0), 1.0)
+
+    def _position(self, snap: RobotSnapshot):
+        if self._target_kind == "joints":
+            return snap.joints
+        if self._target_kind == "cartesian" and snap.cartesian is not None:
+            return snap.cartesian[:3]
+        return None
+
+    def _on_snapshot(self, snap: RobotSnapshot):
+        if self.future.done() or snap.seq <= self.start_seq:
+            return
+        if snap.state == STATE_MOVING:
+            self.seen_moving = True
+            return
+        if snap.state is None or not (self.seen_moving or snap.monotonic - self.start_time >= self.settle):
+            return
+        if self._set(snap):
+            self._notify(snap)
+
+    def _set(self, snap: Optional[RobotSnapshot], error: Exception = None) -> bool:
+        self._release()
+        try:
+            if error is None:
+                self.future.set_result(snap)
+            else:
+                self.future.set_exception(error)
+        except Exception:
+            return False  # 已被取消或由其他线程完成
+        return True
+
+    def _release(self):
+        if self.mirror is not None:
+            self.mirror.remove_listener(self._on_snapshot)
+
+    def _notify(self, snap: Optional[RobotSnapshot]):
+        if self.callback is not None:
+            try:
+                self.callback(snap)
+            except Exception as e:
+                print(f"运动完成回调出错: {e}")
+
+    def tick(self, now: float) -> bool:
+        """定时器调用：发送心跳、检查超时，返回是否继续"""
+        if self.future.done():
+            return False
+        if self.deadline is not None and now >= self.deadline:
+            if self._set(None, CodroidTimeoutError(f"运动未在{self.deadline - self.start_time:.1f}s内完成")):
+                if self.stop is not None:
+                    self.codroid.client.post(self.stop)
+                self._notify(None)
+            return False
+        self.heartbeats += 1
+        if not self.codroid.client.post(self.heartbeat):
+            print("心跳发送失败")
+        return True
+
+
+def wait_motions(handles: list, timeout: float = None) -> bool:
+    """
+    在当前线程中等待一组运动结束，可来自不同的机器人
+
+    参数:
+        handles (list[MotionHandle]): 运动句柄
+        timeout (float): 最长等待时间（秒），None表示一直等待
+
+    返回值:
+        bool: 是否全部结束
+    """
+    _, not_done = wait([handle.future for handle in handles], timeout)
+    return not not_done
+
+
+def wait_any(handles: list, timeout: float = None) -> list:
+    """等待任意一个运动结束，返回已结束的句柄"""
+    wait([handle.future for handle in handles], timeout, return_when=FIRST_COMPLETED)
+    return [handle for handle in handles if handle.done()]
+
+
+def wait_motion_polling(codroid, timeout: float = None, interval: float = 0.05):
+    """
+    没有状态镜像（订阅连接建立失败）时的后备：按interval查询状态，按周期发送心跳
+
+    返回值:
+        bool: 运动是否完成，超时返回False
+    """
+    now = time.monotonic()
+    deadline = None if timeout is None else now + timeout
+    next_heartbeat = now
+    while True:
+        res = codroid.GetRobotStates()
+        if res is None:
+            return False
+        if res["db"]["state"] != STATE_MOVING:
+            return True
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            return False
+        if now >= next_heartbeat:
+            codroid._request(Message.fixed_template("Robot/moveToHeartbeat"))
+            next_heartbeat = max(next_heartbeat + HEARTBEAT_PERIOD, now)
+        time.sleep(interval)
+
+
+class QueuedMove:
+    """MotionQueue中的一次运动及其计时（time.monotonic()，秒）"""
+
+    def __init__(self, move_type: MoveType, target: list):
+        self.move_type = move_type
+        self.target = target
+        self.joints: Optional[list] = None     # 关节角：MovJ为目标本身，MovL为校验时的逆解结果
+        self.cartesian: Optional[list] = None  # 末端位姿：MovL为目标本身，MovJ为校验时的正解结果
+        self.dispatched: Optional[float] = None  # 发出moveTo（CRI路径：开始驶向该点）
+        self.acked: Optional[float] = None       # 收到moveTo应答
+        self.finished: Optional[float] = None    # 推送报告运动完成（CRI路径：到达该点）
+        self.error: Optional[str] = None
+
+    @property
+    def latency(self) -> Optional[float]:
+        """moveTo的往返时间"""
+        if self.dispatched is None or self.acked is None:
+            return None
+        return self.acked - self.dispatched
+
+    @property
+    def duration(self) -> Optional[float]:
+        """从发出到完成的时间"""
+        if self.dispatched is None or self.finished is None:
+            return None
+        return self.finished - self.dispatched
+
+    def __repr__(self):
+        return f"QueuedMove({self.move_type.name}, {self.target}, duration={self.duration}, error={self.error})"
+
+
+def _finite_pose(pose, name: str) -> list:
+    if len(pose) != 6:
+        raise ValueError(f"{name}参数长度必须为6")
+    pose = [float(v) for v in pose]
+    if not all(math.isfinite(v) for v in pose):
+        raise ValueError(f"{name}包含非有限数值")
+    return pose
+
+
+class MotionQueue:
+    """
+    MovJ/MovL运动队列
+
+    Validate()用一轮流水线对全部目标做正解/逆解，提前发现不可达的点；
+    Run()逐个发出moveTo，上一运动由状态推送报告完成后立即发出下一条，中间不再查询状态；
+    RunCRI()把全部目标连成一条带过渡的关节空间轨迹，经CRI实时控制发送，途经点处不停顿。
+    每次运动的发出、应答、完成时刻记录在QueuedMove中，Summary()汇总空闲时间。
+
+    用法:
+        queue = cod.MotionQueue()
+        queue.MovJ([0, 0, 90, 0, 90, 0]).MovL([494, 191, 400, 180, 0, -90]).MovJ([10, 0, 90, 0, 90, 0])
+        if queue.Validate():
+            queue.Run()
+        print(queue.Summary())
+    """
+
+    def __init__(self, codroid):
+        self.codroid = codroid
+        self.moves: list[QueuedMove] = []
+        self.validated = False
+        self._cancel = threading.Event()
+        self._handle: Optional[MotionHandle] = None
+        self.clock = None  # 最近一次RunCRI的发送节拍（CriStream.CRIClock）
+
+    def __len__(self):
+        return len(self.moves)
+
+    def MovJ(self, apos: list[float]) -> "MotionQueue":
+        """追加关节运动，apos为关节角（度）"""
+        self.moves.append(QueuedMove(MoveType.MovJ, _finite_pose(apos, "apos")))
+        self.validated = False
+        return self
+
+    def MovL(self, cpos: list[float]) -> "MotionQueue":
+        """追加直线运动，cpos为末端位姿 [x, y, z, rx, ry, rz]（毫米/度）"""
+        self.moves.append(QueuedMove(MoveType.MovL, _finite_pose(cpos, "cpos")))
+        self.validated = False
+        return self
+
+    def Extend(self, targets: list) -> "MotionQueue":
+        """追加一组 (MoveType.MovJ | MoveType.MovL, 位置) """
+        for move_type, target in targets:
+            if move_type == MoveType.MovJ:
+                self.MovJ(target)
+            elif move_type == MoveType.MovL:
+                self.MovL(target)
+            else:
+                raise ValueError(f"不支持的运动类型: {move_type}")
+        return self
+
+    def Clear(self):
+        self.moves = []
+        self.validated = False
+
+    def Validate(self, coor: list[float] = None, tool: list[float] = None) -> bool:
+        """
+        校验全部目标：MovJ做正解，MovL以前一个已知关节角（队列中前一个MovJ目标或机器人当前关节角）为参考做逆解，
+        全部请求在一轮流水线中发出
+
+        参数:
+            coor (list[float]): 正解使用的用户坐标系
+            tool (list[float]): 正解使用的工具坐标系
+
+        返回值:
+            bool: 全部可达；不可达的点在其QueuedMove.error中说明
+        """
+        mirror = self.codroid.StateMirror()
+        reference = None
+        if mirror is not None and mirror.snapshot.joints is not None:
+            reference = list(mirror.snapshot.joints)
+        with self.codroid.Pipeline() as pipe:
+            futures = []
+            for move in self.moves:
+                move.error = None
+                if move.move_type == MoveType.MovJ:
+                    move.joints = move.target
+                    reference = move.target
+                    futures.append(pipe.Request(Message.apos_to_cpos(move.target, coor, tool)))
+                else:
+                    move.cartesian = move.target
+                    futures.append(pipe.Request(Message.cpos_to_apos(move.target, reference)))
+        ok = True
+        for index, (move, future) in enumerate(zip(self.moves, futures)):
+            try:
+                response = future.result()
+            except CodroidTimeoutError as e:
+                pose = str(e)
+            else:
+                pose = Message.reply_pose(response, "cp" if move.move_type == MoveType.MovJ else "jp")
+                if not isinstance(pose, str):
+                    if move.move_type == MoveType.MovJ:
+                        move.cartesian = pose
+                    else:
+                        move.joints = pose
+            if isinstance(pose, str):
+                move.error = pose
+                ok = False
+                print(f"第{index}个运动目标不可达({move.move_type.name} {move.target}): {pose}")
+        self.validated = ok
+        return ok
+
+    def Run(self, timeout: float = None, validate: bool = True) -> bool:
+        """
+        依次执行队列中的运动，阻塞直到全部完成
+
+        参数:
+            timeout (float): 单个运动的最长时间（秒），None表示不限；超时抛出CodroidTimeoutError
+            validate (bool): 尚未校验时先调用Validate()
+
+        返回值:
+            bool: 全部完成；校验失败、发送失败或被Cancel()时返回False
+        """
+        if validate and not self.validated and not self.Validate():
+            return False
+        self._cancel.clear()
+        for move in self.moves:
+            move.dispatched = move.acked = move.finished = None
+        for move in self.moves:
+            if self._cancel.is_set():
+                return False
+            move.dispatched = time.monotonic()
+            if move.move_type == MoveType.MovJ:
+                handle = self.codroid.MoveToAsync(MoveType.MovJ, apos=move.target, timeout=timeout)
+            else:
+                handle = self.codroid.MoveToAsync(MoveType.MovL, cpos=move.target, timeout=timeout)
+            move.acked = time.monotonic()
+            if handle is None:
+                move.error = "moveTo发送失败"
+                return False
+            self._handle = handle
+            try:
+                handle.wait()
+            except CodroidTimeoutError as e:
+                move.error = str(e)
+                raise
+            finally:
+                self._handle = None
+            if handle.future.cancelled():
+                move.error = "已取消"
+                return False
+            move.finished = handle.future.result().monotonic
+        return True
+
+    def Start(self, timeout: float = None) -> Future:
+        """在后台线程中执行Run()，返回的Future结果为Run()的返回值"""
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self.Run(timeout))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="CodroidMotionQueue", daemon=True).start()
+        return future
+
+    def Cancel(self):
+        """停止执行：不再发出后续运动，取消当前运动（停止心跳，机器人随之停止）"""
+        self._cancel.set()
+        handle = self._handle
+        if handle is not None:
+            handle.cancel()
+
+    def RunCRI(self, velocity: float = 30.0, blend: float = 0.2, period: int = 10, filter_type: int = 0,
+               start_buffer: int = 3, port: int = CriStream.CRI_CONTROL_PORT,
+               policy: LatePolicy = LatePolicy.CatchUp) -> bool:
+        """
+        经CRI实时控制执行整个队列：从当前关节角出发，依次经过各目标的关节角，途经点处抛物线过渡，不停顿
+
+        MovL目标按校验时的逆解结果在关节空间插补，中间路径不是直线。
+
+        参数:
+            velocity (float): 单关节最大速度（度/秒）
+            blend (float): 途经点处的过渡时间（秒）
+            period (int): 指令间隔（毫秒），即CRIStartControl的duration，范围1-16
+            filter_type (int): CRIStartControl的滤波类型
+            start_buffer (int): CRIStartControl的启动缓冲点数
+            port (int): 控制器的CRI实时控制端口
+            policy (LatePolicy): 发送错过截止时刻时的处理方式，节拍统计保存在self.clock
+
+        返回值:
+            bool: 发送到了最后一个点（Skip策略下中间可能跳过若干点）
+        """
+        if not self.validated and not self.Validate():
+            return False
+        mirror = self.codroid.StateMirror()
+        if mirror is None or mirror.snapshot.joints is None:
+            print("无法获取机器人当前关节角")
+            return False
+        waypoints = [list(mirror.snapshot.joints)] + [move.joints for move in self.moves]
+        dt = period / 1000.0
+        path = CriStream.blend_path(waypoints, velocity, blend, dt)
+        # 第i个目标在折线上的到达点序号；平滑后整体晚blend/2，离开上一目标的时刻记为dispatched
+        arrivals = list(itertools.accumulate(CriStream.segment_steps(waypoints, velocity, dt)))
+        delay = int(round(blend / dt)) // 2 if blend > 0 else 0
+        response = self.codroid.CRIStartControl(filter_type, period, start_buffer)
+        if response is None or "err" in response:
+            print(f"CRI控制启动失败: {response}")
+            return False
+        self._cancel.clear()
+        marks = {}  # 点序号 -> 发送时刻
+        wanted = {0} | {min(i + delay, len(path)) - 1 for i in arrivals}
+        try:
+            with CriStreamer(self.codroid.ip, port, dt, policy) as streamer:
+                # 终点重复start_buffer个周期，保证控制器缓冲中的点全部执行到终点
+                tail = [path[-1]] * start_buffer
+                points = [[math.radians(v) for v in p] for p in path + tail]
+
+                def mark(index, now):
+                    if index in wanted or index == len(points) - 1:
+                        marks[index] = now
+
+                streamer.Stream(points, stop=self._cancel, on_point=mark)
+                self.clock = streamer.clock
+        finally:
+            self.codroid.CRIStopControl()
+        previous = marks.get(0)
+        for move, arrival in zip(self.moves, arrivals):
+            move.dispatched = previous
+            move.acked = None
+            move.finished = previous = marks.get(min(arrival + delay, len(path)) - 1)
+        return len(points) - 1 in marks
+
+    def Summary(self) -> dict:
+        """
+        汇总最近一次执行的计时
+
+        返回值:
+            dict: moves（运动数）、total（第一次发出到最后一次完成）、motion（运动时间之和）、
+                  idle（上一运动完成到下一运动发出的时间之和）、max_idle、latency（moveTo平均往返时间）
+        """
+        done = [move for move in self.moves if move.duration is not None]
+        if not done:
+            return {"moves": 0, "total": 0.0, "motion": 0.0, "idle": 0.0, "max_idle": 0.0, "latency": None}
+        idle = [b.dispatched - a.finished for a, b in zip(done, done[1:])]
+        latencies = [move.latency for move in done if move.latency is not None]
+        return {
+            "moves": len(done),
+            "total": done[-1].finished - done[0].dispatched,
+            "motion": sum(move.duration for move in done),
+            "idle": sum(idle),
+            "max_idle": max(idle, default=0.0),
+            "latency": sum(latencies) / len(latencies) if latencies else None,
+        }
@@ -0,0 +1,197 @@
+# 正逆解结果缓存
+#
+# 取放等节拍反复使用同一批位姿，每次Apos2Cpos/Cpos2Apos都要一个往返。PoseCache按量化后的位姿记住应答：
+#   - 键：正解为 (关节角, coor, tool)，逆解为 (末端位姿, 参考关节角)，按tolerance取整；
+#     参考关节角只用于选择逆解分支，单独用较粗的reference_tolerance量化；
+#   - 容量有限，按最近使用淘汰（LRU），hits/misses/evictions计数；
+#   - 逆解使用控制器当前的工具/用户坐标系，坐标系变化时调用invalidate("ik")
+#     （Codroid.EnablePoseCache默认订阅publish/RobotCoordinate自动完成）；
+#   - 可选保存到JSON文件，下次启动时载入。
+#
+# 用法:
+#     cache = cod.EnablePoseCache(maxsize=4096, tolerance=1e-3, path="pose_cache.json")
+#     cod.Apos2Cpos(apos)          # 第一次访问控制器，之后同一位姿直接返回
+#     print(cache.hits, cache.misses)
+
+import copy
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import JsonCodec
+
+FK = "fk"
+IK = "ik"
+_VERSION = 1
+
+
+def _quantize(values, tolerance: float) -> tuple:
+    return tuple(int(math.floor(v / tolerance + 0.5)) for v in values)
+
+
+class PoseCache:
+    """
+    正逆解应答缓存（线程安全）
+
+    命中时返回缓存应答的副本。量化意味着相差不超过tolerance的两个位姿共用同一结果。
+    只缓存成功的应答（不含err字段）。
+    """
+
+    def __init__(self, maxsize: int = 4096, tolerance: float = 1e-3, reference_tolerance: float = 1.0,
+                 path: str = None):
+        """
+        参数:
+            maxsize (int): 最多缓存的条数
+            tolerance (float): 位姿量化步长（mm/度）
+            reference_tolerance (float): 逆解参考关节角的量化步长（度）
+            path (str): 持久化文件路径，存在时立即载入；None表示不持久化
+        """
+        if maxsize < 1 or tolerance <= 0 or reference_tolerance <= 0:
+            raise ValueError("maxsize、tolerance和reference_tolerance必须大于0")
+        self.maxsize = maxsize
+        self.tolerance = tolerance
+        self.reference_tolerance = reference_tolerance
+        self.path = path
+        self.frames = None  # 最近一次看到的控制器坐标系（publish/RobotCoordinate的db）
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def fk_key(self, apos, coor=None, tool=None) -> tuple:
+        """正解的键"""
+        zero = (0.0,) * 6
+        return (FK, _quantize(apos, self.tolerance), _quantize(coor or zero, self.tolerance),
+                _quantize(tool or zero, self.tolerance))
+
+    def ik_key(self, cpos, reference_joint=None) -> tuple:
+        """逆解的键，reference_joint单位为度"""
+        reference = () if reference_joint is None else _quantize(reference_joint, self.reference_tolerance)
+        return (IK, _quantize(cpos, self.tolerance), reference)
+
+    def get(self, key: tuple) -> Optional[dict]:
+        """
+        查找应答
+
+        返回值:
+            dict: 缓存应答的副本，未命中返回None
+        """
+        with self._lock:
+            response = self._entries.get(key)
+            if response is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(response)
+
+    def put(self, key: tuple, response: Optional[dict]):
+        """记录应答，错误应答和None不记录"""
+        if response is None or "err" in response:
+            return
+        response = {k: v for k, v in response.items() if k != "id"}
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, kind: str = None):
+        """
+        清除缓存
+
+        参数:
+            kind (str): "fk"或"ik"只清除该类条目，None清除全部
+        """
+        with self._lock:
+            if kind is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == kind]:
+                    del self._entries[key]
+
+    def update_frames(self, frames) -> bool:
+        """
+        记录控制器当前的工具/用户坐标系，与上次不同时清除逆解条目
+
+        返回值:
+            bool: 是否发生了清除
+        """
+        with self._lock:
+            changed = self.frames is not None and frames != self.frames
+            self.frames = frames
+        if changed:
+            self.invalidate(IK)
+        return changed
+
+    def stats(self) -> dict:
+        """命中统计"""
+        total = self.hits + self.misses
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def save(self, path: str = None) -> bool:
+        """
+        保存到JSON文件（先写临时文件再替换，中途失败不破坏原文件）
+
+        返回值:
+            bool: 是否保存成功
+        """
+        path = path or self.path
+        if path is None:
+            return False
+        with self._lock:
+            data = {
+                "version": _VERSION,
+                "tolerance": self.tolerance,
+                "reference_tolerance": self.reference_tolerance,
+                "frames": self.frames,
+                "entries": [[key[0], [list(part) for part in key[1:]], response]
+                            for key, response in self._entries.items()],
+            }
+        temp = path + ".tmp"
+        try:
+            with open(temp, "wb") as f:
+                f.write(JsonCodec.dumps(data))
+            os.replace(temp, path)
+        except OSError as e:
+            print(f"保存正逆解缓存失败: {e}")
+            return False
+        return True
+
+    def load(self, path: str = None) -> int:
+        """
+        从JSON文件载入；量化步长与当前设置不同的文件不载入
+
+        返回值:
+            int: 载入的条数
+        """
+        path = path or self.path
+        try:
+            with open(path, "rb") as f:
+                data = JsonCodec.loads(f.read())
+        except (OSError, ValueError) as e:
+            print(f"载入正逆解缓存失败: {e}")
+            return 0
+        if (data.get("version") != _VERSION or data.get("tolerance") != self.tolerance
+                or data.get("reference_tolerance") != self.reference_tolerance):
+            print("正逆解缓存文件的量化设置不一致，忽略")
+            return 0
+        with self._lock:
+            self.frames = data.get("frames")
+            for kind, parts, response in data.get("entries", []):
+                key = (kind,) + tuple(tuple(part) for part in parts)
+                self._entries[key] = response
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return len(data.get("entries", []))
@@ -0,0 +1,138 @@
+# 机器人状态镜像
+#
+# 由publish/RobotStatus、publish/RobotPosture、publish/ProjectState推送持续更新的本地副本。
+# 每次更新生成一个新的不可变快照并整体替换引用，任何线程读取mirror.snapshot都是一次属性访问，
+# 不加锁、不经过网络。
+#
+# 用法:
+#     mirror = cod.StateMirror(period=10)
+#     snap = mirror.snapshot
+#     if snap.state != 4 and snap.joints[0] > 10: ...
+#     mirror.wait_for(lambda s: s.state != 4, timeout=5.0)
+
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+from Subscriber import TopicSubscriber
+
+TOPICS = ("publish/RobotStatus", "publish/RobotPosture", "publish/ProjectState")
+
+
+class RobotSnapshot(NamedTuple):
+    """机器人状态快照，尚未收到对应推送的字段为None"""
+    state: Optional[int]          # 机器人状态，4表示运动中
+    joints: Optional[tuple]       # 关节角（度）
+    cartesian: Optional[tuple]    # 末端位姿 [x, y, z, rx, ry, rz]（毫米/度）
+    project_state: object         # 工程状态（ProjectState推送的state字段，没有该字段时为整个db）
+    timestamp: float              # 最近一次更新的time.time()
+    monotonic: float              # 最近一次更新的time.monotonic()
+    seq: int                      # 更新序号，每收到一帧加1
+    status: Optional[dict]        # 最近一帧RobotStatus的db原样保存，只读使用
+
+
+EMPTY_SNAPSHOT = RobotSnapshot(None, None, None, None, 0.0, 0.0, 0, None)
+
+
+class RobotStateMirror:
+    """
+    机器人状态镜像
+
+    推送在TopicSubscriber的读线程中合并进新快照；snapshot的读取不加锁。
+    wait_for/wait_update供需要等待状态变化的调用方使用，add_listener的回调在读线程中执行。
+    """
+
+    def __init__(self, subscriber: TopicSubscriber, period: int = 10):
+        """
+        参数:
+            subscriber (TopicSubscriber): 已连接的订阅引擎
+            period (int): 推送周期（毫秒）
+        """
+        self.subscriber = subscriber
+        self.period = period
+        self.snapshot = EMPTY_SNAPSHOT
+        self._cond = threading.Condition()
+        self._listeners: list = []
+        for ty in TOPICS:
+            subscriber.Subscribe(ty, period, callback=self._on_frame, owner=self)
+
+    def close(self):
+        """停止更新，只取消镜像自己的订阅（订阅连接由subscriber的所有者关闭）"""
+        for ty in TOPICS:
+            self.subscriber.Unsubscribe(ty, owner=self)
+        with self._cond:
+            self._cond.notify_all()
+
+    def add_listener(self, callback: Callable[[RobotSnapshot], None]):
+        """每次更新后在读线程中调用callback(snapshot)，应尽快返回"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        try:
+            self._listeners.remove(callback)
+        except ValueError:
+            pass
+
+    def age(self) -> float:
+        """距最近一次更新的秒数，尚未更新时为inf"""
+        snap = self.snapshot
+        return time.monotonic() - snap.monotonic if snap.seq else float("inf")
+
+    def _on_frame(self, frame: dict):
+        db = frame.get("db")
+        ty = frame.get("ty")
+        old = self.snapshot
+        changes = {}
+        if ty == "publish/ProjectState":
+            changes["project_state"] = db.get("state", db) if isinstance(db, dict) else db
+        elif isinstance(db, dict):
+            if ty == "publish/RobotStatus":
+                changes["status"] = db
+                if "state" in db:
+                    changes["state"] = db["state"]
+            if "joint" in db:
+                changes["joints"] = tuple(db["joint"])
+            if "cartesian" in db:
+                changes["cartesian"] = tuple(db["cartesian"])
+        snap = old._replace(timestamp=time.time(), monotonic=time.monotonic(), seq=old.seq + 1, **changes)
+        with self._cond:
+            self.snapshot = snap
+            self._cond.notify_all()
+        for listener in tuple(self._listeners):
+            try:
+                listener(snap)
+            except Exception as e:
+                print(f"状态镜像回调出错: {e}")
+
+    def wait_update(self, after_seq: int = None, timeout: float = None) -> Optional[RobotSnapshot]:
+        """
+        等待序号大于after_seq的快照
+
+        参数:
+            after_seq (int): 默认为当前快照的序号，即等待下一次更新
+            timeout (float): 最长等待时间（秒），None表示一直等待
+
+        返回值:
+            RobotSnapshot: 新快照，超时返回None
+        """
+        if after_seq is None:
+            after_seq = self.snapshot.seq
+        return self.wait_for(lambda snap: snap.seq > after_seq, timeout)
+
+    def wait_for(self, predicate: Callable[[RobotSnapshot], bool], timeout: float = None) -> Optional[RobotSnapshot]:
+        """
+        等待predicate(snapshot)为True
+
+        返回值:
+            RobotSnapshot: 满足条件的快照（当前快照已满足时立即返回），超时返回None
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                snap = self.snapshot
+                if predicate(snap):
+                    return snap
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
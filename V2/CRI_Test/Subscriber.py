@@ -0,0 +1,275 @@
+# publish/*长期订阅
+#
+# GetRobotStates等接口每次调用都重新发一次订阅并读一帧应答。TopicSubscriber在独立连接上对每个ty只订阅一次，
+# 后台读线程按ty分发推送帧，交给回调或有界队列，每个样本省去一次请求。
+#
+# 用法:
+#     with TopicSubscriber("192.168.1.136", 9001) as sub:
+#         status = sub.Subscribe("RobotStatus", 10)                        # 每10ms一帧，只保留最新
+#         logs = sub.Subscribe("Log", 200, policy=DropPolicy.Lossless)     # 不丢帧
+#         sub.Subscribe("RobotPosture", 10, callback=lambda frame: ...)    # 在读线程中回调
+#         frame = status.get(timeout=1.0)
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import Message
+from Define import DropPolicy
+from TcpClient import CodroidTimeoutError, TCPClient
+
+
+class Subscription:
+    """
+    一个ty的订阅
+
+    有回调时每帧在读线程中调用回调，不进入队列；否则按policy进入队列：
+    LatestOnly只保留最新一帧，Lossless按顺序保留。投递从不阻塞读线程（同一连接上的其他ty不受影响）：
+    Lossless队列满（maxlen）时新帧被丢弃并计入overflows，调用方应及时取走或加大maxlen。
+    latest始终为最近收到的一帧。
+    """
+
+    def __init__(self, ty: str, period: int, policy: DropPolicy = DropPolicy.LatestOnly,
+                 callback: Callable[[dict], None] = None, maxlen: int = 256, owner=None):
+        self.ty = ty
+        self.period = period
+        self.owner = owner  # 创建者标记，Unsubscribe(topic, owner)只取消同一owner的订阅
+        self.policy = policy
+        self.callback = callback
+        self.maxlen = 1 if policy == DropPolicy.LatestOnly else maxlen
+        self.latest: Optional[dict] = None
+        self.latest_time = 0.0  # 收到latest时的time.monotonic()
+        self.received = 0  # 收到的帧数
+        self.dropped = 0   # LatestOnly下未被取走就被覆盖的帧数
+        self.overflows = 0  # Lossless队列满时丢弃的帧数
+        self.active = True
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def _deliver(self, frame: dict):
+        """读线程调用：投递一帧，不等待"""
+        overflow = False
+        with self._cond:
+            self.latest = frame
+            self.latest_time = time.monotonic()
+            self.received += 1
+            if self.callback is None:
+                if self.policy == DropPolicy.LatestOnly:
+                    if self._queue:
+                        self._queue.clear()
+                        self.dropped += 1
+                elif len(self._queue) >= self.maxlen:
+                    overflow = self.overflows == 0
+                    self.overflows += 1
+                    frame = None
+                if frame is not None:
+                    self._queue.append(frame)
+                    self._cond.notify_all()
+        if overflow:
+            print(f"订阅队列已满({self.ty}, maxlen={self.maxlen})，新帧被丢弃，见overflows")
+        if self.callback is not None:
+            try:
+                self.callback(frame)
+            except Exception as e:
+                print(f"订阅回调出错({self.ty}): {e}")
+
+    def get(self, timeout: float = None) -> Optional[dict]:
+        """
+        取下一帧
+
+        参数:
+            timeout (float): 最长等待时间（秒），None表示一直等待
+
+        返回值:
+            dict: 推送帧，超时或订阅已取消时返回None
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._queue:
+                if not self.active:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            frame = self._queue.popleft()
+            self._cond.notify_all()
+            return frame
+
+    def get_all(self) -> list:
+        """取出队列中的全部帧，不等待"""
+        with self._cond:
+            frames = list(self._queue)
+            self._queue.clear()
+            self._cond.notify_all()
+            return frames
+
+    def _close(self):
+        with self._cond:
+            self.active = False
+            self._cond.notify_all()
+
+
+class TopicSubscriber:
+    """
+    publish/*订阅引擎
+
+    使用独立的TCP连接，不影响Codroid请求连接上的应答时延。同一ty可以有多个订阅（状态镜像、
+    正逆解缓存、用户代码各自订阅），每帧分发给全部订阅；控制器按连接维护每个ty的周期tc，
+    取各订阅中最短的周期。断线后按退避策略重连并重新订阅全部ty。未订阅的ty（日志等）放入inbox。
+    控制器没有取消订阅的接口，Unsubscribe只在本地停止投递，某ty的最后一个订阅取消后重连时不再订阅。
+    """
+
+    def __init__(self, ip: str, port: int, auto_reconnect: bool = True):
+        """
+        参数:
+            ip (str): 机器人控制器的IP地址，"unix:路径"表示Unix域套接字
+            port (int): 机器人控制器的端口号
+            auto_reconnect (bool): 断线后自动重连并重新订阅
+        """
+        self.client = TCPClient(ip, port)
+        self.auto_reconnect = auto_reconnect
+        self.inbox = self.client.inbox
+        self.isConnected = False
+        self._subscriptions: dict[str, tuple] = {}  # ty -> (Subscription, ...)，整体替换，读线程不加锁
+        self._lock = threading.Lock()  # 保护_subscriptions的修改和socket写入
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.Connect()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.Disconnect()
+        return False
+
+    def Connect(self) -> bool:
+        """建立连接并启动读线程"""
+        if not self.client.connect():
+            return False
+        self._stop.clear()
+        self.isConnected = True
+        self._thread = threading.Thread(target=self._read_loop, name=f"CodroidSubscriber-{self.client.host}",
+                                        daemon=True)
+        self._thread.start()
+        return True
+
+    def Disconnect(self):
+        """停止读线程并断开连接，所有订阅取完已收到的帧后get()返回None，不再等待"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        self.client.disconnect()
+        self.isConnected = False
+        with self._lock:
+            for subscriptions in self._subscriptions.values():
+                for subscription in subscriptions:
+                    subscription._close()
+            self._subscriptions.clear()
+            self.client.session.clear()
+
+    def Subscribe(self, topic: str, period: int = 200, callback: Callable[[dict], None] = None,
+                  policy: DropPolicy = DropPolicy.LatestOnly, maxlen: int = 256, owner=None) -> Subscription:
+        """
+        订阅一个ty；同一ty的已有订阅不受影响，每帧分发给全部订阅
+
+        参数:
+            topic (str): 如"RobotStatus"或"publish/RobotStatus"
+            period (int): 推送周期tc（毫秒），比该ty当前的周期短时重新向控制器订阅
+            callback: 每帧在读线程中调用callback(frame)，应尽快返回
+            policy (DropPolicy): 无回调时的队列策略
+            maxlen (int): Lossless队列长度上限
+            owner: 创建者标记，供Unsubscribe(topic, owner)只取消自己的订阅
+
+        返回值:
+            Subscription: 订阅对象
+        """
+        ty = Message.subscribe(topic, period)["ty"]
+        subscription = Subscription(ty, period, policy, callback, maxlen, owner)
+        with self._lock:
+            subscriptions = self._subscriptions.get(ty, ())
+            self._subscriptions[ty] = subscriptions + (subscription,)
+            if not subscriptions or period < min(s.period for s in subscriptions):
+                self._send_subscribe(ty, period)
+        return subscription
+
+    def Unsubscribe(self, target, owner=None):
+        """
+        取消订阅
+
+        参数:
+            target: Subscription对象（只取消这一个），或ty名称（取消该ty下owner相同的全部订阅）
+            owner: target为ty名称时使用，None表示不带owner创建的订阅（用户代码）
+        """
+        single = isinstance(target, Subscription)
+        if single:
+            ty = target.ty
+        else:
+            ty = target if Message.is_publish(target) else "publish/" + target
+        with self._lock:
+            subscriptions = self._subscriptions.get(ty, ())
+            closed = tuple(s for s in subscriptions if (s is target if single else s.owner is owner))
+            kept = tuple(s for s in subscriptions if s not in closed)
+            if not closed:
+                return
+            if kept:
+                self._subscriptions[ty] = kept
+                period = min(s.period for s in kept)
+                if period > min(s.period for s in subscriptions):
+                    self._send_subscribe(ty, period)  # 剩余订阅不需要那么快的推送
+            else:
+                del self._subscriptions[ty]
+                self.client.session.discard(ty)
+        for subscription in closed:
+            subscription._close()
+
+    def subscriptions(self, topic: str) -> tuple:
+        """一个ty当前的全部订阅"""
+        ty = topic if Message.is_publish(topic) else "publish/" + topic
+        return self._subscriptions.get(ty, ())
+
+    def _send_subscribe(self, ty: str, period: int):
+        """持锁调用：向控制器订阅（或修改周期）并记录以便重连后重放"""
+        message = Message.subscribe(ty, period)
+        self.client.session.record(message)
+        self.client.write(Message.encode(message)[1])
+
+    def _read_loop(self):
+        client = self.client
+        while not self._stop.is_set():
+            try:
+                if client.socket is None:
+                    raise ConnectionError("连接已关闭")
+                frame = client.recv_message(deadline=time.monotonic() + 0.2)
+            except CodroidTimeoutError:
+                continue
+            except (OSError, ValueError) as e:
+                if self._stop.is_set():
+                    break
+                print(f"订阅连接断开: {e}")
+                if not self.auto_reconnect or not self._resubscribe():
+                    break
+                continue
+            if not isinstance(frame, dict):
+                continue
+            subscriptions = self._subscriptions.get(frame.get("ty"))
+            if subscriptions:
+                for subscription in subscriptions:
+                    subscription._deliver(frame)
+            else:
+                client.inbox.put(frame)
+
+    def _resubscribe(self) -> bool:
+        """重连并重新发送全部订阅"""
+        client = self.client
+        client.disconnect()
+        if not client._reopen(self._stop):
+            return False
+        with self._lock:
+            for message in client.session.messages():
+                if not client.write(Message.encode(message)[1]):
+                    return False
+        return True
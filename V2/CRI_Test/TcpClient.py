@@ -1,21 +1,257 @@
+import re
+import select
 import socket
 import json
-from typing import Optional
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import NamedTuple, Optional
+
+import JsonCodec
+import Message
+
+# 帧外只关心 { } " 三种字符，字符串内只关心 " 和转义符 \
+_STRUCT_CHARS = re.compile(rb'[{}"]')
+_STRING_CHARS = re.compile(rb'["\\]')
+
+# 以该前缀开头的地址表示Unix域套接字路径，如"unix:/tmp/codroid.sock"（端口号忽略），用于连接本机的CodroidProxy
+UNIX_PREFIX = "unix:"
+
+
+class FrameStats(NamedTuple):
+    """单帧解析统计"""
+    nbytes: int        # 帧字节数
+    parse_time: float  # 帧切分耗时（秒），跨多次recv累计
+
+
+class JsonFrameDecoder:
+    """
+    增量式JSON帧解码器
+
+    控制器的回复没有长度前缀，一个回复可能被拆成多次recv（分包），
+    多个回复也可能在一次recv中到达（粘包）。
+    解码器持有一块可复用的接收缓冲区，按花括号深度切分完整的JSON对象，
+    字符串内的花括号和转义引号不参与计数；扫描位置在多次feed之间保留，已扫描的字节不会被重复扫描。
+
+    缓冲区用读写两个下标管理：socket通过writable()/commit()直接recv_into到缓冲区尾部，
+    已取走的帧只移动读下标，空间不足时才把未取走的字节搬到开头，仍不足时扩容一倍。
+    稳定运行时每次接收不再分配新的bytes对象。
+    """
+
+    def __init__(self, capacity: int = 65536):
+        """
+        参数:
+            capacity (int): 接收缓冲区初始大小（字节）
+        """
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._rpos = 0          # 尚未取走的数据起点
+        self._wpos = 0          # 已写入数据的终点
+        self._scan = 0          # 下一次扫描的起始位置
+        self._start = -1        # 当前帧在缓冲区中的起始位置，-1表示尚未找到帧头
+        self._depth = 0
+        self._in_string = False
+        self._elapsed = 0.0
+        self.last_stats: Optional[FrameStats] = None
+
+    def __len__(self):
+        """缓冲区中尚未取走的字节数"""
+        return self._wpos - self._rpos
+
+    @property
+    def capacity(self) -> int:
+        """当前缓冲区大小"""
+        return len(self._buf)
+
+    def reset(self):
+        """清空缓冲区和扫描状态（断线重连时调用），缓冲区本身保留复用"""
+        self._rpos = 0
+        self._wpos = 0
+        self._scan = 0
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._elapsed = 0.0
+
+    def writable(self, min_free: int = 4096) -> memoryview:
+        """
+        返回缓冲区尾部可写入的区域，至少min_free字节，写入后调用commit()
+
+        之前由next_frame_view()返回的视图在此之后失效。
+        """
+        if len(self._buf) - self._wpos < min_free:
+            rpos = self._rpos
+            n = self._wpos - rpos
+            if n + min_free > len(self._buf):
+                # 扩容：新缓冲区，旧视图仍指向旧缓冲区
+                buf = bytearray(max(len(self._buf) * 2, n + min_free))
+                buf[:n] = self._view[rpos:self._wpos]
+                self._buf = buf
+                self._view = memoryview(buf)
+            elif n:
+                self._view[:n] = self._view[rpos:self._wpos]
+            self._rpos = 0
+            self._wpos = n
+            self._scan -= rpos
+            if self._start >= 0:
+                self._start -= rpos
+        return self._view[self._wpos:]
+
+    def commit(self, n: int):
+        """确认writable()返回的区域中写入了n字节"""
+        self._wpos += n
+
+    def feed(self, data: bytes):
+        """追加接收到的字节（数据来源不支持recv_into时使用）"""
+        n = len(data)
+        self.writable(n)[:n] = data
+        self._wpos += n
+
+    def next_frame(self) -> Optional[bytes]:
+        """
+        取出一个完整的JSON对象
+
+        返回值:
+            bytes: 完整帧的字节；数据不足时返回None，已扫描的状态保留到下次调用
+        """
+        view = self.next_frame_view()
+        return None if view is None else bytes(view)
+
+    def next_frame_view(self) -> Optional[memoryview]:
+        """
+        取出一个完整的JSON对象，返回指向接收缓冲区的视图，不复制
+
+        视图在下一次writable()/feed()/reset()之前有效，调用方应立即解析。
+
+        返回值:
+            memoryview: 完整帧；数据不足时返回None
+        """
+        t0 = time.perf_counter()
+        buf = self._buf
+        n = self._wpos
+        i = self._scan
+
+        if self._start < 0:
+            # 帧与帧之间的换行、空白等直接丢弃
+            j = buf.find(b'{', i, n)
+            if j < 0:
+                self._rpos = self._wpos = self._scan = 0
+                return None
+            self._start = self._rpos = j
+            self._depth = 1
+            i = j + 1
+
+        depth = self._depth
+        in_string = self._in_string
+        while i < n:
+            if in_string:
+                m = _STRING_CHARS.search(buf, i, n)
+                if m is None:
+                    i = n
+                    break
+                i = m.start()
+                if buf[i] == 0x5C:  # '\\' 跳过被转义的字符，可能越过当前数据末尾
+                    i += 2
+                    continue
+                in_string = False
+                i += 1
+                continue
+
+            m = _STRUCT_CHARS.search(buf, i, n)
+            if m is None:
+                i = n
+                break
+            i = m.start()
+            c = buf[i]
+            i += 1
+            if c == 0x22:  # '"'
+                in_string = True
+            elif c == 0x7B:  # '{'
+                depth += 1
+            else:  # '}'
+                depth -= 1
+                if depth == 0:
+                    frame = self._view[self._start:i]
+                    if i == n:
+                        # 数据全部取走，下次从缓冲区开头写入
+                        self._rpos = self._wpos = self._scan = 0
+                    else:
+                        self._rpos = self._scan = i
+                    self._start = -1
+                    self._depth = 0
+                    self._in_string = False
+                    self.last_stats = FrameStats(len(frame), self._elapsed + time.perf_counter() - t0)
+                    self._elapsed = 0.0
+                    return frame
+
+        self._scan = i
+        self._depth = depth
+        self._in_string = in_string
+        self._elapsed += time.perf_counter() - t0
+        return None
+
+
+class CodroidTimeoutError(TimeoutError):
+    """请求在截止时间内没有收到应答；连接仍然可用，迟到的应答会被丢弃"""
+
+
+class Backoff:
+    """带随机抖动的指数退避：第n次等待 initial * multiplier^n（不超过maximum），再随机缩短最多jitter比例"""
+
+    def __init__(self, initial: float = 0.05, maximum: float = 5.0, multiplier: float = 2.0, jitter: float = 0.5):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self._delay = initial
+
+    def reset(self):
+        self._delay = self.initial
+
+    def next(self) -> float:
+        """下一次重试前的等待时间（秒）"""
+        delay = self._delay
+        self._delay = min(delay * self.multiplier, self.maximum)
+        return delay * (1.0 - self.jitter * random.random())
+
 
 class TCPClient:
-    def __init__(self,ip: str, port: int, timeout: float = 1.0):
-        """初始化TCP客户端"""
+    def __init__(self,ip: str, port: int, timeout: float = 1.0, recv_size: int = 4096):
+        """初始化TCP客户端，recv_size为每次接收时缓冲区至少预留的空间"""
         self.host = ip
         self.port = port
         self.socket: Optional[socket.socket] = None
         self.connected = False
         self.timeout = timeout
+        self.recv_size = recv_size
+        self.decoder = JsonFrameDecoder()
+        self.inbox = Message.Inbox()  # 接收应答时读到的、不属于该请求的帧
+        self.session = Message.Session()  # 重连后需要重放的会话状态
+        self.auto_reconnect = False
+        self.backoff = Backoff()
+        self.reconnect_attempts: Optional[int] = None  # 单次重连的最大尝试次数，None表示不限
+        self.reconnect_count = 0  # 成功重连的次数
+        self._abandoned = OrderedDict()  # 已超时放弃的请求id，迟到的应答直接丢弃
+        self._posted = OrderedDict()  # post()发出的请求id（心跳等），其应答直接丢弃
+        self._stash = deque()  # drain()读到、留给下一次接收的帧
+        self._read_lock = threading.Lock()  # 调用方线程接收与心跳线程drain()互斥
+        self.metrics = None  # Metrics.Metrics，为None时不做任何计时
+        self.last_decode_ns = 0  # 启用统计时，最近一帧JSON解析耗时（纳秒）
+        self.recorder = None  # WireLog.WireRecorder，不为None时录制收发的报文
+        self._write_lock = threading.Lock()  # 心跳定时线程与调用方线程可能同时写入
+
+    @property
+    def last_frame_stats(self) -> Optional[FrameStats]:
+        """最近一帧的字节数和解析耗时"""
+        return self.decoder.last_stats
 
     def connect(self):
         """连接到服务器"""
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.host, self.port))
+            self.socket = self._open()
+            self.decoder.reset()
             self.connected = True
             print(f"已连接到服务器 {self.host}:{self.port}")
             return True
@@ -24,34 +260,507 @@ class TCPClient:
             self.connected = False
             return False
 
+    def _open(self) -> socket.socket:
+        """建立新连接，连接超时为self.timeout；host以"unix:"开头时连接Unix域套接字"""
+        if self.host.startswith(UNIX_PREFIX):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.host[len(UNIX_PREFIX):])
+            except OSError:
+                sock.close()
+                raise
+        else:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.settimeout(None)
+        return sock
+
+    def _reopen(self, stop: threading.Event = None) -> bool:
+        """
+        按退避策略重新建立连接，第一次尝试不等待
+
+        参数:
+            stop (threading.Event): 被置位时放弃重连
+
+        返回值:
+            bool: 是否连接成功
+        """
+        self.backoff.reset()
+        attempt = 0
+        while stop is None or not stop.is_set():
+            try:
+                self.socket = self._open()
+            except OSError as e:
+                attempt += 1
+                if self.reconnect_attempts is not None and attempt >= self.reconnect_attempts:
+                    print(f"重连失败: {e}")
+                    return False
+                delay = self.backoff.next()
+                if stop is None:
+                    time.sleep(delay)
+                else:
+                    stop.wait(delay)
+                continue
+            self.decoder.reset()
+            self.connected = True
+            self.reconnect_count += 1
+            print(f"已重新连接到服务器 {self.host}:{self.port}")
+            return True
+        return False
+
+    def reconnect(self) -> bool:
+        """
+        断开后按退避策略重连（在调用线程中阻塞），成功后按顺序重放会话状态：
+        远程脚本模式、CRI数据推送、publish/*订阅
+
+        返回值:
+            bool: 重连并重放成功
+        """
+        self.disconnect()
+        if not self._reopen():
+            return False
+        for message in self.session.messages():
+            message_dict, data = Message.encode(message, force_id=True)
+            if not self.write(data):
+                return False
+            while (response := self.receive_message()) is not None:
+                if Message.is_reply(message_dict, response):
+                    break
+                self.inbox.put(response)
+            else:
+                return False
+        return True
+
     def disconnect(self):
         """断开与服务器的连接"""
         if self.socket:
             self.socket.close()
             self.socket = None
             self.connected = False
+            self.decoder.reset()
+            self._stash.clear()
             print("连接已关闭")
 
-    def send(self, message,debug:bool=False):
-        """发送消息到服务器并返回响应"""
+    def _recv_into_decoder(self, deadline: float = None):
+        """
+        从socket直接接收到解码器的缓冲区
+
+        参数:
+            deadline (float): time.monotonic()截止时间，到期仍无数据时抛出CodroidTimeoutError；None表示一直等待
+        """
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self.socket], [], [], remaining)[0]:
+                raise CodroidTimeoutError("等待应答超时")
+        n = self.socket.recv_into(self.decoder.writable(self.recv_size))
+        if not n:
+            raise ConnectionError("服务器已关闭连接")
+        self.decoder.commit(n)
+
+    def recv_frame(self) -> str:
+        """
+        读取一个完整的JSON帧并解码为字符串
+
+        缓冲区中已有完整帧时直接返回，不足时继续接收；多出的字节留给下一次调用。
+        """
+        while True:
+            frame = self.decoder.next_frame_view()
+            if frame is not None:
+                if self.recorder is not None:
+                    self.recorder.record_in(frame)
+                return str(frame, 'utf-8')
+            self._recv_into_decoder()
+
+    def recv_message(self, debug: bool = False, deadline: float = None):
+        """
+        读取并解析一个完整的JSON帧
+
+        帧在接收缓冲区中原地交给JsonCodec解析，每帧只解析一次，不产生中间的bytes/str；
+        无法解析的帧打印后跳过，不影响后续帧。
+        deadline对整帧有效：分多次到达的帧每次等待都只用剩余时间，超时后已收到的部分保留在缓冲区。
+        """
+        with self._read_lock:
+            if self._stash:
+                return self._stash.popleft()
+            while True:
+                frame = self.decoder.next_frame_view()
+                if frame is None:
+                    self._recv_into_decoder(deadline)
+                    continue
+                response = self._decode(frame, debug)
+                if response is not None:
+                    return response
+
+    def _decode(self, frame: memoryview, debug: bool = False):
+        """解析一帧，无法解析时打印并返回None"""
+        if self.recorder is not None:
+            self.recorder.record_in(frame)
+        t0 = time.perf_counter_ns() if self.metrics is not None else 0
+        try:
+            response = JsonCodec.loads(frame)
+        except ValueError as e:
+            print(f"解析应答失败: {e}")
+            return None
+        if t0:
+            self.last_decode_ns = time.perf_counter_ns() - t0
+        if debug:
+            stats = self.last_frame_stats
+            print(f"接收到响应({stats.nbytes}字节, 解析{stats.parse_time * 1e6:.1f}us)：{response}")
+        return response
+
+    def drain(self):
+        """
+        不等待地读取已到达的帧：post()发出的请求的应答直接丢弃，其余按顺序留给下一次接收
+
+        调用方长时间不接收时（等待运动完成），心跳应答不会堆积在socket中；
+        其他线程正在接收时直接返回，连接错误留给下一次接收处理。
+        """
+        if self.socket is None or not self._read_lock.acquire(blocking=False):
+            return
+        try:
+            while True:
+                frame = self.decoder.next_frame_view()
+                if frame is None:
+                    if not select.select([self.socket], [], [], 0)[0]:
+                        break
+                    self._recv_into_decoder()
+                    continue
+                response = self._decode(frame)
+                if response is None or self._is_posted_reply(response):
+                    continue
+                self._stash.append(response)
+                if len(self._stash) > 1024:
+                    # 长时间没有接收时，最早的帧按未认领处理
+                    self.route_unmatched(self._stash.popleft())
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._read_lock.release()
+
+    def write(self, message, debug: bool = False) -> bool:
+        """只发送消息（str或已编码的bytes），不等待响应（流水线模式下连续写入多条请求）"""
         if not self.connected:
             print("未连接到服务器")
-            return None
+            return False
         try:
-            # 发送消息
-            if debug:
-                print(f"发送消息：{message}")
-            self.socket.send(message.encode('utf-8'))
-            # 接收响应
-            response = self.socket.recv(1024)
+            if isinstance(message, str):
+                message = message.encode('utf-8')
             if debug:
-                print(f"接收到响应：{response.decode('utf-8')}")
-            return response.decode('utf-8')
+                print(f"发送消息：{message.decode('utf-8')}")
+            with self._write_lock:
+                self.socket.sendall(message)
+                if self.recorder is not None:
+                    self.recorder.record_out(message)
+            return True
         except Exception as e:
             print(f"发送消息时出错: {e}")
             self.disconnect()
+            return False
+
+    def receive(self, debug: bool = False):
+        """接收一个完整的响应帧，出错时断开连接并返回None"""
+        if not self.connected:
+            print("未连接到服务器")
+            return None
+        try:
+            response = self.recv_frame()
+            if debug:
+                stats = self.last_frame_stats
+                print(f"接收到响应({stats.nbytes}字节, 解析{stats.parse_time * 1e6:.1f}us)：{response}")
+            return response
+        except Exception as e:
+            print(f"接收消息时出错: {e}")
+            self.disconnect()
+            return None
+
+    def receive_message(self, debug: bool = False, deadline: float = None):
+        """接收并解析一个完整的响应帧，出错时断开连接并返回None；超时抛出CodroidTimeoutError，连接保持"""
+        if not self.connected:
+            print("未连接到服务器")
+            return None
+        try:
+            return self.recv_message(debug, deadline)
+        except CodroidTimeoutError:
+            raise
+        except Exception as e:
+            print(f"接收消息时出错: {e}")
+            self.disconnect()
             return None
 
+    def post(self, message) -> bool:
+        """
+        只发送、不等待应答（心跳等），可在任意线程调用
+
+        记录请求id，其应答到达后直接丢弃；发送前先drain()已到达的帧。
+
+        返回值:
+            bool: 是否已写出
+        """
+        message_dict, data = Message.encode(message, force_id=True)
+        self._posted[str(message_dict["id"])] = None
+        if len(self._posted) > 1024:
+            self._posted.popitem(last=False)
+        self.drain()
+        return self.write(data)
+
+    def _is_posted_reply(self, response) -> bool:
+        """判断是否为post()发出的请求的应答，是则同时移除其id"""
+        if not isinstance(response, dict) or "id" not in response or not self._posted:
+            return False
+        return self._posted.pop(str(response["id"]), False) is None
+
+    def abandon(self, message_dict: dict):
+        """放弃等待一个请求的应答（超时），之后迟到的应答不再进入收件箱"""
+        kind, key = Message.reply_key(message_dict)
+        if kind == "id":
+            self._abandoned[key] = None
+            if len(self._abandoned) > 1024:
+                self._abandoned.popitem(last=False)
+
+    def route_unmatched(self, response, debug: bool = False):
+        """处理不属于当前请求的帧：已超时请求的迟到应答和post()发出的请求的应答丢弃，其余放入收件箱"""
+        if self._is_posted_reply(response):
+            if debug:
+                print(f"丢弃应答: {response}")
+            return
+        if isinstance(response, dict) and "id" in response and self._abandoned:
+            if self._abandoned.pop(str(response["id"]), False) is None:
+                if debug:
+                    print(f"丢弃迟到的应答: {response}")
+                return
+        self.inbox.put(response)
+
+    def send(self, message,debug:bool=False):
+        """发送消息到服务器并返回响应"""
+        if not self.write(message, debug):
+            return None
+        return self.receive(debug)
+
+
+def _resolve(future: Future, value):
+    """设置Future结果，调用方已取消的Future直接跳过"""
+    if not future.done():
+        try:
+            future.set_result(value)
+        except Exception:
+            pass
+
+
+class ThreadedTCPClient(TCPClient):
+    """
+    由独立I/O线程持有socket的TCP客户端
+
+    任意线程通过submit()提交请求并得到concurrent.futures.Future，
+    请求先放入发件箱，I/O线程被唤醒后把发件箱中的请求合并成一次sendall写出，
+    再按id（publish/*按ty）把应答分发给对应的Future。
+    socket只被I/O线程读写，多个线程之间不会交错读写造成帧错乱；
+    调用方越多，每次写出合并的请求越多，同一连接上同时在途的请求也越多。
+
+    auto_reconnect为True时，连接断开后I/O线程按退避策略重连并先重放会话状态；
+    断线期间提交的请求留在发件箱（最多max_outbox条），重连后发出。
+    断开时已发出、尚未收到应答的请求执行结果未知，不会重发，结果为None。
+    """
+
+    def __init__(self, ip: str, port: int, timeout: float = 1.0, recv_size: int = 4096):
+        super().__init__(ip, port, timeout, recv_size)
+        self.debug = False
+        self._lock = threading.Lock()
+        self._outbox = deque()           # (message_dict, bytes, Future, 编码耗时ns)
+        self._timing = {}                # 启用统计时 Future -> (ty, 编码耗时ns, 发送时刻ns, 发送字节数)，只在I/O线程中访问
+        self._pending = Message.PendingReplies()  # 只在I/O线程中访问
+        self._thread: Optional[threading.Thread] = None
+        self._wake_r: Optional[socket.socket] = None
+        self._wake_w: Optional[socket.socket] = None
+        self._stopping = False
+        self._stop_event = threading.Event()
+        self._closed = True
+        self.max_outbox = 1024
+
+    def connect(self):
+        """连接到服务器并启动I/O线程"""
+        if not super().connect():
+            return False
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._stopping = False
+        self._stop_event.clear()
+        self._closed = False
+        self._thread = threading.Thread(target=self._io_loop, name=f"CodroidIO-{self.host}:{self.port}", daemon=True)
+        self._thread.start()
+        return True
+
+    def disconnect(self):
+        """停止I/O线程并断开连接，未完成的请求结果为None"""
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            self._stopping = True
+            self._stop_event.set()
+            self._wakeup()
+            thread.join()
+            self._thread = None
+            for sock in (self._wake_r, self._wake_w):
+                if sock is not None:
+                    sock.close()
+            self._wake_r = self._wake_w = None
+        else:
+            super().disconnect()
+
+    def submit(self, message, ensure_ascii: bool = True) -> Future:
+        """
+        提交一条请求，可在任意线程调用
+
+        参数:
+            message: 请求报文dict或Message.MessageTemplate，id由客户端重新分配
+            ensure_ascii (bool): 是否将非ASCII字符转义
+
+        返回值:
+            Future: 结果为应答json，连接断开或发件箱已满时为None
+        """
+        future = Future()
+        t0 = time.perf_counter_ns() if self.metrics is not None else 0
+        message_dict, data = Message.encode(message, ensure_ascii, force_id=True)
+        encode_ns = time.perf_counter_ns() - t0 if t0 else 0
+        with self._lock:
+            if self._closed:
+                print("未连接到服务器")
+                future.set_result(None)
+                return future
+            if len(self._outbox) >= self.max_outbox:
+                print("发件箱已满，请求被丢弃")
+                future.set_result(None)
+                return future
+            self.session.record(message)
+            wake = not self._outbox
+            self._outbox.append((message_dict, data, future, encode_ns))
+        if wake:
+            self._wakeup()
+        return future
+
+    def post(self, message) -> bool:
+        """只提交、不等待应答"""
+        future = self.submit(message)
+        return not future.done() or future.result() is not None
+
+    def send(self, message, debug: bool = False):
+        """兼容TCPClient.send：经由I/O线程发送并等待应答"""
+        response = self.submit(JsonCodec.loads(message)).result()
+        return None if response is None else JsonCodec.dumps(response, ensure_ascii=False).decode('utf-8')
+
+    def write(self, message, debug: bool = False) -> bool:
+        raise RuntimeError("并发模式下socket由I/O线程持有，请使用submit()")
+
+    def receive(self, debug: bool = False):
+        raise RuntimeError("并发模式下socket由I/O线程持有，请使用submit()")
+
+    def receive_message(self, debug: bool = False):
+        raise RuntimeError("并发模式下socket由I/O线程持有，请使用submit()")
+
+    def _wakeup(self):
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, AttributeError, OSError):
+            pass
+
+    def _io_loop(self):
+        """I/O线程：写出发件箱中的请求，读取并分发应答，断线时按需重连"""
+        try:
+            while not self._stopping:
+                try:
+                    self._serve()
+                except Exception as e:
+                    if self._stopping:
+                        break
+                    print(f"I/O线程出错: {e}")
+                if self._stopping or not self.auto_reconnect:
+                    break
+                # 已发出的请求执行结果未知，不重发；发件箱中尚未发出的请求保留到重连后
+                for future in self._pending.drain():
+                    _resolve(future, None)
+                self._timing.clear()
+                TCPClient.disconnect(self)
+                if not self._reopen(self._stop_event):
+                    break
+                self._queue_session_replay()
+        finally:
+            with self._lock:
+                self._closed = True
+                batch = list(self._outbox)
+                self._outbox.clear()
+            for _, _, future, _ in batch:
+                _resolve(future, None)
+            self._timing.clear()
+            for future in self._pending.drain():
+                _resolve(future, None)
+            TCPClient.disconnect(self)
+
+    def _queue_session_replay(self):
+        """把会话状态的重放请求插到发件箱最前面"""
+        replay = []
+        for message in self.session.messages():
+            message_dict, data = Message.encode(message, force_id=True)
+            replay.append((message_dict, data, Future(), 0))
+        with self._lock:
+            self._outbox.extendleft(reversed(replay))
+        self._wakeup()
+
+    def _serve(self):
+        """在当前连接上收发，直到连接断开或停止"""
+        sock = self.socket
+        wake_r = self._wake_r
+        while not self._stopping:
+            readable, _, _ = select.select([sock, wake_r], [], [])
+            if wake_r in readable:
+                try:
+                    wake_r.recv(4096)
+                except BlockingIOError:
+                    pass
+                with self._lock:
+                    batch = list(self._outbox)
+                    self._outbox.clear()
+                if batch:
+                    if len(self._pending) > 1024:
+                        # 调用方超时后取消的Future不会再有人等待
+                        self._pending.prune(Future.done)
+                        for future in [f for f in self._timing if f.done()]:
+                            del self._timing[future]
+                    metrics = self.metrics
+                    t_send = time.perf_counter_ns() if metrics is not None else 0
+                    for message_dict, data, future, encode_ns in batch:
+                        self._pending.add(message_dict, future)
+                        if metrics is not None:
+                            self._timing[future] = (message_dict.get("ty"), encode_ns, t_send, len(data))
+                        if self.debug:
+                            print(f"发送消息：{data.decode('utf-8')}")
+                    sock.sendall(b"".join(data for _, data, _, _ in batch))
+                    if self.recorder is not None:
+                        for _, data, _, _ in batch:
+                            self.recorder.record_out(data)
+            if sock in readable:
+                self._recv_into_decoder()
+                while (frame := self.decoder.next_frame_view()) is not None:
+                    if self.recorder is not None:
+                        self.recorder.record_in(frame)
+                    t0 = time.perf_counter_ns() if self.metrics is not None else 0
+                    try:
+                        response = JsonCodec.loads(frame)
+                    except ValueError as e:
+                        print(f"解析应答失败: {e}")
+                        continue
+                    if self.debug:
+                        print(f"接收到响应：{response}")
+                    future = self._pending.pop(response)
+                    if future is None:
+                        self.inbox.put(response)
+                        continue
+                    if t0:
+                        timing = self._timing.pop(future, None)
+                        if timing is not None and not future.done():
+                            t1 = time.perf_counter_ns()
+                            ty, encode_ns, t_send, bytes_out = timing
+                            self.metrics.record(ty, encode_ns, t0 - t_send, t1 - t0, bytes_out, len(frame))
+                    _resolve(future, response)
+
 if __name__ == "__main__":
     client = TCPClient()
     client.connect("192.168.1.136", 9001)
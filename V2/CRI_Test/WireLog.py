@@ -0,0 +1,266 @@
+# 报文录制与离线回放
+#
+# 录制：TCPClient.recorder = WireRecorder("trace.jsonl")（或Codroid.StartRecording），
+#       每条发出的请求和收到的原始帧写成一行JSON：{"t": 单调时钟秒数, "d": "out"/"in", "m": 原始报文}
+# 回放：WireReplayer("trace.jsonl", speed=10).start() 在本机开一个TCP端口代替控制器，
+#       Codroid连接该端口后，每条请求按ty取录制中对应的应答，改写为新的id，按原始（或加速后的）时延发回。
+#       命令行：python WireLog.py trace.jsonl --port 9001 --speed 10
+
+import argparse
+import heapq
+import itertools
+import select
+import socket
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import JsonCodec
+import Message
+from TcpClient import JsonFrameDecoder
+
+
+class WireRecorder:
+    """
+    报文录制器
+
+    时间戳为相对录制开始的time.monotonic()秒数；报文按原样保存为字符串，回放时字节级一致。
+    可被I/O线程和调用方线程同时写入。
+    """
+
+    def __init__(self, path: str):
+        """
+        参数:
+            path (str): JSONL文件路径，已存在时追加
+        """
+        self.path = path
+        self._file = open(path, "ab")
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._out_decoder = JsonFrameDecoder()  # 流水线等场景一次写出多条请求，按帧拆开记录
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def _write(self, direction: str, frame):
+        line = JsonCodec.dumps({"t": round(time.monotonic() - self._start, 6), "d": direction,
+                                "m": str(frame, 'utf-8')}, ensure_ascii=False)
+        self._file.write(line + b"\n")
+        self.count += 1
+
+    def record_out(self, data):
+        """记录发出的字节（可包含多条请求）"""
+        with self._lock:
+            if self._file.closed:
+                return
+            self._out_decoder.feed(data)
+            while (frame := self._out_decoder.next_frame_view()) is not None:
+                self._write("out", frame)
+
+    def record_in(self, frame):
+        """记录收到的一个完整帧"""
+        with self._lock:
+            if not self._file.closed:
+                self._write("in", frame)
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class WireEvent(NamedTuple):
+    """录制文件中的一条记录"""
+    t: float        # 相对录制开始的秒数
+    direction: str  # "out"或"in"
+    raw: str        # 原始报文
+
+
+def load(path: str) -> list:
+    """读取录制文件，返回WireEvent列表"""
+    events = []
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                item = JsonCodec.loads(line)
+                events.append(WireEvent(item["t"], item["d"], item["m"]))
+    return events
+
+
+class _Exchange:
+    """录制中的一次请求：应答及其时延，以及请求之后、下一条请求之前到达的其他帧"""
+    __slots__ = ("reply", "reply_delay", "extras")
+
+    def __init__(self):
+        self.reply: Optional[str] = None
+        self.reply_delay = 0.0
+        self.extras: list = []  # (相对请求的时延, 原始帧)
+
+
+class WireReplayer:
+    """
+    录制回放服务器
+
+    同一ty的请求按录制顺序依次取用应答，取完后循环使用；录制中没有的ty不回复。
+    每个连接独立从头回放。应答中的id改写为本次请求的id，publish/*等无id的帧原样发送。
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, host: str = "127.0.0.1", port: int = 0):
+        """
+        参数:
+            path (str): WireRecorder录制的文件
+            speed (float): 回放速度倍数，2表示时延减半；None或0表示不等待
+            host (str): 监听地址
+            port (int): 监听端口，0表示自动分配
+        """
+        self.speed = speed
+        self.host = host
+        self.port = port
+        self._exchanges = self._build(load(path))
+        self._server: Optional[socket.socket] = None
+        self._running = False
+
+    @staticmethod
+    def _build(events: list) -> dict:
+        """按ty整理录制中的请求与应答"""
+        exchanges: dict[str, list] = {}
+        pending = Message.PendingReplies()
+        last = None  # (请求时刻, _Exchange)
+        for event in events:
+            message = JsonCodec.loads(event.raw)
+            if event.direction == "out":
+                exchange = _Exchange()
+                exchanges.setdefault(message.get("ty", ""), []).append(exchange)
+                pending.add(message, (event.t, exchange))
+                last = (event.t, exchange)
+                continue
+            match = pending.pop(message)
+            if match is not None:
+                t, exchange = match
+                exchange.reply = event.raw
+                exchange.reply_delay = event.t - t
+            elif last is not None:
+                last[1].extras.append((event.t - last[0], event.raw))
+        return exchanges
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def start(self) -> int:
+        """开始监听，返回端口号"""
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.port))
+        self._server.listen()
+        self.port = self._server.getsockname()[1]
+        self._running = True
+        threading.Thread(target=self._accept_loop, name="WireReplayer", daemon=True).start()
+        return self.port
+
+    def close(self):
+        """停止回放"""
+        self._running = False
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                readable, _, _ = select.select([self._server], [], [], 0.1)
+                if readable:
+                    conn, _ = self._server.accept()
+            except (OSError, ValueError, AttributeError):
+                break
+            if readable:
+                thread = threading.Thread(target=self._serve, args=(conn,), daemon=True)
+                thread.start()
+
+    def _delay(self, seconds: float) -> float:
+        return seconds / self.speed if self.speed else 0.0
+
+    def _serve(self, conn: socket.socket):
+        """一个连接：收请求，按录制安排应答的发送时刻"""
+        decoder = JsonFrameDecoder()
+        cursors = {ty: itertools.cycle(items) for ty, items in self._exchanges.items()}
+        schedule = []  # (发送时刻, 序号, 字节)
+        seq = itertools.count()
+        try:
+            while self._running:
+                timeout = max(schedule[0][0] - time.monotonic(), 0.0) if schedule else 0.1
+                readable, _, _ = select.select([conn], [], [], timeout)
+                if readable:
+                    n = conn.recv_into(decoder.writable(4096))
+                    if not n:
+                        break
+                    decoder.commit(n)
+                    now = time.monotonic()
+                    while (frame := decoder.next_frame_view()) is not None:
+                        request = JsonCodec.loads(frame)
+                        cursor = cursors.get(request.get("ty", ""))
+                        if cursor is None:
+                            print(f"录制中没有该类型的请求: {request.get('ty')}")
+                            continue
+                        exchange = next(cursor)
+                        if exchange.reply is not None:
+                            heapq.heappush(schedule, (now + self._delay(exchange.reply_delay), next(seq),
+                                                      self._rewrite(exchange.reply, request)))
+                        for delay, raw in exchange.extras:
+                            heapq.heappush(schedule, (now + self._delay(delay), next(seq), raw.encode('utf-8')))
+                now = time.monotonic()
+                out = []
+                while schedule and schedule[0][0] <= now:
+                    out.append(heapq.heappop(schedule)[2])
+                if out:
+                    conn.sendall(b"".join(out))
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _rewrite(raw: str, request: dict) -> bytes:
+        """把录制应答的id改成本次请求的id"""
+        if "id" not in request:
+            return raw.encode('utf-8')
+        reply = JsonCodec.loads(raw)
+        if not isinstance(reply, dict) or "id" not in reply:
+            return raw.encode('utf-8')
+        reply["id"] = request["id"]
+        return JsonCodec.dumps(reply, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放WireRecorder录制的控制器应答")
+    parser.add_argument("path", help="录制文件")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度倍数，0表示不等待")
+    args = parser.parse_args()
+    replayer = WireReplayer(args.path, args.speed, args.host, args.port)
+    print(f"回放 {args.path}，监听 {args.host}:{replayer.start()}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        replayer.close()
+
+
+if __name__ == "__main__":
+    main()
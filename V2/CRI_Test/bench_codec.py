@@ -0,0 +1,108 @@
+# JSON编解码后端微基准
+#
+# 用法: python bench_codec.py [次数]
+# 对已安装的每个后端（orjson/ujson/json）分别测量典型报文的编码和解码耗时。
+# 报文形状与控制器实际返回的一致：100Hz轮询的RobotStatus/RobotPosture推送、
+# ModbusTcp配置、全局变量读取，以及带中文备注的globalVar/saveVars请求（ensure_ascii=False）。
+
+import sys
+import time
+
+import JsonCodec
+
+
+def robot_status() -> dict:
+    """publish/RobotStatus推送"""
+    return {
+        "ty": "publish/RobotStatus",
+        "db": {
+            "state": 0,
+            "taskState": 0,
+            "operateMode": 1,
+            "speedRatio": 100,
+            "joint": [12.345678901234, -45.678901234567, 90.123456789012,
+                      -0.987654321098, 45.000000000001, 179.99999999999],
+            "cartesian": [512.3456789012, -123.4567890123, 678.9012345678,
+                          179.9876543210, -0.0123456789, 90.1234567890],
+            "jointSpeed": [0.0012, -0.0034, 0.0056, 0.0, 0.0, 0.0001],
+            "jointTorque": [1.234, 25.678, 12.345, 0.456, 0.789, 0.012],
+            "jointTemperature": [35.5, 37.2, 36.8, 33.1, 32.4, 31.9],
+            "jointCurrent": [0.512, 2.345, 1.234, 0.123, 0.087, 0.021],
+            "tcpSpeed": 0.0,
+            "collision": False,
+            "emergencyStop": False,
+            "servoEnable": True,
+        }
+    }
+
+
+def modbus_tcp_config() -> dict:
+    """ModbusTcp/getConfig应答：8个设备，每个设备4张表"""
+    devices = {}
+    for d in range(8):
+        tables = {}
+        for t in range(4):
+            tables[f"table{t}"] = {
+                "functionCode": 3, "addr": 1000 * t, "count": 16, "period": 1000,
+                "values": [i * 7 % 65536 for i in range(16)]
+            }
+        devices[f"plc{d}"] = {
+            "ip": f"192.168.1.{100 + d}", "port": 502, "slaveId": d + 1, "endian": 1,
+            "connected": d % 2 == 0, "tables": tables
+        }
+    return {"id": "m1a2b3c00000001", "ty": "ModbusTcp/getConfig", "db": devices}
+
+
+def global_vars() -> dict:
+    """globalVar/getVars应答：200个带中文备注的全局变量"""
+    values = ("true", "3.1415926", "\"text\"", "[1,2,3,4]", "{x=1,y=2}")
+    return {
+        "id": "m1a2b3c00000002",
+        "ty": "globalVar/getVars",
+        "db": {f"var{i}": {"nm": f"变量备注{i}", "val": values[i % len(values)]} for i in range(200)}
+    }
+
+
+def save_vars() -> dict:
+    """globalVar/saveVars请求，按SetGlobalVar的ensure_ascii=False路径编码"""
+    return {
+        "id": "m1a2b3c00000003",
+        "ty": "globalVar/saveVars",
+        "db": {"bool1": {"nm": "布尔 1", "val": "true"}, "intArr1": {"nm": "整数 1", "val": "[1,2,3,4]"}}
+    }
+
+
+PAYLOADS = [
+    ("RobotStatus", robot_status(), True),
+    ("ModbusTcp", modbus_tcp_config(), True),
+    ("globalVars", global_vars(), True),
+    ("saveVars", save_vars(), False),
+]
+
+
+def bench(func, arg, number: int) -> float:
+    """返回单次调用的平均耗时（微秒），取3轮中最好的一轮"""
+    best = float("inf")
+    for _ in range(3):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best / number * 1e6
+
+
+def main(number: int = 20000):
+    print(f"可用后端: {', '.join(JsonCodec.CODECS)}，默认: {JsonCodec.codec.name}")
+    print(f"{'报文':<12}{'字节':>7}  {'后端':<8}{'编码(us)':>10}{'解码(us)':>10}")
+    for name, obj, ensure_ascii in PAYLOADS:
+        n = max(number * 200 // len(JsonCodec.get_codec("json").dumps(obj)), 100)
+        for codec in JsonCodec.CODECS.values():
+            data = codec.dumps(obj, ensure_ascii)
+            assert codec.loads(data) == obj
+            enc = bench(lambda o: codec.dumps(o, ensure_ascii), obj, n)
+            dec = bench(codec.loads, data, n)
+            print(f"{name:<12}{len(data):>7}  {codec.name:<8}{enc:>10.2f}{dec:>10.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -1,14 +1,13 @@
 import math
-import socket
-import struct
 import time
 import numpy as np
 from typing import List, Optional
-from dataclasses import dataclass
 from enum import Enum
 from scipy.interpolate import CubicSpline  # 核心算法库
 
 from Codroid import Codroid
+from CriStream import CriSender
+from Define import CRICommandType
 
 # ==========================================
 # 1. 数据结构定义
@@ -20,18 +19,6 @@ class CommandType(Enum):
     END_EFFECTOR = 1
 
 
-@dataclass
-class CommandData:
-    """UDP 数据包结构"""
-    timestamp: int = 0
-    position: List[float] = None
-    cmd_type: CommandType = CommandType.JOINT
-
-    def __post_init__(self):
-        if self.position is None:
-            self.position = [0.0] * 6
-
-
 # ==========================================
 # 2. 运动规划器 (基于 Scipy 三次样条)
 # ==========================================
@@ -101,42 +88,9 @@ class SplineMotionPlanner:
 # ==========================================
 # 3. UDP 通信发送器
 # ==========================================
-
-class UDPCommandSender:
-    def __init__(self, host: str, port: int):
-        self.host = host
-        self.port = port
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sequence_number = 0
-
-    def send_command(self, command: CommandData):
-        """
-        打包并发送数据。结构必须与 C++ 接收端严格一致。
-        结构: int64(ts) + 6*double(pos) + uint8(type) + 7*uint8(padding) = 64 bytes
-        """
-        command.timestamp = self.sequence_number
-        self.sequence_number += 1
-
-        # 'q': long long (8 bytes)
-        data = struct.pack('q', command.timestamp)
-
-        # 'd': double (8 bytes) * 6
-        for pos in command.position:
-            data += struct.pack('d', pos)
-
-        # 'B': unsigned char (1 byte)
-        data += struct.pack('B', command.cmd_type.value)
-
-        # Padding (7 bytes)
-        data += struct.pack('7B', 0, 0, 0, 0, 0, 0, 0)
-
-        try:
-            self.sock.sendto(data, (self.host, self.port))
-        except OSError as e:
-            print(f"发送错误: {e}")
-
-    def close(self):
-        self.sock.close()
+# 使用 CriStream.CriSender：独立发送线程按控制周期从预分配的环形缓冲区取出已打包的
+# 64字节 CommandData 发送，只做等待截止时刻 + sendto。规划、打包、打印都在调用线程中完成，
+# 缓冲区满时 Feed() 等待发送线程腾出空间（背压），缓冲区中途为空的周期计入 underruns。
 
 
 # ==========================================
@@ -144,11 +98,15 @@ class UDPCommandSender:
 # ==========================================
 
 class RobotController:
-    def __init__(self, udp_host: str, udp_port: int, control_frequency: float = 1000.0):
+    def __init__(self, udp_host: str, udp_port: int, control_frequency: float = 1000.0,
+                 buffer_seconds: float = 1.0):
         self.planner = SplineMotionPlanner(control_frequency)
-        self.sender = UDPCommandSender(udp_host, udp_port)
         self.control_frequency = control_frequency
         self.dt = 1.0 / control_frequency
+        # 每次 move_trajectory 期间启动发送线程（clock 的延迟统计随之清零，只反映本次运动），
+        # 序号在多次运动之间连续；缓冲区容纳 buffer_seconds 秒的点
+        self.sender = CriSender(udp_host, udp_port, period=self.dt,
+                                capacity=max(int(buffer_seconds * control_frequency), 16))
         self.current_position = [0.0] * 6  # 初始状态
 
     def set_current_position(self, position: List[float]):
@@ -173,37 +131,34 @@ class RobotController:
         # 2. 生成密集轨迹
         # start_time_calc = time.time()
         trajectory_np = self.planner.generate_trajectory(full_waypoints, duration)
+        if len(trajectory_np) == 0:
+            return
         # print(f"规划耗时: {(time.time() - start_time_calc)*1000:.2f}ms. 总控制点数: {len(trajectory_np)}")
 
-        # 3. 实时发送循环 (Soft Real-time)
+        # 3. 交给发送线程 (Soft Real-time)
+        # Feed 在调用线程中把整条轨迹一次打包，分块写入环形缓冲区；缓冲区满时在这里等待（背压），
+        # 发送线程按 dt 的绝对截止时刻逐点发出，不受本线程的规划和打印影响
         print(f"[{time.strftime('%H:%M:%S')}] 开始发送轨迹...")
+        sender = self.sender
+        sent, underruns = sender.sent, sender.underruns
+        sender.Start()
+        try:
+            sender.Feed(trajectory_np, CRICommandType(motion_type.value))
+            sender.Finish()
+            sender.WaitEmpty()
+        finally:
+            sender.Stop(drain=False)
 
-        traj_start_time = time.time()
-
-        for i, point_np in enumerate(trajectory_np):
-            # 这里的 point_np 是 numpy array，转为 list
-            point_list = point_np.tolist()
-
-            # --- 时间同步补偿 ---
-            # 确保循环频率稳定在 1000Hz (或其他设定值)
-            expected_time = i * self.dt
-            actual_time = time.time() - traj_start_time
-
-            if actual_time < expected_time:
-                # 如果代码跑得太快，就睡一会儿
-                time.sleep(expected_time - actual_time)
-
-            # --- 发送 ---
-            cmd = CommandData(position=point_list, cmd_type=motion_type)
-            self.sender.send_command(cmd)
-
-            # 更新内部状态
-            self.current_position = point_list
+        # 更新内部状态
+        self.current_position = trajectory_np[-1].tolist()
 
-        print(f"[{time.strftime('%H:%M:%S')}] 运动完成.")
+        lateness = sender.clock.summary()["lateness_us"]
+        print(f"[{time.strftime('%H:%M:%S')}] 运动完成. 发送{sender.sent - sent}点, 欠载{sender.underruns - underruns}次, "
+              f"发送线程延迟 p99={lateness['p99']:.0f}us max={lateness['max']:.0f}us, "
+              f"迟到{sender.clock.late}次, 跳过{sender.clock.skipped}个周期")
 
     def close(self):
-        self.sender.close()
+        self.sender.Stop(drain=False)
 
 
 def _parse_line(line):
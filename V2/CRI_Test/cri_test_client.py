@@ -1,6 +1,5 @@
 import math
 import socket
-import struct
 import time
 import numpy as np
 from typing import List, Tuple
@@ -8,7 +7,9 @@ import threading
 from dataclasses import dataclass
 from enum import Enum
 
-from V2.Python.Codroid import Codroid
+from Codroid import Codroid
+from CriStream import COMMAND, CRIClock, encode_command, encode_commands
+from Define import CRICommandType
 
 class CommandType(Enum):
     JOINT = 0
@@ -124,17 +125,30 @@ class UDPCommandSender:
         command.timestamp = self.sequence_number
         self.sequence_number += 1
 
-        # 打包二进制数据
-        # Int64: q (long long), Float64: d (double), UInt8: B (unsigned char)
-        data = struct.pack('q', command.timestamp)  # timestamp
-        for pos in command.position:  # position[6]
-            data += struct.pack('d', pos)
-        data += struct.pack('B', command.cmd_type.value)  # type
-        data += struct.pack('BBBBBBB', 0, 0, 0, 0, 0, 0, 0)  # nc[7] 填充0
+        # 打包二进制数据（64字节CommandData，与C++接收端一致）
+        data = encode_command(command.timestamp, command.position, CRICommandType(command.cmd_type.value))
 
         # 发送数据
         self.sock.sendto(data, (self.host, self.port))
 
+    def encode_trajectory(self, trajectory, cmd_type: CommandType = CommandType.JOINT) -> memoryview:
+        """整条轨迹一次打包进连续缓冲区，依次占用序号
+
+        Args:
+            trajectory: 轨迹点列表 [N][6]
+            cmd_type: 命令类型
+
+        Returns:
+            64*N字节的memoryview，第i个点为view[64*i: 64*(i+1)]
+        """
+        packets = encode_commands(trajectory, self.sequence_number, CRICommandType(cmd_type.value))
+        self.sequence_number += len(trajectory)
+        return packets
+
+    def send_packet(self, packet):
+        """发送已打包的报文（encode_trajectory结果的切片，不复制）"""
+        self.sock.sendto(packet, (self.host, self.port))
+
     def close(self):
         """关闭socket"""
         self.sock.close()
@@ -178,20 +192,18 @@ class RobotController:
 
         print(f"轨迹点数: {len(trajectory)}")
 
-        # 发送轨迹点
-        start_time = time.time()
-        for i, point in enumerate(trajectory):
-            # 计算实际经过的时间
-            elapsed_time = time.time() - start_time
-            expected_time = i * self.planner.dt
+        # 整条轨迹一次打包，发送时只切片
+        packets = self.sender.encode_trajectory(trajectory, motion_type)
+        size = COMMAND.size
 
-            # 时间补偿
-            if elapsed_time < expected_time:
-                time.sleep(expected_time - elapsed_time)
+        # 发送轨迹点：第i个点在 起始时刻 + i*dt 的绝对截止时刻发出，睡眠误差不累积
+        clock = CRIClock(self.planner.dt)
+        clock.start()
+        for i, point in enumerate(trajectory):
+            clock.wait()
 
-            # 创建命令并发送
-            command = CommandData(position=point, cmd_type=motion_type)
-            self.sender.send_command(command)
+            # 发送第i个报文
+            self.sender.send_packet(packets[i * size:(i + 1) * size])
 
             # 更新当前位置
             self.current_position = point.copy()
@@ -199,7 +211,8 @@ class RobotController:
             if i % 50 == 0:  # 每50个点打印一次进度
                 print(f"进度: {i + 1}/{len(trajectory)}, 位置: {[f'{p:.3f}' for p in point]}")
 
-        print("运动完成!")
+        lateness = clock.summary()["lateness_us"]
+        print(f"运动完成! 发送延迟 p99={lateness['p99']:.0f}us max={lateness['max']:.0f}us, 迟到{clock.late}次")
 
     def move_joints_smoothly(self, target_joints: List[float], duration: float = 3.0):
         """平滑移动到关节目标位置（使用三次多项式插值）"""
@@ -1,5 +1,4 @@
 import json
-import struct
 import numpy as np
 import toppra as ta
 import toppra.constraint as constraint
@@ -15,6 +14,8 @@ import traceback
 
 # 假设 Codroid 在同级目录下，如果报错请确保文件存在
 from Codroid import Codroid
+from CriStream import COMMAND, encode_command, encode_commands
+from Define import CRICommandType
 
 
 # ==========================================
@@ -51,14 +52,18 @@ class UDPCommandSender:
             print(f"错误: 关节数据长度应为6")
             return
 
-        try:
-            payload = struct.pack('<q6dB7x',
-                                  command.timestamp,
-                                  *command.position,
-                                  command.cmd_type.value)
-            self.sock.sendto(payload, (self.host, self.port))
-        except struct.error as e:
-            print(f"打包失败: {e}")
+        payload = encode_command(command.timestamp, command.position, CRICommandType(command.cmd_type.value))
+        self.send_packet(payload)
+
+    def encode_trajectory(self, trajectory, cmd_type: CommandType = CommandType.JOINT) -> memoryview:
+        """整条轨迹一次打包进连续缓冲区，第i个点为view[64*i: 64*(i+1)]"""
+        packets = encode_commands(trajectory, self.sequence_number, CRICommandType(cmd_type.value))
+        self.sequence_number += len(trajectory)
+        return packets
+
+    def send_packet(self, packet):
+        """发送一个已打包的报文（bytes或memoryview切片，不复制）"""
+        self.sock.sendto(packet, (self.host, self.port))
 
     def close(self):
         self.sock.close()
@@ -328,13 +333,17 @@ def main():
     print(">>> 按回车键开始播放运动 <<<")
     input()
 
+    # 整条轨迹一次打包，循环中只取切片
+    packets = sender.encode_trajectory(smooth_trajectory)
+    size = COMMAND.size
+
     start_time = time.perf_counter()
     dt = 0.01  # 10ms
 
     try:
         print("开始发送 UDP 数据...")
-        for i, pos in enumerate(smooth_trajectory):
-            sender.send_command(CommandData(position=pos))
+        for i in range(len(smooth_trajectory)):
+            sender.send_packet(packets[i * size:(i + 1) * size])
 
             # 简单的延时控制 (Soft Real-time)
             target = start_time + (i + 1) * dt